@@ -0,0 +1,790 @@
+"""Benchmarks for the proxy hot paths.
+
+Usage:
+    python benchmark.py             # list benchmarks
+    python benchmark.py forwarding  # run one
+    python benchmark.py all         # run everything
+
+Benchmarks drive the real ``main.GeminiProxy`` code against in-memory
+websockets, so no network or Vertex AI credentials are needed.
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import logging
+import os
+import statistics
+import time
+from typing import Any, Callable, Dict, List, Union
+
+import main
+from main import GeminiProxy, ImagePipeline
+
+
+class FakeWebSocket:
+    """Minimal in-memory stand-in for a websockets connection."""
+
+    def __init__(self, frames: List[Union[str, bytes]] = ()):
+        self.frames = list(frames)
+        self.sent: List[Union[str, bytes]] = []
+        self.sent_at: List[float] = []
+        self.received_at: List[float] = []
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for frame in self.frames:
+            # A real socket yields to the loop between frames.
+            await asyncio.sleep(0)
+            self.received_at.append(time.perf_counter())
+            yield frame
+
+    async def send(self, message: Union[str, bytes]) -> None:
+        self.sent_at.append(time.perf_counter())
+        self.sent.append(message)
+
+    async def recv(self) -> Union[str, bytes]:
+        return self.frames.pop(0)
+
+    async def close(self, code: int = 1000, reason: str = "") -> None:
+        self.closed = True
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def report(name: str, rows: List[Dict[str, Any]]) -> None:
+    print(f"\n== {name} ==")
+    if not rows:
+        return
+    columns = list(rows[0].keys())
+    widths = [max(len(c), *(len(f"{r[c]}") for r in rows)) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(f"{row[c]}".ljust(w) for c, w in zip(columns, widths)))
+
+
+# Representative frames -----------------------------------------------------
+
+def audio_frame(duration_ms: int = 100, rate: int = 16000) -> str:
+    pcm = os.urandom(rate * 2 * duration_ms // 1000)
+    return json.dumps({"realtime_input": {"media_chunks": [{
+        "mime_type": "audio/pcm",
+        "data": base64.b64encode(pcm).decode("utf-8"),
+    }]}})
+
+
+def video_frame(size: int = 60 * 1024) -> str:
+    return json.dumps({"realtime_input": {"media_chunks": [{
+        "mime_type": "image/jpeg",
+        "data": base64.b64encode(os.urandom(size)).decode("utf-8"),
+    }]}})
+
+
+def model_audio_frame(duration_ms: int = 200, rate: int = 24000) -> bytes:
+    pcm = os.urandom(rate * 2 * duration_ms // 1000)
+    return json.dumps({"serverContent": {"modelTurn": {"parts": [{
+        "inlineData": {
+            "mimeType": "audio/pcm;rate=24000",
+            "data": base64.b64encode(pcm).decode("utf-8"),
+        }
+    }]}}}).encode("utf-8")
+
+
+def camera_jpeg(width: int = 1920, height: int = 1080) -> str:
+    """A noisy (hard to compress) camera-sized JPEG, base64 encoded."""
+    from PIL import Image
+
+    noise = Image.frombytes("L", (width // 4, height // 4),
+                            os.urandom(width * height // 16))
+    img = noise.resize((width, height)).convert("RGB")
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=90)
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+async def measure_loop_lag(workload, interval: float = 0.005) -> List[float]:
+    """Runs ``workload`` while sampling how late a periodic timer fires."""
+    lags: List[float] = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            expected = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            lags.append(max(0.0, time.perf_counter() - expected) * 1e3)
+
+    task = asyncio.create_task(ticker())
+    try:
+        await workload()
+    finally:
+        done.set()
+        await task
+    return lags
+
+
+# Benchmarks ----------------------------------------------------------------
+
+def bench_forwarding(frames: int = 2000) -> None:
+    """Per-frame CPU and p99 latency: full parse vs pass-through."""
+    workloads = {
+        "client audio 100ms": (audio_frame(), True),
+        "client video 60KB": (video_frame(), True),
+        "server audio 200ms": (model_audio_frame(), False),
+    }
+    rows = []
+    for label, (frame, upstream) in workloads.items():
+        for passthrough in (False, True):
+            proxy = GeminiProxy()
+            proxy.passthrough_enabled = passthrough
+            source = FakeWebSocket([frame] * frames)
+            destination = FakeWebSocket()
+
+            cpu_start = time.process_time()
+            asyncio.run(proxy.proxy_messages(source, destination, upstream))
+            cpu = time.process_time() - cpu_start
+
+            latencies = [
+                (sent - received) * 1e6
+                for received, sent in zip(source.received_at,
+                                          destination.sent_at)
+            ]
+            rows.append({
+                "workload": label,
+                "path": "pass-through" if passthrough else "full parse",
+                "cpu_us/frame": f"{cpu / frames * 1e6:.1f}",
+                "p50_us": f"{statistics.median(latencies):.1f}",
+                "p99_us": f"{percentile(latencies, 99):.1f}",
+            })
+    report("forwarding", rows)
+
+
+def bench_image_loop_lag(frames_per_client: int = 5,
+                         fps: float = 5.0) -> None:
+    """Event-loop lag with N clients streaming camera frames."""
+    frame = camera_jpeg()
+    rows = []
+    for clients in (1, 4, 16):
+        for mode in ("inline", "thread", "process"):
+            pipeline = (None if mode == "inline"
+                        else ImagePipeline(kind=mode))
+
+            async def client(index: int):
+                for _ in range(frames_per_client):
+                    if pipeline is None:
+                        # The pre-pipeline behaviour: work on the loop.
+                        main.process_image_sync(frame, "image/jpeg")
+                    else:
+                        await pipeline.submit(frame, "image/jpeg",
+                                              f"client-{index}")
+                    await asyncio.sleep(1 / fps)
+
+            async def workload():
+                await asyncio.gather(*(client(i) for i in range(clients)))
+
+            start = time.perf_counter()
+            lags = asyncio.run(measure_loop_lag(workload))
+            elapsed = time.perf_counter() - start
+            dropped = pipeline.metrics["dropped"] if pipeline else 0
+            if pipeline is not None:
+                pipeline.shutdown()
+            rows.append({
+                "clients": clients,
+                "mode": mode,
+                "lag_p50_ms": f"{statistics.median(lags):.1f}",
+                "lag_p99_ms": f"{percentile(lags, 99):.1f}",
+                "lag_max_ms": f"{max(lags):.1f}",
+                "dropped": dropped,
+                "wall_s": f"{elapsed:.1f}",
+            })
+    report("image_loop_lag", rows)
+
+
+def bench_image_profiles(frames: int = 20) -> None:
+    """Single-core image throughput (frames/s) for each quality profile."""
+    inputs = {
+        "1920x1080 jpeg": camera_jpeg(1920, 1080),
+        "1280x720 jpeg": camera_jpeg(1280, 720),
+        "640x480 jpeg": camera_jpeg(640, 480),
+    }
+    rows = []
+    for label, frame in inputs.items():
+        for profile in main.IMAGE_PROFILES:
+            start = time.process_time()
+            for _ in range(frames):
+                result = main.process_image_sync(frame, "image/jpeg", profile)
+            cpu = time.process_time() - start
+            out_size = len(result["inline_data"]["data"]) * 3 // 4
+            rows.append({
+                "input": label,
+                "profile": profile,
+                "frames/s/core": f"{frames / cpu:.1f}",
+                "ms/frame": f"{cpu / frames * 1e3:.1f}",
+                "out_kb": out_size // 1024,
+            })
+    report("image_profiles", rows)
+
+
+METRICS_BUDGET_US = 2.0  # instrumentation cost allowed per forwarded frame
+
+
+class NullHistogram:
+    def observe(self, value: float) -> None:
+        pass
+
+
+def bench_metrics_overhead(frames: int = 5000, repeats: int = 5) -> None:
+    """Per-frame cost of /metrics instrumentation against its budget."""
+    proxy = GeminiProxy()
+    latency = proxy.forward_latency["upstream"]
+    size = proxy.message_size["upstream"]
+    queue = main.ForwardQueue(True)
+    rows = []
+
+    # What the reader and writer add per frame: two clock reads, two
+    # observations and the enqueue timestamp.
+    start = time.perf_counter()
+    for _ in range(frames):
+        queue.received_at = time.monotonic()
+        size.observe(1234)
+        latency.observe(time.monotonic() - queue.received_at)
+    per_frame = (time.perf_counter() - start) / frames * 1e6
+    rows.append({"measure": "instrumentation only",
+                 "us/frame": f"{per_frame:.2f}",
+                 "budget_us": METRICS_BUDGET_US,
+                 "within": per_frame <= METRICS_BUDGET_US})
+
+    frame = audio_frame()
+    cpu = {}
+    for instrumented in (False, True):
+        samples = []
+        for _ in range(repeats):
+            proxy = GeminiProxy()
+            if not instrumented:
+                proxy.forward_latency = dict.fromkeys(proxy.forward_latency)
+                proxy.message_size = {d: NullHistogram()
+                                      for d in proxy.message_size}
+            source = FakeWebSocket([frame] * frames)
+            start = time.process_time()
+            asyncio.run(proxy.proxy_messages(source, FakeWebSocket(), True))
+            samples.append((time.process_time() - start) / frames * 1e6)
+        cpu[instrumented] = statistics.median(samples)
+    delta = cpu[True] - cpu[False]
+    rows.append({"measure": "forwarding, metrics off",
+                 "us/frame": f"{cpu[False]:.2f}", "budget_us": "",
+                 "within": ""})
+    rows.append({"measure": "forwarding, metrics on",
+                 "us/frame": f"{cpu[True]:.2f}", "budget_us": "",
+                 "within": ""})
+    rows.append({"measure": "forwarding delta",
+                 "us/frame": f"{delta:.2f}",
+                 "budget_us": METRICS_BUDGET_US,
+                 "within": delta <= METRICS_BUDGET_US})
+
+    proxy = GeminiProxy()
+    for index in range(100):
+        connection = main.ConnectionInfo(websocket=None, last_active=0.0,
+                                         client_id=str(index), config={})
+        connection.queues = {"upstream": main.ForwardQueue(True),
+                             "downstream": main.ForwardQueue(False)}
+        proxy.active_connections[connection.client_id] = connection
+    start = time.perf_counter()
+    for _ in range(100):
+        proxy.render_metrics()
+    rows.append({"measure": "scrape, 100 connections",
+                 "us/frame": f"{(time.perf_counter() - start) * 1e4:.0f}"
+                             " us/scrape",
+                 "budget_us": "", "within": ""})
+    report("metrics_overhead", rows)
+
+
+def bench_logging_overhead(frames: int = 2000) -> None:
+    """Per-frame cost of payload logging, off vs on, eager vs lazy."""
+    data = json.loads(video_frame())
+    direction = "client → server"
+    rows = []
+
+    def eager():
+        main.logger.debug(f"{direction}: {data}")
+
+    def lazy():
+        main.logger.debug("%s: %s", direction, main.PayloadSummary(data))
+
+    def per_call(log_call) -> float:
+        start = time.perf_counter()
+        for _ in range(frames):
+            log_call()
+        return (time.perf_counter() - start) / frames * 1e6
+
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], main.logger.level
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(logging.FileHandler(os.devnull))
+    listener = main.setup_logging()
+    try:
+        for enabled in (False, True):
+            main.logger.setLevel("DEBUG" if enabled else "WARNING")
+            state = "on (queued)" if enabled else "off"
+            rows.append({"case": f"eager f-string, {state}",
+                         "us/frame": f"{per_call(eager):.1f}"})
+            rows.append({"case": f"lazy summary, {state}",
+                         "us/frame": f"{per_call(lazy):.1f}"})
+            proxy = GeminiProxy()
+            proxy.passthrough_enabled = False
+            proxy.video_dedup_enabled = False
+            source = FakeWebSocket([video_frame()] * frames)
+            start = time.process_time()
+            asyncio.run(proxy.proxy_messages(source, FakeWebSocket(), True))
+            cpu = time.process_time() - start
+            rows.append({"case": f"full-parse forwarding, {state}",
+                         "us/frame": f"{cpu / frames * 1e6:.1f}"})
+    finally:
+        listener.stop()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        for handler in handlers:
+            root.addHandler(handler)
+        main._log_handlers.clear()
+        main.logger.setLevel(level)
+    report("logging_overhead", rows)
+
+
+def bench_media_memory(sessions: int = 100, minutes: float = 10.0,
+                       fps: float = 5.0) -> None:
+    """Memory held by 100 long-lived sessions' downstream media buffers."""
+    import tracemalloc
+    from collections import deque
+
+    frame = model_audio_frame().decode("utf-8")
+    frames = int(minutes * 60 * fps)
+
+    class ListBuffer:  # the old media_buffer shape: decoded dicts, unbounded
+        def __init__(self):
+            self.items = []
+
+        def append(self, message: str, now: float) -> None:
+            self.items.append(json.loads(message))
+
+    class DequeBuffer:  # references to the frames, capped by bytes
+        def __init__(self):
+            self.items, self.size = deque(), 0
+
+        def append(self, message: str, now: float) -> None:
+            self.items.append(message)
+            self.size += len(message)
+            while self.size > main.MEDIA_RING_BYTES:
+                self.size -= len(self.items.popleft())
+
+    class RingBuffer:
+        def __init__(self, pool: main.SlabPool):
+            self.ring = main.MediaRing(pool)
+
+        def append(self, message: str, now: float) -> None:
+            self.ring.append("text", message.encode("utf-8"), now)
+
+    def run(make, count: int):
+        buffers = [make() for _ in range(sessions)]
+        start = time.perf_counter()
+        for index in range(count):
+            now = index / fps
+            for buffer in buffers:
+                # A new string per frame and session, as from real sockets.
+                buffer.append(frame[:-1] + "}", now)
+        elapsed = time.perf_counter() - start
+        return buffers, elapsed / (count * sessions) * 1e6
+
+    def measure(name: str, make, count: int) -> None:
+        _, per_frame = run(make(), count)
+        tracemalloc.start()
+        buffers, _ = run(make(), count)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del buffers
+        rows.append({"buffer": name,
+                     "session_minutes": f"{count / fps / 60:g}",
+                     "held_MB": f"{current / 2**20:.1f}",
+                     "peak_MB": f"{peak / 2**20:.1f}",
+                     "KB/session": f"{current / sessions / 1024:.0f}",
+                     "us/frame": f"{per_frame:.2f}"})
+
+    def ring(pool_bytes: int):
+        def make():
+            pool = main.SlabPool(max_bytes=pool_bytes)
+            return lambda: RingBuffer(pool)
+        return make
+
+    rows: List[Dict[str, Any]] = []
+    # The unbounded list grows without limit; a minute shows the rate.
+    measure("list of dicts, unbounded", lambda: ListBuffer, int(60 * fps))
+    measure("deque of frames, 2 MB/session", lambda: DequeBuffer, frames)
+    measure("slab ring, 2 MB/session", ring(1 << 40), frames)
+    measure("slab ring, 64 MB pool", ring(main.MEDIA_POOL_BYTES), frames)
+    report(f"media_memory ({sessions} sessions, {len(frame)} B frames "
+           f"at {fps:g}/s)", rows)
+
+
+def serve_static(port: int, legacy: bool) -> None:
+    """Runs the HTTP server in a child process for ``bench_static``."""
+    from aiohttp import web
+
+    if legacy:  # what WebServer did before the manifest: FileResponse
+        app = web.Application()
+        app.router.add_static("/static", "static")
+    else:
+        app = main.WebServer("static").app
+    web.run_app(app, host="127.0.0.1", port=port, print=None,
+                access_log=None)
+
+
+def bench_static(requests: int = 3000, concurrency: int = 32,
+                 path: str = "/static/js/gemini-client.js") -> None:
+    """Static asset serving under a local HTTP load generator."""
+    import multiprocessing
+
+    import aiohttp
+
+    async def load(port: int, headers: Dict[str, str]):
+        latencies, wire = [], 0
+        connector = aiohttp.TCPConnector(limit=concurrency)
+        async with aiohttp.ClientSession(connector=connector,
+                                         auto_decompress=False) as session:
+            url = f"http://127.0.0.1:{port}{path}"
+            async with session.get(url, headers=headers) as response:
+                etag = response.headers.get("ETag", "")
+                await response.read()
+            headers = {name: value.replace("{etag}", etag)
+                       for name, value in headers.items()}
+            remaining = requests
+
+            async def worker():
+                nonlocal remaining, wire
+                while remaining > 0:
+                    remaining -= 1
+                    start = time.perf_counter()
+                    async with session.get(url, headers=headers) as response:
+                        wire += len(await response.read())
+                        status = response.status
+                    latencies.append(time.perf_counter() - start)
+                return status
+
+            start = time.perf_counter()
+            statuses = await asyncio.gather(
+                *(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - start
+        return statuses[0], latencies, wire, elapsed
+
+    cases = [
+        ("FileResponse (before)", True, {"Accept-Encoding": "identity"}),
+        ("FileResponse, revalidate", True,
+         {"Accept-Encoding": "identity", "If-None-Match": "{etag}"}),
+        ("manifest, identity", False, {"Accept-Encoding": "identity"}),
+        ("manifest, gzip", False, {"Accept-Encoding": "gzip"}),
+    ]
+    if main.brotli is not None:
+        cases.append(("manifest, br", False, {"Accept-Encoding": "br"}))
+    cases.append(("manifest, revalidate", False,
+                  {"Accept-Encoding": "gzip", "If-None-Match": "{etag}"}))
+
+    rows = []
+    for index, (name, legacy, headers) in enumerate(cases):
+        port = 8700 + index
+        server = multiprocessing.Process(target=serve_static,
+                                         args=(port, legacy), daemon=True)
+        server.start()
+        try:
+            asyncio.run(wait_for_http(port))
+            status, latencies, wire, elapsed = asyncio.run(
+                load(port, headers))
+        finally:
+            server.terminate()
+            server.join()
+        rows.append({"case": name, "status": status,
+                     "req/s": f"{requests / elapsed:.0f}",
+                     "p50_ms": f"{percentile(latencies, 50) * 1e3:.2f}",
+                     "p99_ms": f"{percentile(latencies, 99) * 1e3:.2f}",
+                     "bytes/req": wire // requests})
+    report(f"static ({path}, {concurrency} concurrent)", rows)
+
+
+async def wait_for_http(port: int, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.05)
+    raise RuntimeError(f"Server did not listen on port {port}")
+
+
+def bench_compression(repeats: int = 20) -> None:
+    """Bytes on the wire and CPU per frame for each deflate policy."""
+    from websockets.frames import Frame, Opcode
+
+    # One second of a camera session, in both directions.
+    tool_call = json.dumps({"toolCall": {"functionCalls": [{
+        "id": "call-1", "name": "lookup_weather",
+        "args": {"location": "Dublin, Ireland", "unit": "celsius"},
+    }]}})
+    text = json.dumps({"serverContent": {"modelTurn": {"parts": [{
+        "text": "The forecast for Dublin is light rain clearing by the "
+                "afternoon, with highs around twelve degrees.",
+    }]}}})
+    frames = {
+        "client audio": [audio_frame(40).encode("utf-8")
+                         for _ in range(25)],
+        "client video": [video_frame(30 * 1024).encode("utf-8")],
+        "model audio": [model_audio_frame(40) for _ in range(25)],
+        "control": [json.dumps({"client_content": {"turn_complete": True}})
+                    .encode("utf-8"),
+                    json.dumps({"serverContent": {"turnComplete": True}})
+                    .encode("utf-8")],
+        "text/tool": [text.encode("utf-8"), tool_call.encode("utf-8")],
+    }
+    settings = main.COMPRESSION_SETTINGS["client"]
+
+    def deflate(selective: bool):
+        extension = main.PerMessageDeflate(
+            False, False, settings["window_bits"], settings["window_bits"],
+            {"memLevel": settings["mem_level"], "level": settings["level"]})
+        if selective:
+            extension = main.SelectivePerMessageDeflate(
+                extension, settings["media_min_size"])
+        # The peer's extension, to count decompression too.
+        peer = main.PerMessageDeflate(
+            False, False, settings["window_bits"], settings["window_bits"])
+        return extension, peer
+
+    policies = {"none": lambda: None,
+                "deflate all": lambda: deflate(False),
+                "skip media": lambda: deflate(True)}
+    rows: List[Dict[str, Any]] = []
+    totals: Dict[str, List[float]] = {}
+    for policy, make in policies.items():
+        pair = make()
+        for kind, messages in frames.items():
+            wire, elapsed = 0, 0.0
+            for _ in range(repeats):
+                for message in messages:
+                    frame = Frame(Opcode.TEXT, message)
+                    start = time.perf_counter()
+                    if pair is not None:
+                        frame = pair[0].encode(frame)
+                        pair[1].decode(frame)
+                    elapsed += time.perf_counter() - start
+                    wire += len(frame.data)
+            count = repeats * len(messages)
+            raw = sum(len(m) for m in messages) * repeats
+            total = totals.setdefault(policy, [0, 0, 0.0, 0])
+            total[0] += raw
+            total[1] += wire
+            total[2] += elapsed
+            total[3] += count
+            rows.append({"policy": policy, "frames": kind,
+                         "raw_B/frame": raw // count,
+                         "wire_B/frame": wire // count,
+                         "ratio": f"{wire / raw:.2f}",
+                         "us/frame": f"{elapsed / count * 1e6:.1f}"})
+    for policy, (raw, wire, elapsed, count) in totals.items():
+        rows.append({"policy": policy, "frames": "whole session",
+                     "raw_B/frame": raw // count,
+                     "wire_B/frame": wire // count,
+                     "ratio": f"{wire / raw:.2f}",
+                     "us/frame": f"{elapsed / count * 1e6:.1f}"})
+    report("compression (encode + decode)", rows)
+
+
+def bench_json(repeats: int = 200) -> None:
+    """Decode/encode cost per message shape for each JSON backend."""
+    import codec
+
+    shapes = {
+        "client audio": audio_frame(40),
+        "client video": video_frame(30 * 1024),
+        "model audio": model_audio_frame(40).decode("utf-8"),
+        "tool call": json.dumps({"toolCall": {"functionCalls": [{
+            "id": "call-1", "name": "lookup_weather",
+            "args": {"location": "Dublin, Ireland", "unit": "celsius"},
+        }]}}),
+        "turn complete": json.dumps({"serverContent": {"turnComplete": True}}),
+        "ping": json.dumps({"type": "ping"}),
+    }
+
+    def timed(func, arg) -> float:
+        best = float("inf")
+        for _ in range(5):  # best of five runs, to damp scheduler noise
+            start = time.perf_counter()
+            for _ in range(repeats):
+                func(arg)
+            best = min(best, time.perf_counter() - start)
+        return best / repeats * 1e6
+
+    def raw_chunks(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        # As translate_binary_frame leaves them: payloads still bytes.
+        return [{"mime_type": chunk["mime_type"],
+                 "data": base64.b64decode(chunk["data"])}
+                for chunk in data["realtime_input"]["media_chunks"]]
+
+    def dumps_raw(chunks: List[Dict[str, Any]]) -> str:
+        return dumps({"realtime_input": {"media_chunks": [
+            {"mime_type": chunk["mime_type"],
+             "data": base64.b64encode(chunk["data"]).decode("ascii")}
+            for chunk in chunks]}})
+
+    backends = ["stdlib (before)"] + [name for name in codec.BACKENDS
+                                      if codec.select_backend(name) == name]
+    rows: List[Dict[str, Any]] = []
+    previous = codec.BACKEND
+    try:
+        for backend in backends:
+            if backend == "stdlib (before)":
+                loads, dumps = json.loads, json.dumps
+            else:
+                codec.use_backend(backend)
+                loads, dumps = codec.loads, codec.dumps
+            for shape, message in shapes.items():
+                data = loads(message)
+                row = {"backend": backend, "message": shape,
+                       "bytes": len(message),
+                       "loads_us": f"{timed(loads, message):.1f}",
+                       "dumps_us": f"{timed(dumps, data):.1f}",
+                       "binary_dumps_us": "-", "binary_template_us": "-"}
+                if "realtime_input" in data:
+                    # Building the upstream message from a binary frame.
+                    chunks = raw_chunks(data)
+                    row["binary_dumps_us"] = f"{timed(dumps_raw, chunks):.1f}"
+                    if backend != "stdlib (before)":
+                        row["binary_template_us"] = (
+                            f"{timed(main.build_realtime_input, chunks):.1f}")
+                rows.append(row)
+    finally:
+        codec.use_backend(previous)
+    report("json", rows)
+
+
+def bench_validation(repeats: int = 20000) -> None:
+    """Per-frame shape validation: hand-written checks vs compiled schemas."""
+
+    def legacy(message: Dict[str, Any], is_client_to_server: bool) -> bool:
+        # GeminiProxy.validate_message_format before schema compilation.
+        try:
+            if is_client_to_server:
+                if "client_content" in message:
+                    content = message["client_content"]
+                    if not isinstance(content.get("turns"), list):
+                        return False
+                    for turn in content["turns"]:
+                        if not isinstance(turn.get("parts"), list):
+                            return False
+                elif "realtime_input" in message:
+                    input_data = message["realtime_input"]
+                    if not isinstance(input_data.get("media_chunks"), list):
+                        return False
+                elif "tool_response" in message:
+                    if not isinstance(message.get("tool_response"), dict):
+                        return False
+                else:
+                    return False
+            else:
+                if ("serverContent" not in message
+                        and "toolCall" not in message
+                        and "toolCallCancellation" not in message):
+                    return False
+                if ("serverContent" in message and
+                        "modelTurn" not in message["serverContent"]):
+                    return False
+            return True
+        except Exception:
+            return False
+
+    shapes = [
+        ("client audio", True, json.loads(audio_frame(40))),
+        ("client turn", True, {"client_content": {"turns": [
+            {"role": "user", "parts": [{"text": "hello"}]}] * 3,
+            "turn_complete": True}}),
+        ("tool response", True, {"tool_response": {"function_responses": [
+            {"id": "call-1", "response": {"result": "ok"}}]}}),
+        ("model audio", False, json.loads(model_audio_frame(40))),
+        ("turn complete", False, {"serverContent": {"turnComplete": True}}),
+        ("setup complete", False, {"setupComplete": {}}),
+        ("usage metadata", False, {"usageMetadata": {"totalTokenCount": 9}}),
+    ]
+    # Shapes with a flat fast path must cost no more than the legacy walk.
+    fast_paths = {"client audio", "model audio"}
+    proxy = GeminiProxy()
+    rounds = 200
+
+    def timed(*funcs) -> List[float]:
+        """Best ns per call of each of ``funcs``, timed in turns."""
+        batch = max(1, repeats // rounds)
+        best = [float("inf")] * len(funcs)
+        for _ in range(rounds):
+            for index, func in enumerate(funcs):
+                start = time.perf_counter()
+                for _ in range(batch):
+                    func()
+                best[index] = min(best[index], time.perf_counter() - start)
+        return [value / batch * 1e9 for value in best]
+
+    rows: List[Dict[str, Any]] = []
+    slower = []
+    for name, is_client, message in shapes:
+        validator = proxy.validators["upstream" if is_client
+                                     else "downstream"]
+        legacy_ns, compiled = timed(lambda: legacy(message, is_client),
+                                    lambda: validator.validate(message))
+        if name in fast_paths and compiled > legacy_ns:
+            slower.append(name)
+        # A long stream: the steady-state share of frames that are checked.
+        share = 1 / validator.sample_every
+        rows.append({
+            "message": name,
+            "legacy_ns": f"{legacy_ns:.0f}",
+            "legacy_ok": legacy(message, is_client),
+            "compiled_ns": f"{compiled:.0f}",
+            "compiled_ok": validator.validate(message),
+            "sampled_ns": f"{compiled * share:.0f}",
+        })
+    report("validation", rows)
+    assert not slower, f"Fast paths slower than the legacy walk: {slower}"
+
+
+BENCHMARKS: Dict[str, Callable[[], None]] = {
+    "forwarding": bench_forwarding,
+    "image_loop_lag": bench_image_loop_lag,
+    "image_profiles": bench_image_profiles,
+    "metrics_overhead": bench_metrics_overhead,
+    "logging_overhead": bench_logging_overhead,
+    "media_memory": bench_media_memory,
+    "static": bench_static,
+    "compression": bench_compression,
+    "json": bench_json,
+    "validation": bench_validation,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("name", nargs="?", choices=[*BENCHMARKS, "all"])
+    args = parser.parse_args()
+
+    main.logger.setLevel("WARNING")
+    if args.name is None:
+        for name, func in BENCHMARKS.items():
+            print(f"{name:18} {func.__doc__.splitlines()[0]}")
+    elif args.name == "all":
+        for func in BENCHMARKS.values():
+            func()
+    else:
+        BENCHMARKS[args.name]()
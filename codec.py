@@ -0,0 +1,144 @@
+"""JSON encoding and decoding for the proxy, on the fastest backend present.
+
+The backend is picked once at import: orjson, then msgspec, then the
+standard library. ``use_backend`` switches to another one (main.py's
+``--json-backend``; benchmark.py compares them all).
+
+Every backend reads ``str`` or ``bytes`` and writes compact ``str`` (a
+text frame when handed to websockets). Decode errors are instances of
+``DecodeError``, a tuple to use in ``except`` clauses.
+
+Outbound frames that wrap a large string, such as base64 media, can be
+built from a ``Template`` instead: the fixed part of the message is
+serialized once, and each frame is joined from it and pre-serialized
+fragments.
+"""
+import base64
+import json
+from typing import Any, Callable, List, Tuple, Type, Union
+
+BACKENDS = ("orjson", "msgspec", "json")
+
+
+def _load_backend(name: str):
+    if name == "orjson":
+        import orjson
+
+        def dumps(obj: Any) -> str:
+            return orjson.dumps(obj).decode("utf-8")
+
+        return orjson.loads, dumps, (orjson.JSONDecodeError,)
+    if name == "msgspec":
+        import msgspec
+
+        encode = msgspec.json.Encoder().encode
+        decode = msgspec.json.Decoder().decode
+
+        def dumps(obj: Any) -> str:
+            return encode(obj).decode("utf-8")
+
+        def loads(data: Union[str, bytes]) -> Any:
+            return decode(data.encode("utf-8") if isinstance(data, str)
+                          else data)
+
+        return loads, dumps, (msgspec.DecodeError,)
+    if name == "json":
+        encoder = json.JSONEncoder(separators=(",", ":"),
+                                   ensure_ascii=False)
+        return json.loads, encoder.encode, (json.JSONDecodeError,)
+    raise ValueError(f"Unknown JSON backend: {name}")
+
+
+def select_backend(preferred: str = "") -> str:
+    """The first of ``preferred`` and ``BACKENDS`` that can be imported."""
+    for name in ((preferred,) if preferred else ()) + BACKENDS:
+        try:
+            _load_backend(name)
+        except ImportError:
+            continue
+        return name
+    return "json"
+
+
+def use_backend(name: str) -> None:
+    """Switches the module-level ``loads``/``dumps`` to another backend."""
+    global BACKEND, loads, dumps, DecodeError
+    loads, dumps, DecodeError = _load_backend(name)
+    BACKEND = name
+
+
+loads: Callable[[Union[str, bytes]], Any]
+dumps: Callable[[Any], str]
+DecodeError: Tuple[Type[Exception], ...]
+BACKEND = ""
+use_backend(select_backend())
+
+
+def string_fragment(value: str) -> str:
+    """A JSON string literal for ``value``."""
+    return dumps(value)
+
+
+def base64_text(data: bytes) -> str:
+    """``data`` base64 encoded, for a quoted ``Slot``.
+
+    The base64 alphabet needs no escaping in a JSON string, so the text
+    never goes through ``dumps``.
+    """
+    return base64.b64encode(data).decode("ascii")
+
+
+def array_fragment(items: List[str]) -> str:
+    """A JSON array from already serialized items."""
+    return "[" + ",".join(items) + "]"
+
+
+class Slot:
+    """Marks where a ``Template`` takes a fragment.
+
+    A ``quoted`` slot is a JSON string whose contents are filled in as
+    given, which suits text that needs no escaping (base64, say) and saves
+    copying it into a string literal first.
+    """
+
+    def __init__(self, name: str, quoted: bool = False):
+        self.name = name
+        self.quoted = quoted
+
+
+class Template:
+    """A message serialized once, with slots filled per frame.
+
+    ``shape`` is a JSON value in which some values are ``Slot`` objects;
+    ``render`` takes a serialized JSON fragment (or a quoted slot's text)
+    per slot, by name, and never re-serializes the fixed part.
+    """
+
+    def __init__(self, shape: Any):
+        slots: List[Slot] = []
+
+        def mark(value: Any) -> Any:
+            if isinstance(value, Slot):
+                slots.append(value)
+                return f"\x00slot{len(slots) - 1}\x00"
+            if isinstance(value, dict):
+                return {key: mark(item) for key, item in value.items()}
+            if isinstance(value, list):
+                return [mark(item) for item in value]
+            return value
+
+        text = json.dumps(mark(shape), separators=(",", ":"))
+        # Compiled to a %-format, so render is a single C-level call.
+        text = text.replace("%", "%%")
+        for index, slot in enumerate(slots):
+            # json.dumps escapes the NUL bytes of a marker.
+            marker = json.dumps(f"\x00slot{index}\x00")
+            placeholder = f"%({slot.name})s"
+            if slot.quoted:
+                placeholder = '"' + placeholder + '"'
+            text = text.replace(marker, placeholder)
+        self.names = [slot.name for slot in slots]
+        self.format = text
+
+    def render(self, **fragments: str) -> str:
+        return self.format % fragments
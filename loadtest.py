@@ -0,0 +1,295 @@
+"""Load generator for the proxy, with mock_gemini.py as the upstream.
+
+Usage:
+    python loadtest.py --clients 200 --duration 30
+    python loadtest.py --proxy ws://localhost:8080 --proxy-pid 1234
+
+By default a proxy (``main.py``) is started in a subprocess and pointed at
+a mock Gemini Live server running in this process. Each simulated browser
+client authenticates, then repeats turns: it streams speech-like PCM at
+real-time pace, then digital silence until the model's reply completes.
+
+Because clients and the mock share a clock, PCM stamps give the latency
+through the proxy in both directions. Reported: connect time, frame
+throughput, upstream/downstream latency, time from end of speech to first
+model audio, and the proxy's CPU time and resident memory per connection
+(read from /proc, so Linux only).
+"""
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import websockets
+
+import main
+from benchmark import percentile, report
+from mock_gemini import (MockGemini, add_mock_arguments, mock_config,
+                         read_stamps, serve, stamp_pcm, tone)
+
+CLIENT_RATE = 16000
+
+
+@dataclass
+class LoadStats:
+    connect_times: List[float] = field(default_factory=list)
+    downstream_latencies: List[float] = field(default_factory=list)
+    first_audio: List[float] = field(default_factory=list)
+    frames_sent: int = 0
+    frames_received: int = 0
+    bytes_received: int = 0
+    turns: int = 0
+    turn_timeouts: int = 0
+    errors: int = 0
+
+
+@dataclass
+class Turn:
+    speech_ended: float = 0.0
+    first_audio: Optional[float] = None
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+def process_usage(pid: int) -> Optional[Tuple[float, int]]:
+    """CPU seconds and resident bytes of a process, from /proc."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/status") as f:
+            rss = next(int(line.split()[1]) * 1024 for line in f
+                       if line.startswith("VmRSS:"))
+    except (OSError, StopIteration):
+        return None
+    ticks = os.sysconf("SC_CLK_TCK")
+    return (int(fields[11]) + int(fields[12])) / ticks, rss
+
+
+def audio_message(pcm: bytes, sequence: int, binary: bool):
+    if binary:
+        return main.encode_binary_frame(main.MediaFrame(
+            "audio", "audio/pcm", sequence, time.time() * 1e3, pcm))
+    return json.dumps({"realtime_input": {"media_chunks": [{
+        "mime_type": "audio/pcm",
+        "data": base64.b64encode(pcm).decode("ascii"),
+    }]}})
+
+
+async def receive(websocket, stats: LoadStats, turn: List[Turn]) -> None:
+    async for message in websocket:
+        now = time.perf_counter()
+        stats.frames_received += 1
+        stats.bytes_received += len(message)
+        content = json.loads(message).get("serverContent")
+        if content is None:
+            continue
+        if content.get("turnComplete"):
+            turn[0].done.set()
+            continue
+        for part in content.get("modelTurn", {}).get("parts", []):
+            inline = part.get("inlineData")
+            if not inline:
+                continue
+            # The stamp is in the first 12 bytes: 16 base64 characters.
+            for sent_at in read_stamps(base64.b64decode(inline["data"][:16])):
+                stats.downstream_latencies.append(now - sent_at)
+            # Late audio from an abandoned turn does not count.
+            if turn[0].first_audio is None and turn[0].speech_ended:
+                turn[0].first_audio = now
+                stats.first_audio.append(now - turn[0].speech_ended)
+
+
+async def simulated_client(url: str, args: argparse.Namespace,
+                           stats: LoadStats, stop: asyncio.Event) -> None:
+    chunk_bytes = int(CLIENT_RATE * args.client_chunk_ms / 1000) * 2
+    interval = args.client_chunk_ms / 1000
+    speech = tone(CLIENT_RATE, frequency=200.0)
+    silence = bytes(chunk_bytes)
+    turn = [Turn()]
+    sequence = 0
+    start = time.perf_counter()
+    try:
+        async with websockets.connect(url, max_size=None) as websocket:
+            await websocket.send(json.dumps({"bearer_token": "load-test",
+                                             "binary_media": args.binary}))
+            reply = json.loads(await websocket.recv())
+            while reply.get("type") == "queued":  # admission control
+                reply = json.loads(await websocket.recv())
+            if reply.get("type") != "connection_success":
+                stats.errors += 1
+                return
+            stats.connect_times.append(time.perf_counter() - start)
+            receiver = asyncio.create_task(receive(websocket, stats, turn))
+
+            next_send = time.perf_counter()
+            while not stop.is_set():
+                turn[0] = Turn()
+                chunks = int(args.speech_ms / args.client_chunk_ms)
+                for index in range(chunks):
+                    position = index * chunk_bytes % len(speech)
+                    pcm = stamp_pcm(speech[position:position + chunk_bytes],
+                                    time.perf_counter())
+                    await websocket.send(audio_message(pcm, sequence,
+                                                       args.binary))
+                    sequence += 1
+                    stats.frames_sent += 1
+                    next_send += interval
+                    await asyncio.sleep(max(0.0, next_send
+                                            - time.perf_counter()))
+                turn[0].speech_ended = time.perf_counter()
+
+                deadline = turn[0].speech_ended + args.turn_timeout
+                while not turn[0].done.is_set() and not stop.is_set():
+                    if time.perf_counter() > deadline:
+                        stats.turn_timeouts += 1
+                        break
+                    await websocket.send(audio_message(silence, sequence,
+                                                       args.binary))
+                    sequence += 1
+                    stats.frames_sent += 1
+                    next_send += interval
+                    await asyncio.sleep(max(0.0, next_send
+                                            - time.perf_counter()))
+                if turn[0].done.is_set():
+                    stats.turns += 1
+            receiver.cancel()
+    except Exception:
+        stats.errors += 1
+
+
+async def wait_for_port(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("localhost", port), timeout=1):
+                return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Proxy did not listen on port {port}")
+
+
+async def start_proxy(service_url: str, ws_port: int, http_port: int,
+                      log_path: Optional[str] = None) -> subprocess.Popen:
+    """Runs main.py in a subprocess and waits until it accepts clients."""
+    log = open(log_path, "ab") if log_path else subprocess.DEVNULL
+    process = subprocess.Popen(
+        [sys.executable, "main.py", "--service-url", service_url,
+         "--ws-port", str(ws_port), "--http-port", str(http_port)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.DEVNULL, stderr=log)
+    await wait_for_port(ws_port)
+    return process
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    mock = MockGemini(mock_config(args))
+    mock_server = await serve("localhost", args.mock_port, mock)
+    process = None
+    url, pid = args.proxy, args.proxy_pid
+    if url is None:
+        process = await start_proxy(f"ws://localhost:{args.mock_port}",
+                                    args.ws_port, args.http_port,
+                                    args.proxy_log)
+        url, pid = f"ws://localhost:{args.ws_port}", process.pid
+
+    stats = LoadStats()
+    stop = asyncio.Event()
+    baseline = process_usage(pid) if pid else None
+    try:
+        clients = []
+        for _ in range(args.clients):
+            clients.append(asyncio.create_task(
+                simulated_client(url, args, stats, stop)))
+            await asyncio.sleep(1 / args.ramp)
+
+        # Measure the steady state only.
+        started = time.perf_counter()
+        own_cpu = time.process_time()
+        usage_start = process_usage(pid) if pid else None
+        sent, received = stats.frames_sent, stats.frames_received
+        latencies_from = len(mock.upstream_latencies)
+        await asyncio.sleep(args.duration)
+        elapsed = time.perf_counter() - started
+        own_cpu = time.process_time() - own_cpu
+        usage_end = process_usage(pid) if pid else None
+        sent = stats.frames_sent - sent
+        received = stats.frames_received - received
+        upstream = mock.upstream_latencies[latencies_from:]
+
+        stop.set()
+        await asyncio.wait(clients, timeout=args.turn_timeout + 5)
+    finally:
+        mock_server.close()
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=60)
+
+    connected = len(stats.connect_times)
+    results: Dict[str, Any] = {
+        "clients": args.clients,
+        "connected": connected,
+        "errors": stats.errors,
+        "turns": stats.turns,
+        "turn_timeouts": stats.turn_timeouts,
+        "connect_p50_ms": percentile(stats.connect_times, 50) * 1e3,
+        "connect_p99_ms": percentile(stats.connect_times, 99) * 1e3,
+        "upstream_fps": sent / elapsed,
+        "downstream_fps": received / elapsed,
+        "upstream_p50_ms": percentile(upstream, 50) * 1e3,
+        "upstream_p99_ms": percentile(upstream, 99) * 1e3,
+        "downstream_p50_ms": percentile(stats.downstream_latencies, 50) * 1e3,
+        "downstream_p99_ms": percentile(stats.downstream_latencies, 99) * 1e3,
+        "first_audio_p50_ms": percentile(stats.first_audio, 50) * 1e3,
+        "first_audio_p99_ms": percentile(stats.first_audio, 99) * 1e3,
+        # Near 100% the generator, not the proxy, is the bottleneck.
+        "loadgen_cpu_pct": own_cpu / elapsed * 100,
+    }
+    if baseline and usage_start and usage_end and connected:
+        cpu = usage_end[0] - usage_start[0]
+        results["proxy_cpu_pct"] = cpu / elapsed * 100
+        results["cpu_ms_per_conn_s"] = cpu / elapsed / connected * 1e3
+        results["rss_kb_per_conn"] = ((usage_end[1] - baseline[1])
+                                      / connected / 1024)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--ramp", type=float, default=50.0,
+                        help="new clients per second")
+    parser.add_argument("--duration", type=float, default=20.0,
+                        help="seconds measured after the ramp")
+    parser.add_argument("--speech-ms", type=float, default=1500.0)
+    parser.add_argument("--client-chunk-ms", type=float, default=40.0)
+    parser.add_argument("--turn-timeout", type=float, default=10.0)
+    parser.add_argument("--json-media", dest="binary", action="store_false",
+                        help="send base64 JSON instead of binary frames")
+    parser.add_argument("--proxy", help="existing proxy URL to load")
+    parser.add_argument("--proxy-pid", type=int,
+                        help="pid of --proxy, for CPU and memory")
+    parser.add_argument("--proxy-log", help="file for the proxy's log")
+    parser.add_argument("--mock-port", type=int, default=9000)
+    parser.add_argument("--ws-port", type=int, default=8090)
+    parser.add_argument("--http-port", type=int, default=8092)
+    parser.add_argument("--json", dest="json_path",
+                        help="also write the results to this file")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel("WARNING")
+    results = asyncio.run(run(args))
+    report("loadtest", [{"metric": name,
+                         "value": (f"{value:.2f}" if isinstance(value, float)
+                                   else value)}
+                        for name, value in results.items()])
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
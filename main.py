@@ -1,15 +1,36 @@
+import argparse
 import asyncio
 import json
 import ssl
 import time
 import logging
 import base64
+import gzip
+import hashlib
+import heapq
+import hmac
 import io
+import math
+import os
+import multiprocessing
+import queue
+import random
+import re
+import signal
+import stat
+import struct
+import threading
 from enum import Enum
-from typing import Dict, Any, Optional, List, Union
-from dataclasses import dataclass
+from typing import Dict, Any, Awaitable, Callable, Optional, List, Union
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from concurrent.futures import (Executor, ProcessPoolExecutor,
+                                ThreadPoolExecutor)
+from dataclasses import dataclass, field
 from uuid import uuid4
 from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging.handlers import QueueHandler, QueueListener
 import pathlib
 import mimetypes
 import websockets
@@ -17,14 +38,40 @@ from websockets.legacy.protocol import WebSocketCommonProtocol
 from websockets.legacy.server import WebSocketServerProtocol
 from asyncio import sleep
 from PIL import Image
+try:
+    import numpy as np
+except ImportError:  # voice activity detection is unavailable without NumPy
+    np = None
+try:
+    import brotli
+except ImportError:  # static assets are precompressed with gzip only
+    brotli = None
 from aiohttp import web
+
+import codec
 from websockets.exceptions import ConnectionClosedError
+from websockets.extensions.permessage_deflate import (
+    ClientPerMessageDeflateFactory,
+    PerMessageDeflate,
+    ServerPerMessageDeflateFactory,
+)
+from websockets.frames import CTRL_OPCODES, Opcode
 
 # Configure logging
 logging.basicConfig(level=logging.INFO,
                     format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
+# Per-frame log calls use %-style arguments, formatted only if the record is
+# emitted, and pass payloads as PayloadSummary so media shows up as type,
+# size and hash instead of in full. One error repeating on a connection is
+# logged at most once per LOG_ERROR_INTERVAL. setup_logging() moves the
+# handlers behind a queue drained by a thread, so their I/O never runs on
+# the event loop.
+LOG_ERROR_INTERVAL = 10.0  # seconds
+LOG_PREVIEW_SIZE = 64  # characters of a long string kept in summaries
+_log_handlers: List[logging.Handler] = []
+
 # Constants
 HOST = "us-central1-aiplatform.googleapis.com"
 API_VERSION = "v1alpha"
@@ -33,6 +80,25 @@ MODEL_NAME = ("projects/impactful-arbor-399011/locations/us-central1/"
 SERVICE_URL = (f"wss://{HOST}/ws/google.cloud.aiplatform.v1beta1."
                "LlmBidiService/BidiGenerateContent")
 DEBUG = True
+HTTP_PORT = 8082
+WS_PORT = 8080
+
+# Multi-process serving: with WORKER_COUNT > 1 (or --workers N) a
+# supervisor forks that many workers, each binding both ports with
+# SO_REUSEPORT so the kernel spreads connections across them. SIGHUP does a
+# rolling restart; SIGTERM/SIGINT drain and stop all workers.
+WORKER_COUNT = 1
+WORKER_DRAIN_TIMEOUT = 30.0  # seconds a stopping worker waits for sessions
+WORKER_METRICS_INTERVAL = 10.0  # seconds between worker metric pushes
+WORKER_READY_TIMEOUT = 30.0
+# Workers push their /metrics exposition to the supervisor, which sums it:
+# counters and histograms also keep the totals of replaced workers, so they
+# never go backwards; gauges are summed over live workers, except these,
+# which are averaged. The supervisor serves the sum on METRICS_PORT, and
+# each worker's /metrics redirects there, so every scrape sees all workers.
+AVERAGED_GAUGES = frozenset({"finn_admission_limit",
+                             "finn_upstream_pool_hit_rate"})
+METRICS_PORT = 8083
 
 
 class ResponseModality(Enum):
@@ -80,15 +146,1240 @@ MAX_IMAGE_SIZE = 4 * 1024 * 1024  # 4MB
 MAX_AUDIO_CHUNK_SIZE = 64 * 1024  # 64KB
 MAX_VIDEO_CHUNK_SIZE = 256 * 1024  # 256KB
 
+# Binary media frames, negotiated with "binary_media": true in the auth
+# message. Layout (network byte order): version u8, kind u8, sequence u32,
+# timestamp_ms f64, mime_len u8, then the MIME type and the raw payload.
+BINARY_MEDIA_ENABLED = True
+BINARY_FRAME_VERSION = 1
+BINARY_FRAME_HEADER = struct.Struct("!BBIdB")
+BINARY_FRAME_KINDS = {1: "audio", 2: "image", 3: "video"}
+BINARY_FRAME_LIMITS = {
+    "audio": MAX_AUDIO_CHUNK_SIZE,
+    "image": MAX_IMAGE_SIZE,
+    "video": MAX_VIDEO_CHUNK_SIZE,
+}
+
+# Image quality profiles. "full" is the original behaviour (LANCZOS to
+# 2048 px). The others decode JPEGs at reduced scale via draft mode, shrink
+# by integer factors before the final resample (reducing_gap), target the
+# resolution the model actually consumes, and forward images untouched when
+# they are already small enough and in a supported format. A jpeg_quality
+# of None keeps PIL's default (75).
+IMAGE_PROFILES = {
+    "full": {"max_dim": 2048, "resample": Image.Resampling.LANCZOS,
+             "draft": False, "reducing_gap": None, "passthrough": False,
+             "jpeg_quality": None},
+    "balanced": {"max_dim": 1024, "resample": Image.Resampling.BICUBIC,
+                 "draft": True, "reducing_gap": 3.0, "passthrough": True,
+                 "jpeg_quality": 85},
+    "model": {"max_dim": 768, "resample": Image.Resampling.BILINEAR,
+              "draft": True, "reducing_gap": 2.0, "passthrough": True,
+              "jpeg_quality": 80},
+}
+IMAGE_PROFILE = "model"
+
+# Image processing runs in a worker pool so decoding and resizing never
+# blocks the event loop. "process" sidesteps the GIL; "thread" avoids
+# pickling overhead and works where fork/spawn is unavailable. With
+# IMAGE_PROCESSING_ENABLED, client image chunks are normalized to
+# IMAGE_PROFILE in the pool before they are forwarded upstream.
+IMAGE_PROCESSING_ENABLED = True
+IMAGE_POOL_KIND = "process"
+IMAGE_POOL_WORKERS = min(4, os.cpu_count() or 1)
+IMAGE_POOL_MAX_PENDING = IMAGE_POOL_WORKERS * 2  # in-flight jobs
+
+# Static-scene suppression for realtime video. A frame is dropped when its
+# 64-bit dHash is within VIDEO_DEDUP_THRESHOLD bits of the last forwarded
+# frame, but at least one frame is forwarded every VIDEO_KEYFRAME_INTERVAL.
+VIDEO_DEDUP_ENABLED = True
+VIDEO_DEDUP_THRESHOLD = 5
+VIDEO_KEYFRAME_INTERVAL = 10.0  # seconds
+
+# Pass-through forwarding: frames whose top-level key is listed here are
+# forwarded as received without being decoded and re-encoded. Anything else
+# (pings, tool calls, errors, unknown shapes) takes the full parse path.
+PASSTHROUGH_CLIENT_KEYS = frozenset({"realtime_input", "client_content"})
+PASSTHROUGH_SERVER_KEYS = frozenset({"serverContent"})
+PEEK_WINDOW = 128  # bytes scanned to find the top-level key
+_TOP_LEVEL_KEY_RE = re.compile(r'\s*\{\s*"([A-Za-z_]+)"\s*:')
+_TOP_LEVEL_KEY_RE_BYTES = re.compile(rb'\s*\{\s*"([A-Za-z_]+)"\s*:')
+_CLOSING_BRACE_RE = re.compile(r'\}\s*$')
+_CLOSING_BRACE_RE_BYTES = re.compile(rb'\}\s*$')
+_MIME_TYPE_RE = re.compile(r'"mime_?[tT]ype"\s*:\s*"([^"]{1,64})"')
+_MIME_TYPE_RE_BYTES = re.compile(rb'"mime_?[tT]ype"\s*:\s*"([^"]{1,64})"')
+
+# Shapes of the messages the proxy parses, by top-level key, compiled into
+# checkers when GeminiProxy starts (see compile_schemas). A type matches by
+# isinstance, a one-item list is a list of that shape, and a dict needs its
+# keys, except those prefixed with "?", to match in turn; other keys are
+# allowed. Server messages with no known key (usage metadata, goAway and
+# the like) are forwarded unchecked; client ones are refused.
+CLIENT_MESSAGE_SCHEMAS = {
+    "client_content": {"turns": [{"parts": list}]},
+    "realtime_input": {"media_chunks": list},
+    "tool_response": dict,
+}
+SERVER_MESSAGE_SCHEMAS = {
+    "setupComplete": dict,
+    "serverContent": {"?modelTurn": {"parts": list},
+                      "?turnComplete": bool, "?interrupted": bool},
+    "toolCall": dict,
+    "toolCallCancellation": dict,
+}
+# Every client frame is checked before it reaches Gemini. Server frames are
+# all checked up to VALIDATION_FIRST_FRAMES, then one in
+# VALIDATION_SAMPLE_EVERY (1 checks them all); the rest are forwarded to the
+# client unchecked.
+VALIDATION_FIRST_FRAMES = 100
+VALIDATION_SAMPLE_EVERY = 10
+VALIDATION_TIME_BUCKETS = (1e-06, 2.5e-06, 5e-06, 1e-05, 2.5e-05, 5e-05,
+                           0.0001, 0.001)
+
+# permessage-deflate per leg: "client" is browser <-> proxy, "upstream" is
+# proxy <-> Gemini. window_bits and mem_level size the zlib state each
+# connection keeps (about 2**(window_bits + 2) + 2**(mem_level + 9) bytes
+# per compressor). With skip_media, frames the proxy sends that declare an
+# inline media mime type near their start and are at least media_min_size
+# bytes go out uncompressed: base64 audio and JPEG deflate poorly at a high
+# CPU cost, while JSON control, text and tool frames compress well.
+COMPRESSION_SETTINGS = {
+    "client": {"enabled": True, "window_bits": 12, "mem_level": 5,
+               "level": 6, "skip_media": True, "media_min_size": 1024},
+    "upstream": {"enabled": True, "window_bits": 12, "mem_level": 5,
+                 "level": 6, "skip_media": True, "media_min_size": 1024},
+}
+
+# Per-connection send budgets (messages/s and burst size). Realtime media
+# and conversational turns are throttled independently so a burst of typed
+# turns never delays audio and vice versa.
+RATE_LIMITS = {
+    "realtime": {"rate": 50.0, "burst": 100},
+    "turn": {"rate": 10.0, "burst": 20},
+}
+RATE_BUDGETS = {
+    "realtime_input": "realtime",
+    "client_content": "turn",
+    "tool_response": "turn",
+}
+GLOBAL_RATE_LIMIT: Optional[float] = None  # messages/s across all clients
+
+# Upstream audio coalescing: consecutive PCM chunks from a client are merged
+# into AUDIO_FRAME_MS frames; a partial frame is flushed once it has waited
+# AUDIO_FLUSH_DEADLINE_MS. PCM is 16-bit mono; the rate comes from the
+# "rate=" mime parameter when present.
+AUDIO_COALESCE_ENABLED = True
+AUDIO_FRAME_MS = 60
+AUDIO_FLUSH_DEADLINE_MS = 100
+AUDIO_DEFAULT_RATE = 16000
+MODEL_AUDIO_DEFAULT_RATE = 24000
+
+# Server-side voice activity detection on client PCM. Frames of
+# VAD_SETTINGS["frame_ms"] count as speech when louder than threshold_dbfs
+# with a zero-crossing rate below max_zero_crossing_rate. Silence is
+# suppressed, except for hangover_ms after speech (so the model still hears
+# the pause that ends a turn) and preroll_ms before it (so onsets are not
+# clipped). Clients may override any setting in the auth message's "vad".
+VAD_ENABLED = True
+VAD_SETTINGS = {
+    "frame_ms": 20,
+    "threshold_dbfs": -45.0,
+    "max_zero_crossing_rate": 0.35,
+    "hangover_ms": 600,
+    "preroll_ms": 200,
+}
+
+# Downstream jitter buffer: model audio arrives in bursts; when enabled it
+# is released to the client at playback pace, at most JITTER_BUFFER_LEAD_MS
+# ahead of real time.
+JITTER_BUFFER_ENABLED = False
+JITTER_BUFFER_LEAD_MS = 200
+
+# Each proxy direction buffers at most FORWARD_QUEUE_SIZE messages between
+# its reader and writer. When full, "block" messages (turns, tool calls,
+# turn-complete and other control frames) wait and are never dropped,
+# "drop_oldest" evicts the oldest droppable message, and "latest" keeps
+# only the newest queued message of its class.
+FORWARD_QUEUE_SIZE = 64
+FORWARD_QUEUE_CLOSE_TIMEOUT = 5.0  # seconds to flush on shutdown
+QUEUE_POLICIES = {
+    "control": "block",
+    "audio": "drop_oldest",
+    "video": "latest",
+}
+
+# Session registry: at most CONNECTION_LIMIT sessions, counting those
+# still authenticating or connecting upstream; clients over the limit are
+# turned away before any upstream socket is opened. Sessions with no frame
+# in either direction for IDLE_TIMEOUT are closed. Their deadlines sit in a
+# heap, re-armed lazily, so the reaper only wakes when one can expire.
+CONNECTION_LIMIT = 100
+IDLE_TIMEOUT = 300.0  # seconds
+
+# Admission control: at most `limit` clients open an upstream session at
+# once. The limit starts at ADMISSION_INITIAL_LIMIT and adapts within the
+# MIN/MAX bounds: it grows by one for every `limit` handshakes that finish
+# within ADMISSION_TARGET_CONNECT and shrinks by a quarter, at most once a
+# second, when one is slower or fails. Further clients wait, in a queue of
+# at most ADMISSION_QUEUE_SIZE and for at most ADMISSION_WAIT_TIMEOUT, and
+# are told their position as it changes (checked every
+# ADMISSION_POSITION_INTERVAL). Clients that find the queue full or time
+# out are shed with a retryable SERVER_BUSY error.
+ADMISSION_INITIAL_LIMIT = 16
+ADMISSION_MIN_LIMIT = 2
+ADMISSION_MAX_LIMIT = 64
+ADMISSION_TARGET_CONNECT = 2.0  # seconds
+ADMISSION_QUEUE_SIZE = 100
+ADMISSION_WAIT_TIMEOUT = 20.0  # seconds
+ADMISSION_POSITION_INTERVAL = 1.0  # seconds
+ADMISSION_RETRY_AFTER = 5  # seconds suggested to shed clients
+
+# Resumable sessions: when a client's socket drops (ABNORMAL_CLOSURE, with
+# no close frame from either side), its upstream session is kept for
+# RESUME_GRACE_PERIOD so the client can reconnect and pick up where it left
+# off. Frames sent to the client are numbered from 1 per session and the
+# latest ones are kept in the connection's media ring (below); a client
+# resuming with the number of frames it received gets the rest. A session
+# the client closed, or the proxy closed itself (send_error, reject), ends
+# at once.
+RESUME_ENABLED = True
+RESUME_GRACE_PERIOD = 30.0  # seconds
+ABNORMAL_CLOSURE = 1006
+
+# Media rings: buffered frames are copied into fixed-size slabs drawn from
+# one pool per process, with a small record per frame, so the memory a
+# session holds does not grow with its length. A connection holds at most
+# MEDIA_RING_BYTES of slabs and all connections together MEDIA_POOL_BYTES;
+# the oldest frames are evicted to stay within both, and once older than
+# MEDIA_RING_MAX_AGE. Frames larger than a slab are not kept.
+MEDIA_SLAB_SIZE = 256 * 1024
+MEDIA_RING_BYTES = 2 * 1024 * 1024  # about 30 s of model audio
+MEDIA_POOL_BYTES = 64 * 1024 * 1024
+MEDIA_RING_MAX_AGE = 60.0  # seconds
+
+# Static assets: JS, CSS and HTML files under the static directory are read
+# into a manifest at startup, with gzip and (when the brotli package is
+# installed) brotli variants, and served with strong ETags so revalidation
+# costs a 304. An entry is re-read when its file's mtime changes, checked
+# at most every STATIC_RECHECK_INTERVAL. Names that carry a content hash
+# (app.1a2b3c4d.js) may be cached by browsers for good; everything else is
+# revalidated on each use.
+STATIC_MANIFEST_SUFFIXES = (".js", ".css", ".html")
+STATIC_RECHECK_INTERVAL = 1.0  # seconds
+STATIC_COMPRESS_MIN_SIZE = 512  # bytes; smaller files are sent as is
+STATIC_IMMUTABLE_MAX_AGE = 365 * 24 * 3600  # seconds
+_HASHED_NAME_RE = re.compile(r"\.[0-9a-f]{8,}\.[a-z0-9]+$")
+
+# Other static files are read off the event loop on first use and kept in
+# an LRU cache of at most STATIC_CACHE_BYTES, revalidated against their
+# mtime like manifest entries. Concurrent misses for a file share one read.
+# Files over STATIC_CACHE_MAX_FILE are never read whole: they are streamed
+# from disk with sendfile.
+STATIC_CACHE_BYTES = 32 * 1024 * 1024
+STATIC_CACHE_MAX_FILE = 1024 * 1024
+
+# Warm pool of upstream sessions that have already completed the TLS
+# handshake and setup exchange, keyed by (token, config). The per-key size
+# follows the observed arrival rate; idle sessions expire after the TTL.
+UPSTREAM_POOL_ENABLED = True
+UPSTREAM_POOL_TTL = 60.0  # seconds
+UPSTREAM_POOL_MAX_PER_KEY = 4
+UPSTREAM_POOL_HEALTH_TIMEOUT = 1.0  # seconds
+CONNECT_TIME_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 15.0)
+
+# Histograms exposed on the HTTP server's /metrics (Prometheus text format).
+# Every series is allocated once with the fixed buckets below; observing is
+# a bisect and three increments on the event loop thread, so no locks are
+# taken. Time to first model audio is measured from the last client frame
+# forwarded upstream to the first audio frame of the model's reply.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0)
+MESSAGE_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+FIRST_AUDIO_BUCKETS = (0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+# Per-client series on /metrics carry a "client" label, so only the
+# CLIENT_METRICS_LIMIT sessions with the most queued messages are exported
+# on each scrape, which bounds the label set.
+CLIENT_METRICS_LIMIT = 50
+TURN_END_MARKERS = ('"turnComplete"', '"interrupted"')
+TURN_END_MAX_SIZE = 1024  # bytes; larger downstream frames are not scanned
+MODEL_TURN_MARKER = '"modelTurn"'
+
+# Turn tracing: a TRACE_SAMPLE_RATE fraction of sessions records a timeline
+# of forwarded frames and turn phases (client input, model think, first
+# chunk delivery, model response), at most TRACE_MAX_EVENTS per session.
+# The last TRACE_KEEP_SESSIONS sampled timelines are served by the HTTP
+# server at /traces/<client_id> as Chrome trace JSON (chrome://tracing,
+# Perfetto) or, with ?format=jsonl, as JSON lines.
+TRACE_SAMPLE_RATE = 0.01
+TRACE_MAX_EVENTS = 5000
+TRACE_KEEP_SESSIONS = 50
+TRACE_THREADS = {"session": 0, "upstream": 1, "downstream": 2, "turn": 3}
+
+# Opt-in session recording: with RECORD_DIR set (or --record-dir), every
+# frame the proxy reads is appended to RECORD_DIR/<client_id>.finnrec as a
+# RECORD_HEADER (kind, encoding, seconds since the session started, payload
+# length) followed by the payload. The first base64 "data" value of a JSON
+# frame is stored as raw bytes between the text before and after it. A
+# session stops being recorded at RECORD_MAX_BYTES. Replay with replay.py.
+# Frames are batched on the event loop and encoded and written by a single
+# writer thread; a session whose batches back up past RECORD_MAX_PENDING
+# (bytes across all sessions) stops being recorded rather than grow memory.
+RECORD_DIR: Optional[str] = None
+RECORD_MAX_BYTES = 256 * 1024 * 1024
+RECORD_MEDIA_MIN_SIZE = 256  # base64 characters worth storing raw
+RECORD_BUFFER_SIZE = 256 * 1024  # bytes of frames per batch
+RECORD_MAX_PENDING = 64 * 1024 * 1024
+RECORD_MAGIC = b"FINNREC1"
+RECORD_HEADER = struct.Struct("!BBdI")
+RECORD_LENGTH = struct.Struct("!I")
+RECORD_KINDS = {0: "meta", 1: "client", 2: "server"}
+RECORD_BINARY = 1  # encoding flag: binary websocket frame, not text
+RECORD_MEDIA = 2  # encoding flag: payload is prefix, raw media, suffix
+_DATA_VALUE_RE = re.compile(rb'"data"\s*:\s*"')
+
+
+def peek_top_level_key(message: Union[str, bytes]) -> Optional[str]:
+    """Returns the first top-level key of a JSON object frame.
+
+    Only the first ``PEEK_WINDOW`` characters and the tail of the frame are
+    scanned, so the cost does not grow with the size of the media payload.
+    Returns None when the frame does not look like a JSON object.
+    """
+    if isinstance(message, str):
+        key_re, brace_re = _TOP_LEVEL_KEY_RE, _CLOSING_BRACE_RE
+    else:
+        key_re, brace_re = _TOP_LEVEL_KEY_RE_BYTES, _CLOSING_BRACE_RE_BYTES
+
+    match = key_re.match(message, 0, PEEK_WINDOW)
+    if not match:
+        return None
+    if not brace_re.search(message, max(0, len(message) - 16)):
+        return None
+
+    key = match.group(1)
+    return key if isinstance(key, str) else key.decode("ascii")
+
+
+def peek_mime_type(message: Union[str, bytes]) -> Optional[str]:
+    """Returns the first mime type declared near the start of a frame.
+
+    The browser clients put ``mime_type`` ahead of ``data`` in each media
+    chunk, so this finds it without scanning the base64 payload.
+    """
+    pattern = (_MIME_TYPE_RE if isinstance(message, str)
+               else _MIME_TYPE_RE_BYTES)
+    match = pattern.search(message, 0, PEEK_WINDOW)
+    if not match:
+        return None
+    mime_type = match.group(1)
+    return mime_type if isinstance(mime_type, str) else mime_type.decode(
+        "ascii", "replace")
+
+
+def is_media_frame(data: Union[str, bytes, memoryview],
+                   min_size: int) -> bool:
+    """Whether a frame carries inline media; only the head is scanned."""
+    if len(data) < min_size:
+        return False
+    head = data[:PEEK_WINDOW]
+    if isinstance(head, memoryview):
+        head = head.tobytes()
+    return peek_mime_type(head) is not None
+
+
+class SelectivePerMessageDeflate(PerMessageDeflate):
+    """permessage-deflate that sends inline media frames uncompressed.
+
+    RFC 7692 lets a sender leave any message uncompressed (RSV1 unset);
+    skipped messages do not touch the compression context.
+    """
+
+    def __init__(self, extension: PerMessageDeflate, media_min_size: int):
+        super().__init__(extension.remote_no_context_takeover,
+                         extension.local_no_context_takeover,
+                         extension.remote_max_window_bits,
+                         extension.local_max_window_bits,
+                         extension.compress_settings)
+        self.media_min_size = media_min_size
+        self.skipping = False  # whether the current message is sent as is
+
+    def encode(self, frame):
+        if frame.opcode in CTRL_OPCODES:
+            return frame
+        if frame.opcode is not Opcode.CONT:
+            self.skipping = is_media_frame(frame.data, self.media_min_size)
+        if self.skipping:
+            return frame
+        return super().encode(frame)
+
+
+class SelectiveServerDeflateFactory(ServerPerMessageDeflateFactory):
+    def __init__(self, media_min_size: int, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.media_min_size = media_min_size
+
+    def process_request_params(self, params, accepted_extensions):
+        response_params, extension = super().process_request_params(
+            params, accepted_extensions)
+        return response_params, SelectivePerMessageDeflate(
+            extension, self.media_min_size)
+
+
+class SelectiveClientDeflateFactory(ClientPerMessageDeflateFactory):
+    def __init__(self, media_min_size: int, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.media_min_size = media_min_size
+
+    def process_response_params(self, params, accepted_extensions):
+        extension = super().process_response_params(params,
+                                                    accepted_extensions)
+        return SelectivePerMessageDeflate(extension, self.media_min_size)
+
+
+def compression_options(leg: str, server: bool) -> Dict[str, Any]:
+    """``websockets.serve``/``connect`` arguments for a leg's settings."""
+    settings = COMPRESSION_SETTINGS[leg]
+    if not settings["enabled"]:
+        return {"compression": None}
+    factory_args = {
+        "client_max_window_bits": settings["window_bits"],
+        "compress_settings": {"memLevel": settings["mem_level"],
+                              "level": settings["level"]},
+    }
+    if server:
+        # Both our compressor and what the browser may make us inflate.
+        factory_args["server_max_window_bits"] = settings["window_bits"]
+    if settings["skip_media"]:
+        factory = (SelectiveServerDeflateFactory if server
+                   else SelectiveClientDeflateFactory)(
+            settings["media_min_size"], **factory_args)
+    else:
+        factory = (ServerPerMessageDeflateFactory if server
+                   else ClientPerMessageDeflateFactory)(**factory_args)
+    return {"compression": None, "extensions": [factory]}
+
 
 @dataclass
 class ConnectionInfo:
     websocket: WebSocketCommonProtocol
-    last_active: float
+    last_active: float  # time.monotonic() of the last frame either way
     client_id: str
     config: Dict[str, Any]
     active_stream: bool = False
-    media_buffer: List[Dict[str, Any]] = None
+    media_buffer: Optional["MediaRing"] = None
+    buckets: Dict[str, "TokenBucket"] = field(default_factory=dict)
+    queue_depth: int = 0
+    throttle_delay: float = 0.0
+    throttled_messages: int = 0
+    frame_hash: Optional[int] = None
+    frame_forwarded_at: float = 0.0
+    binary_media: bool = False
+    binary_sequence: int = -1
+    queues: Dict[str, "ForwardQueue"] = field(default_factory=dict)
+    audio: Optional["AudioAggregator"] = None
+    vad: Optional["VoiceActivityDetector"] = None
+    audio_chunks_in: int = 0
+    audio_frames_out: int = 0
+    connected_at: float = field(default_factory=time.monotonic)
+    last_client_input: float = 0.0
+    turn_started_at: float = 0.0
+    first_chunk_at: float = 0.0
+    awaiting_response: bool = False
+    awaiting_audio: bool = False
+    model_responding: bool = False
+    trace: Optional["SessionTrace"] = None
+    recorder: Optional["SessionRecorder"] = None
+    upstream: Optional[WebSocketCommonProtocol] = None
+    token_digest: str = ""
+    resume: Optional["ResumeBuffer"] = None
+    parked: Optional[asyncio.Future] = None  # set while awaiting a resume
+    log_limiter: "LogRateLimiter" = field(
+        default_factory=lambda: LogRateLimiter())
+
+
+@dataclass
+class MediaFrame:
+    kind: str
+    mime_type: str
+    sequence: int
+    timestamp_ms: float
+    payload: bytes
+
+
+def decode_binary_frame(message: bytes) -> MediaFrame:
+    """Parses a binary media frame sent by a client."""
+    header_size = BINARY_FRAME_HEADER.size
+    if len(message) < header_size:
+        raise GeminiValidationError("Binary frame too short")
+    version, kind, sequence, timestamp_ms, mime_len = (
+        BINARY_FRAME_HEADER.unpack_from(message))
+    if version != BINARY_FRAME_VERSION:
+        raise GeminiValidationError(
+            f"Unsupported binary frame version: {version}")
+    if kind not in BINARY_FRAME_KINDS:
+        raise GeminiValidationError(f"Unknown binary frame kind: {kind}")
+
+    kind_name = BINARY_FRAME_KINDS[kind]
+    payload_start = header_size + mime_len
+    mime_type = message[header_size:payload_start].decode("ascii")
+    if not mime_type.startswith(kind_name + "/"):
+        raise GeminiValidationError(
+            f"MIME type {mime_type} does not match frame kind {kind_name}")
+    payload = message[payload_start:]
+    if len(payload) > BINARY_FRAME_LIMITS[kind_name]:
+        raise GeminiMediaError(f"{kind_name} frame exceeds maximum size")
+    return MediaFrame(kind_name, mime_type, sequence, timestamp_ms, payload)
+
+
+def encode_binary_frame(frame: MediaFrame) -> bytes:
+    """Builds a binary media frame; the inverse of decode_binary_frame."""
+    kind = next(k for k, name in BINARY_FRAME_KINDS.items()
+                if name == frame.kind)
+    mime = frame.mime_type.encode("ascii")
+    return (BINARY_FRAME_HEADER.pack(BINARY_FRAME_VERSION, kind,
+                                     frame.sequence, frame.timestamp_ms,
+                                     len(mime))
+            + mime + frame.payload)
+
+
+# Upstream realtime_input messages, serialized once; see build_realtime_input.
+MEDIA_CHUNK_SHAPE = {"mime_type": codec.Slot("mime_type"),
+                     "data": codec.Slot("data", quoted=True)}
+MEDIA_CHUNK = codec.Template(MEDIA_CHUNK_SHAPE)
+REALTIME_INPUT = codec.Template(
+    {"realtime_input": {"media_chunks": codec.Slot("chunks")}})
+REALTIME_INPUT_SINGLE = codec.Template(
+    {"realtime_input": {"media_chunks": [MEDIA_CHUNK_SHAPE]}})
+
+
+def build_realtime_input(chunks: List[Dict[str, Any]]) -> str:
+    """Builds an upstream realtime_input message from media chunks.
+
+    Raw ``bytes`` payloads are base64 encoded once and spliced into the JSON
+    text, so the (large) string is never passed through a JSON encoder.
+    """
+    if len(chunks) == 1 and not isinstance(chunks[0]["data"], str):
+        # Binary frames and aggregated audio: one chunk of raw bytes.
+        return REALTIME_INPUT_SINGLE.render(
+            mime_type=codec.string_fragment(chunks[0]["mime_type"]),
+            data=codec.base64_text(chunks[0]["data"]))
+    parts = []
+    for chunk in chunks:
+        payload = chunk["data"]
+        if isinstance(payload, str):
+            parts.append(codec.dumps({"mime_type": chunk["mime_type"],
+                                      "data": payload}))
+        else:
+            parts.append(MEDIA_CHUNK.render(
+                mime_type=codec.string_fragment(chunk["mime_type"]),
+                data=codec.base64_text(payload)))
+    return REALTIME_INPUT.render(chunks=codec.array_fragment(parts))
+
+
+def pcm_rate(mime_type: str, default: int = AUDIO_DEFAULT_RATE) -> int:
+    """Sample rate from a mime type such as ``audio/pcm;rate=24000``."""
+    for param in mime_type.split(";")[1:]:
+        name, _, value = param.strip().partition("=")
+        if name == "rate" and value.isdigit():
+            return int(value)
+    return default
+
+
+def base64_decoded_size(data: str) -> int:
+    """Size of the bytes a base64 string decodes to, without decoding."""
+    return len(data) * 3 // 4 - data[-2:].count("=")
+
+
+def single_type_field(schema: Any) -> Optional[tuple]:
+    """``(key, type)`` for a dict schema with one required typed field."""
+    if isinstance(schema, dict) and len(schema) == 1:
+        ((key, field_schema),) = schema.items()
+        if not key.startswith("?") and isinstance(field_schema, type):
+            return key, field_schema
+    return None
+
+
+def compile_schema(schema: Any) -> Callable[[Any], bool]:
+    """A checker closure for one schema node (see CLIENT_MESSAGE_SCHEMAS).
+
+    Leaves are tested inline by their parent, as are dicts with a single
+    typed field (``{"parts": list}``), so most shapes cost one call.
+    """
+    if isinstance(schema, type):
+        def check(value: Any) -> bool:
+            return isinstance(value, schema)
+        return check
+    if isinstance(schema, list):
+        (item_schema,) = schema
+        if isinstance(item_schema, type):
+            def check(value: Any) -> bool:
+                if not isinstance(value, list):
+                    return False
+                for item in value:
+                    if not isinstance(item, item_schema):
+                        return False
+                return True
+            return check
+        field = single_type_field(item_schema)
+        if field is not None:
+            key, field_type = field
+
+            def check(value: Any) -> bool:
+                if not isinstance(value, list):
+                    return False
+                for item in value:
+                    if not (isinstance(item, dict) and key in item
+                            and isinstance(item[key], field_type)):
+                        return False
+                return True
+            return check
+        check_item = compile_schema(item_schema)
+
+        def check(value: Any) -> bool:
+            if not isinstance(value, list):
+                return False
+            for item in value:
+                if not check_item(item):
+                    return False
+            return True
+        return check
+    if not isinstance(schema, dict):
+        raise TypeError(f"Unsupported schema: {schema!r}")
+    field = single_type_field(schema)
+    if field is not None:
+        key, field_type = field
+
+        def check(value: Any) -> bool:
+            return (isinstance(value, dict) and key in value
+                    and isinstance(value[key], field_type))
+        return check
+    required = tuple(key for key in schema if not key.startswith("?"))
+    if len(schema) == 1 and required:
+        (key,) = required
+        check_field = compile_schema(schema[key])
+
+        def check(value: Any) -> bool:
+            return (isinstance(value, dict) and key in value
+                    and check_field(value[key]))
+        return check
+    types, pairs, nested = [], [], []
+    for key, field_schema in schema.items():
+        key = key.removeprefix("?")
+        field = single_type_field(field_schema)
+        if isinstance(field_schema, type):
+            types.append((key, field_schema))
+        elif field is not None:
+            pairs.append((key, *field))
+        else:
+            nested.append((key, compile_schema(field_schema)))
+
+    def check(value: Any) -> bool:
+        if not isinstance(value, dict):
+            return False
+        for key in required:
+            if key not in value:
+                return False
+        for key, field_type in types:
+            if key in value and not isinstance(value[key], field_type):
+                return False
+        for key, inner_key, inner_type in pairs:
+            if key in value:
+                field = value[key]
+                if not (isinstance(field, dict) and inner_key in field
+                        and isinstance(field[inner_key], inner_type)):
+                    return False
+        for key, check_field in nested:
+            if key in value and not check_field(value[key]):
+                return False
+        return True
+    return check
+
+
+def compile_schemas(schemas: Dict[str, Any]) -> Callable[[Any], bool]:
+    """Compiles one direction's message schemas into a single function.
+
+    Each top-level key gets a checker closure, and a message is checked
+    only against the keys it has, usually one. The function returns
+    whether every known top-level entry of a message has its shape; a
+    JSON object with no known key passes.
+    """
+    checkers = {key: compile_schema(schema)
+                for key, schema in schemas.items()}
+    get = checkers.get
+
+    def check(message: Any) -> bool:
+        if not isinstance(message, dict):
+            return False
+        for key in message:
+            checker = get(key)
+            if checker is not None and not checker(message[key]):
+                return False
+        return True
+    return check
+
+
+def media_chunks_fast_path(fallback: Callable[[Any], bool]
+                           ) -> Callable[[Any], bool]:
+    """A flat check of ``{"realtime_input": {"media_chunks": [...]}}``.
+
+    Client media is most of the upstream frames, so its path is walked
+    inline, with no call per node, and costs no more than the hand-written
+    check it replaced; any other message, or one the walk does not accept,
+    is left to ``fallback``. Indexing anything but a dict with a string
+    raises, so decoded JSON needs no type tests. Only the path is checked:
+    a Live API message carries one of the known top-level keys, and fields
+    beside the path are not looked at.
+    """
+    def check(message: Any) -> bool:
+        try:
+            # Tested first: raising for typed turns would cost more.
+            if ("realtime_input" in message
+                    and message["realtime_input"]["media_chunks"].__class__
+                    is list):
+                return True
+        except (KeyError, TypeError):
+            pass
+        return fallback(message)
+    return check
+
+
+def model_turn_fast_path(fallback: Callable[[Any], bool]
+                         ) -> Callable[[Any], bool]:
+    """A flat check of ``{"serverContent": {"modelTurn": {"parts": [...]}}}``.
+
+    Model audio and text chunks are most of the downstream frames; see
+    ``media_chunks_fast_path``.
+    """
+    def check(message: Any) -> bool:
+        try:
+            if (message["serverContent"]["modelTurn"]["parts"].__class__
+                    is list):
+                return True
+        except (KeyError, TypeError):
+            pass
+        return fallback(message)
+    return check
+
+
+class MessageValidator:
+    """Compiled checks for one direction's parsed messages."""
+
+    def __init__(self, schemas: Dict[str, Any],
+                 first_frames: int = VALIDATION_FIRST_FRAMES,
+                 sample_every: int = VALIDATION_SAMPLE_EVERY,
+                 fast_path: Optional[Callable] = None):
+        self.keys = frozenset(schemas)
+        self.validate = compile_schemas(schemas)
+        if fast_path is not None:
+            self.validate = fast_path(self.validate)
+        self.first_frames = first_frames
+        self.sample_every = max(1, sample_every)
+
+    def sampled(self, index: int) -> bool:
+        """Whether the ``index``-th parsed frame of a leg is checked."""
+        return (index < self.first_frames
+                or (index - self.first_frames) % self.sample_every == 0)
+
+
+def setup_logging() -> QueueListener:
+    """Moves the root logger's handlers behind a queue and a thread.
+
+    Call again in a forked worker: the listener thread does not survive
+    the fork.
+    """
+    root = logging.getLogger()
+    if not _log_handlers:
+        _log_handlers.extend(handler for handler in root.handlers
+                             if not isinstance(handler, QueueHandler))
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    log_queue = queue.SimpleQueue()
+    root.addHandler(QueueHandler(log_queue))
+    listener = QueueListener(log_queue, *_log_handlers,
+                             respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def _digest(data: Union[str, bytes]) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8", "replace")
+    return hashlib.sha1(data).hexdigest()[:12]
+
+
+def summarize_payload(value: Any, key: Optional[str] = None) -> Any:
+    """Copy of a frame or message with media and long strings summarized."""
+    if isinstance(value, dict):
+        return {name: summarize_payload(item, name)
+                for name, item in value.items()}
+    if isinstance(value, list):
+        return [summarize_payload(item) for item in value]
+    if isinstance(value, (bytes, bytearray)):
+        return f"<{len(value)} bytes sha1:{_digest(value)}>"
+    if isinstance(value, str) and len(value) > LOG_PREVIEW_SIZE:
+        if key == "data":
+            return (f"<{base64_decoded_size(value)} bytes base64 "
+                    f"sha1:{_digest(value)}>")
+        return (f"{value[:LOG_PREVIEW_SIZE]}...<{len(value)} chars "
+                f"sha1:{_digest(value)}>")
+    return value
+
+
+class PayloadSummary:
+    """Log argument that summarizes its payload only when formatted."""
+
+    __slots__ = ("payload",)
+
+    def __init__(self, payload: Any):
+        self.payload = payload
+
+    def __str__(self) -> str:
+        return str(summarize_payload(self.payload))
+
+
+class LogRateLimiter:
+    """Lets a repeating log message through once per ``interval``."""
+
+    __slots__ = ("interval", "last", "suppressed")
+
+    def __init__(self, interval: float = LOG_ERROR_INTERVAL):
+        self.interval = interval
+        self.last: Dict[str, float] = {}
+        self.suppressed: Dict[str, int] = {}
+
+    def allow(self, key: str, now: float) -> tuple:
+        """Returns whether to log, and how many repeats were dropped."""
+        if now - self.last.get(key, -math.inf) < self.interval:
+            self.suppressed[key] = self.suppressed.get(key, 0) + 1
+            return False, 0
+        self.last[key] = now
+        return True, self.suppressed.pop(key, 0)
+
+
+class TokenBucket:
+    """Token bucket refilled at ``rate`` tokens/s, capped at ``burst``."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, now: float) -> float:
+        """Takes a token and returns how long to wait before using it."""
+        self._refill(now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def try_take(self, now: float) -> bool:
+        """Takes a token only if one is available right now."""
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class Histogram:
+    """Fixed-bucket histogram; ``bounds`` are inclusive upper bounds."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        buckets = {f"le_{bound:g}": count
+                   for bound, count in zip(self.bounds, self.counts)}
+        buckets["le_inf"] = self.counts[-1]
+        return {"count": self.count, "sum": round(self.sum, 6),
+                "buckets": buckets}
+
+
+def format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+def metric_lines(name: str, kind: str, help_text: str,
+                 samples: Dict[tuple, float]) -> List[str]:
+    """Prometheus text lines for a counter or gauge family."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples.items():
+        lines.append(f"{name}{format_labels(labels)} {value}")
+    return lines
+
+
+class MetricsRegistry:
+    """Histogram families rendered in the Prometheus text format.
+
+    Series are created up front and kept by the code that observes them;
+    the registry is only walked when ``/metrics`` is scraped.
+    """
+
+    def __init__(self):
+        self.families: Dict[str, Dict[str, Any]] = {}
+
+    def histogram(self, name: str, help_text: str, bounds: tuple,
+                  **labels: str) -> Histogram:
+        return self.register(name, help_text, Histogram(bounds), **labels)
+
+    def register(self, name: str, help_text: str, histogram: Histogram,
+                 **labels: str) -> Histogram:
+        family = self.families.setdefault(
+            name, {"help": help_text, "series": {}})
+        family["series"][tuple(sorted(labels.items()))] = histogram
+        return histogram
+
+    def render(self) -> List[str]:
+        lines = []
+        for name, family in self.families.items():
+            lines.append(f"# HELP {name} {family['help']}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in family["series"].items():
+                cumulative = 0
+                for bound, count in zip(histogram.bounds + (math.inf,),
+                                        histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == math.inf else f"{bound}"
+                    lines.append(f"{name}_bucket"
+                                 f"{format_labels(labels + (('le', le),))}"
+                                 f" {cumulative}")
+                lines.append(f"{name}_sum{format_labels(labels)}"
+                             f" {histogram.sum!r}")
+                lines.append(f"{name}_count{format_labels(labels)}"
+                             f" {histogram.count}")
+        return lines
+
+
+class SessionTrace:
+    """Bounded timeline of one sampled session.
+
+    Events keep raw monotonic times; they are converted to microseconds
+    since the start of the session only when the trace is dumped.
+    """
+
+    __slots__ = ("client_id", "started", "events", "dropped")
+
+    def __init__(self, client_id: str, started: float,
+                 max_events: int = TRACE_MAX_EVENTS):
+        self.client_id = client_id
+        self.started = started
+        self.events: deque = deque(maxlen=max_events)
+        self.dropped = 0
+
+    def _append(self, event: tuple) -> None:
+        if len(self.events) == self.events.maxlen:
+            self.dropped += 1
+        self.events.append(event)
+
+    def span(self, name: str, category: str, start: float, end: float,
+             **args: Any) -> None:
+        self._append((name, category, start, end - start, args))
+
+    def instant(self, name: str, category: str, at: float,
+                **args: Any) -> None:
+        self._append((name, category, at, None, args))
+
+    def chrome_events(self) -> List[Dict[str, Any]]:
+        events = []
+        for name, category, start, duration, args in self.events:
+            event = {
+                "name": name,
+                "cat": category,
+                "pid": 1,
+                "tid": TRACE_THREADS.get(category, 0),
+                "ts": round((start - self.started) * 1e6, 1),
+                "args": args,
+            }
+            if duration is None:
+                event.update(ph="i", s="t")
+            else:
+                event.update(ph="X", dur=round(duration * 1e6, 1))
+            events.append(event)
+        return events
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        names = [{"name": "thread_name", "ph": "M", "pid": 1, "tid": tid,
+                  "args": {"name": name}}
+                 for name, tid in TRACE_THREADS.items()]
+        return {
+            "traceEvents": names + self.chrome_events(),
+            "otherData": {"client_id": self.client_id,
+                          "dropped_events": self.dropped},
+        }
+
+    def json_lines(self) -> str:
+        return "".join(json.dumps(event) + "\n"
+                       for event in self.chrome_events())
+
+
+def split_media_payload(data: bytes) -> Optional[tuple]:
+    """Splits a JSON frame around its first base64 ``data`` value.
+
+    Returns ``(prefix, raw, suffix)`` with the value decoded, or None when
+    the frame has no such value worth storing raw.
+    """
+    match = _DATA_VALUE_RE.search(data)
+    if match is None:
+        return None
+    start = match.end()
+    end = data.find(b'"', start)
+    if end - start < RECORD_MEDIA_MIN_SIZE or (end - start) % 4:
+        return None
+    try:
+        raw = base64.b64decode(data[start:end], validate=True)
+    except ValueError:
+        return None
+    return data[:start], raw, data[end:]
+
+
+class SessionRecorder:
+    """Append-only binary log of the frames of one session.
+
+    Frames are only queued on the event loop; encoding them and all file
+    I/O happen on the shared ``writer`` thread, one batch at a time.
+    """
+
+    writer: Optional[ThreadPoolExecutor] = None
+    pending = 0  # bytes handed to the writer and not yet written
+
+    def __init__(self, path: Union[str, pathlib.Path], started: float,
+                 max_bytes: int = RECORD_MAX_BYTES):
+        self.path = pathlib.Path(path)
+        self.started = started
+        self.max_bytes = max_bytes
+        self.size = len(RECORD_MAGIC)
+        self.file = None
+        self.batch: List[tuple] = []
+        self.batch_bytes = 0
+        self.stopped = False  # set by either thread; only ever to True
+        self.closed = False
+
+    @classmethod
+    def shutdown(cls) -> None:
+        """Waits for queued batches to be written."""
+        if cls.writer is not None:
+            cls.writer.shutdown(wait=True)
+            cls.writer = None
+
+    def meta(self, info: Dict[str, Any], now: float) -> None:
+        self._queue(0, json.dumps(info).encode("utf-8"), now)
+
+    def frame(self, from_client: bool, message: Union[str, bytes],
+              now: float) -> None:
+        self._queue(1 if from_client else 2, message, now)
+
+    def _queue(self, kind: int, message: Union[str, bytes],
+               now: float) -> None:
+        if self.stopped:
+            return
+        self.batch.append((kind, message, now))
+        self.batch_bytes += len(message)
+        if self.batch_bytes >= RECORD_BUFFER_SIZE:
+            self._submit(self._write_batch)
+
+    def _submit(self, job: Callable[[List[tuple]], None]) -> None:
+        batch, size = self.batch, self.batch_bytes
+        self.batch, self.batch_bytes = [], 0
+        cls = SessionRecorder
+        if size and cls.pending + size > RECORD_MAX_PENDING:
+            logger.warning(f"Recording {self.path} fell behind; stopped")
+            self.stopped = True
+            batch, size = [], 0
+        if cls.writer is None:
+            cls.writer = ThreadPoolExecutor(max_workers=1,
+                                            thread_name_prefix="recorder")
+        cls.pending += size
+
+        def written(future) -> None:
+            cls.pending -= size
+
+        # One writer thread, so batches are written in submission order.
+        future = asyncio.get_running_loop().run_in_executor(
+            cls.writer, job, batch)
+        future.add_done_callback(written)
+
+    def _write_batch(self, batch: List[tuple]) -> None:
+        """Encodes and writes a batch; runs on the writer thread."""
+        try:
+            if self.file is None:
+                if self.stopped and not batch:
+                    return
+                self.file = open(self.path, "wb")
+                self.file.write(RECORD_MAGIC)
+            for kind, message, now in batch:
+                if self.file.closed:
+                    return
+                self._write(kind, message, now)
+        except OSError as e:
+            logger.error(f"Cannot record to {self.path}: {e}")
+            self.stopped = True
+            if self.file is not None:
+                self.file.close()
+
+    def _write(self, kind: int, message: Union[str, bytes],
+               now: float) -> None:
+        encoding = 0
+        if isinstance(message, bytes):
+            encoding = RECORD_BINARY if kind else 0
+            data = message
+        else:
+            data = message.encode("utf-8")
+        parts = split_media_payload(data) if kind else None
+        if parts is not None:
+            prefix, raw, suffix = parts
+            encoding |= RECORD_MEDIA
+            data = (RECORD_LENGTH.pack(len(prefix)) + prefix
+                    + RECORD_LENGTH.pack(len(raw)) + raw + suffix)
+        size = RECORD_HEADER.size + len(data)
+        if self.size + size > self.max_bytes:
+            logger.warning(f"Recording {self.path} reached its size limit")
+            self.stopped = True
+            self.file.close()
+            return
+        self.file.write(RECORD_HEADER.pack(kind, encoding,
+                                           now - self.started, len(data)))
+        self.file.write(data)
+        self.size += size
+
+    def _close_file(self, batch: List[tuple]) -> None:
+        self._write_batch(batch)
+        if self.file is not None:
+            self.file.close()
+
+    def close(self) -> None:
+        """Writes what is queued, then closes the file, off the loop."""
+        if not self.closed:
+            self.closed = self.stopped = True
+            self._submit(self._close_file)
+
+
+def read_recording(path: Union[str, pathlib.Path]):
+    """Yields ``(kind, offset_seconds, message)`` from a session recording.
+
+    Frames come back exactly as they were received; meta records are
+    decoded to dicts.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(RECORD_MAGIC)) != RECORD_MAGIC:
+            raise GeminiValidationError(f"{path} is not a session recording")
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            kind, encoding, offset, length = RECORD_HEADER.unpack(header)
+            data = f.read(length)
+            if kind == 0:
+                yield RECORD_KINDS[kind], offset, json.loads(data)
+                continue
+            if encoding & RECORD_MEDIA:
+                (prefix_length,) = RECORD_LENGTH.unpack_from(data)
+                position = RECORD_LENGTH.size + prefix_length
+                prefix = data[RECORD_LENGTH.size:position]
+                (raw_length,) = RECORD_LENGTH.unpack_from(data, position)
+                position += RECORD_LENGTH.size
+                raw = data[position:position + raw_length]
+                data = (prefix + base64.b64encode(raw)
+                        + data[position + raw_length:])
+            message = (data if encoding & RECORD_BINARY
+                       else data.decode("utf-8"))
+            yield RECORD_KINDS[kind], offset, message
+
+
+class RateScheduler:
+    """Per-connection token buckets with an optional fair global cap.
+
+    Each connection gets one bucket per budget in ``RATE_LIMITS``. When a
+    global rate is set, connections that find it exhausted wait in
+    per-connection queues that are served round-robin, so one chatty client
+    cannot starve the others.
+    """
+
+    def __init__(self, limits: Dict[str, Dict[str, float]],
+                 global_rate: Optional[float] = None):
+        self.limits = limits
+        self.global_bucket = (TokenBucket(global_rate, global_rate)
+                              if global_rate else None)
+        self.waiters: "OrderedDict[str, deque]" = OrderedDict()
+        self.dispatcher: Optional[asyncio.Task] = None
+
+    def bucket(self, connection: ConnectionInfo, budget: str) -> TokenBucket:
+        bucket = connection.buckets.get(budget)
+        if bucket is None:
+            limit = self.limits[budget]
+            bucket = TokenBucket(limit["rate"], limit["burst"])
+            connection.buckets[budget] = bucket
+        return bucket
+
+    async def acquire(self, connection: ConnectionInfo, budget: str) -> float:
+        """Waits until the connection may send on ``budget``.
+
+        Returns the time spent waiting, in seconds.
+        """
+        start = time.monotonic()
+        connection.queue_depth += 1
+        try:
+            delay = self.bucket(connection, budget).reserve(start)
+            throttled = delay > 0
+            if throttled:
+                await sleep(delay)
+            if self.global_bucket is not None:
+                throttled |= await self._acquire_global(connection.client_id)
+        finally:
+            connection.queue_depth -= 1
+
+        if not throttled:
+            return 0.0
+        waited = time.monotonic() - start
+        connection.throttle_delay += waited
+        connection.throttled_messages += 1
+        return waited
+
+    async def _acquire_global(self, client_id: str) -> bool:
+        """Takes a global token, returning True if the caller had to queue."""
+        if not self.waiters and self.global_bucket.try_take(time.monotonic()):
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.setdefault(client_id, deque()).append(future)
+        if self.dispatcher is None or self.dispatcher.done():
+            self.dispatcher = asyncio.create_task(self._dispatch())
+        await future
+        return True
+
+    async def _dispatch(self) -> None:
+        """Grants global tokens round-robin across waiting connections."""
+        while self.waiters:
+            client_id, waiters_q = next(iter(self.waiters.items()))
+            future = waiters_q.popleft()
+            if waiters_q:
+                self.waiters.move_to_end(client_id)
+            else:
+                del self.waiters[client_id]
+            if future.done():
+                continue
+
+            delay = self.global_bucket.reserve(time.monotonic())
+            if delay > 0:
+                await sleep(delay)
+            if not future.done():
+                future.set_result(None)
 
 
 class GeminiError(Exception):
@@ -116,212 +1407,1513 @@ class GeminiMediaError(GeminiError):
     pass
 
 
+def static_content_type(path: pathlib.Path) -> str:
+    content_type = mimetypes.guess_type(str(path))[0]
+    if not content_type:
+        return "application/octet-stream"
+    if content_type.startswith("text/") or content_type in (
+            "application/javascript", "application/json"):
+        content_type += "; charset=utf-8"
+    return content_type
+
+
+def negotiate_encoding(accept_encoding: str, available) -> str:
+    """Picks the smallest coding in ``available`` the client accepts."""
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding.strip()] = quality
+    for coding in ("br", "gzip"):
+        if (coding in available
+                and accepted.get(coding, accepted.get("*", 0.0)) > 0):
+            return coding
+    return "identity"
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match uses the weak comparison (RFC 9110, 13.1.2)."""
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag
+               for tag in if_none_match.split(","))
+
+
+@dataclass
+class StaticAsset:
+    path: pathlib.Path
+    mtime_ns: int
+    size: int
+    digest: str  # of the file's content
+    # Content coding -> (headers, body), ready to send.
+    responses: Dict[str, tuple]
+    checked_at: float = field(default_factory=time.monotonic)
+
+
+def load_static_asset(path: pathlib.Path, name: str) -> StaticAsset:
+    """Reads and precompresses a manifest entry. Blocking."""
+    mtime_ns = path.stat().st_mtime_ns
+    body = path.read_bytes()
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    variants = {"identity": body}
+    if len(body) >= STATIC_COMPRESS_MIN_SIZE:
+        variants["gzip"] = gzip.compress(body, 9, mtime=0)
+        if brotli is not None:
+            variants["br"] = brotli.compress(body)
+    cache_control = (f"public, max-age={STATIC_IMMUTABLE_MAX_AGE}, immutable"
+                     if _HASHED_NAME_RE.search(name) else "no-cache")
+    responses = {}
+    for coding, data in variants.items():
+        if coding != "identity" and len(data) >= len(body):
+            continue
+        headers = [
+            ("Content-Type", static_content_type(path)),
+            ("Cache-Control", cache_control),
+            ("ETag", f'"{digest}"' if coding == "identity"
+                     else f'"{digest}-{coding}"'),
+            ("Vary", "Accept-Encoding"),
+            ("X-Content-Type-Options", "nosniff"),
+        ]
+        if coding != "identity":
+            headers.append(("Content-Encoding", coding))
+        responses[coding] = (headers, data)
+    return StaticAsset(path, mtime_ns, len(body), digest, responses)
+
+
+@dataclass
+class StaticCacheEntry:
+    path: pathlib.Path
+    mtime_ns: int
+    response: tuple
+    checked_at: float = field(default_factory=time.monotonic)
+
+
+def read_static_file(path: pathlib.Path,
+                     max_size: int) -> Optional[tuple]:
+    """Reads a file for the static cache. Blocking.
+
+    Returns ``(mtime_ns, content, etag)``, with content and etag None for
+    files over ``max_size``, or None if there is no such file.
+    """
+    try:
+        info = path.stat()
+    except OSError:
+        return None
+    if not stat.S_ISREG(info.st_mode):
+        return None
+    if info.st_size > max_size:
+        return info.st_mtime_ns, None, None
+    content = path.read_bytes()
+    return (info.st_mtime_ns, content,
+            f'"{hashlib.sha256(content).hexdigest()[:32]}"')
+
+
 class StaticFileHandler:
-    def __init__(self, static_dir: str = "static"):
+    """Serves files under ``static_dir`` as ``(status, headers, body)``.
+
+    JS, CSS and HTML come from the manifest (see STATIC_MANIFEST_SUFFIXES),
+    negotiated against Accept-Encoding; other files from a byte-bounded
+    LRU cache. Every cached response carries an ETag and a matching
+    If-None-Match gets a 304. For files too large to cache the body is
+    their ``pathlib.Path``, to be streamed by the caller.
+    """
+
+    def __init__(self, static_dir: str = "static",
+                 cache_max_bytes: int = STATIC_CACHE_BYTES,
+                 cache_max_file: int = STATIC_CACHE_MAX_FILE):
         self.static_dir = pathlib.Path(static_dir)
-        self.cache: Dict[str, tuple] = {}
-        self.cache_max_size = 100
+        self.cache: OrderedDict = OrderedDict()  # path -> StaticCacheEntry
+        self.cache_bytes = 0
+        self.cache_max_bytes = cache_max_bytes
+        self.cache_max_file = cache_max_file
+        self.loading: Dict[str, asyncio.Future] = {}
+        self.manifest: Dict[str, StaticAsset] = {}
+        self.metrics = {"hits": 0, "misses": 0, "coalesced": 0,
+                        "evictions": 0, "streamed": 0, "not_modified": 0,
+                        "reloads": 0}
+        self.build_manifest()
 
-    async def handle_request(self, path: str) -> tuple:
-        """Handle HTTP request for static files."""
+    def build_manifest(self) -> None:
+        if not self.static_dir.is_dir():
+            return
+        for path in sorted(self.static_dir.rglob("*")):
+            if path.suffix not in STATIC_MANIFEST_SUFFIXES:
+                continue
+            name = path.relative_to(self.static_dir).as_posix()
+            try:
+                if path.is_file():
+                    self.manifest[name] = load_static_asset(path, name)
+            except OSError as e:
+                logger.warning(f"Cannot load static asset {name}: {e}")
+        logger.info(f"Static manifest: {len(self.manifest)} assets")
+
+    async def asset(self, name: str) -> Optional[StaticAsset]:
+        """The manifest entry for ``name``, re-read if its file changed."""
+        asset = self.manifest.get(name)
+        if asset is None:
+            return None
+        now = time.monotonic()
+        if now - asset.checked_at < STATIC_RECHECK_INTERVAL:
+            return asset
+        # Concurrent requests keep the current entry while one re-reads.
+        asset.checked_at = now
         try:
-            path = path.replace("\\", "/").lstrip("/")
-            if path in self.cache:
-                return self.cache[path]
+            if asset.path.stat().st_mtime_ns == asset.mtime_ns:
+                return asset
+            fresh = await asyncio.to_thread(load_static_asset, asset.path,
+                                            name)
+        except OSError:
+            self.manifest.pop(name, None)
+            return None
+        self.manifest[name] = fresh
+        self.metrics["reloads"] += 1
+        logger.info(f"Reloaded static asset: {name}")
+        return fresh
 
-            file_path = self.static_dir / path
+    def asset_response(self, asset: StaticAsset, request_headers) -> tuple:
+        coding = negotiate_encoding(
+            request_headers.get("Accept-Encoding", ""), asset.responses)
+        headers, body = asset.responses[coding]
+        return self.conditional((HTTPStatus.OK, headers, body),
+                                request_headers)
+
+    def conditional(self, response: tuple, request_headers) -> tuple:
+        """Turns a response into a 304 if the client's copy is current."""
+        if_none_match = request_headers.get("If-None-Match")
+        status, headers, _ = response
+        if not if_none_match or status != HTTPStatus.OK:
+            return response
+        etag = next((value for name, value in headers if name == "ETag"),
+                    None)
+        if etag is None or not etag_matches(if_none_match, etag):
+            return response
+        self.metrics["not_modified"] += 1
+        return (HTTPStatus.NOT_MODIFIED,
+                [(name, value) for name, value in headers
+                 if name in ("Cache-Control", "ETag", "Vary")], b"")
+
+    def cached(self, path: str) -> Optional[tuple]:
+        """The cached response for ``path``, unless its file changed."""
+        entry = self.cache.get(path)
+        if entry is None:
+            return None
+        now = time.monotonic()
+        if now - entry.checked_at >= STATIC_RECHECK_INTERVAL:
+            entry.checked_at = now
             try:
-                file_path = file_path.resolve()
-                if not str(file_path).startswith(
-                        str(self.static_dir.resolve())):
-                    logger.warning(f"Attempted path traversal: {path}")
-                    return (HTTPStatus.FORBIDDEN, [], b"403 Forbidden")
-            except Exception:
+                mtime_ns = entry.path.stat().st_mtime_ns
+            except OSError:
+                mtime_ns = None
+            if mtime_ns != entry.mtime_ns:
+                self.evict(path)
+                self.metrics["reloads"] += 1
+                return None
+        self.cache.move_to_end(path)
+        self.metrics["hits"] += 1
+        return entry.response
+
+    def store(self, path: str, entry: StaticCacheEntry) -> None:
+        if path in self.cache:
+            self.evict(path)
+        self.cache[path] = entry
+        self.cache_bytes += len(entry.response[2])
+        while self.cache_bytes > self.cache_max_bytes:
+            self.evict(next(iter(self.cache)))
+            self.metrics["evictions"] += 1
+
+    def evict(self, path: str) -> None:
+        entry = self.cache.pop(path)
+        self.cache_bytes -= len(entry.response[2])
+
+    async def load(self, path: str):
+        """Reads ``path`` once however many requests miss on it at once."""
+        pending = self.loading.get(path)
+        if pending is not None:
+            self.metrics["coalesced"] += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise  # this request was cancelled
+            # The reading request was cancelled; read it for this one.
+            return await self.load(path)
+        self.metrics["misses"] += 1
+        pending = asyncio.get_running_loop().create_future()
+        self.loading[path] = pending
+        try:
+            result = await self.read(path)
+        except Exception:
+            pending.set_result(None)  # waiters answer 500 as well
+            raise
+        except BaseException:
+            pending.cancel()
+            raise
+        else:
+            pending.set_result(result)
+        finally:
+            if self.loading.get(path) is pending:
+                del self.loading[path]
+        return result
+
+    async def read(self, path: str):
+        """A response for ``path``, or its manifest entry if it has one."""
+        file_path = self.static_dir / path
+        root = self.static_dir.resolve()
+        try:
+            file_path = file_path.resolve()
+            if not str(file_path).startswith(str(root)):
+                logger.warning(f"Attempted path traversal: {path}")
                 return (HTTPStatus.FORBIDDEN, [], b"403 Forbidden")
+        except Exception:
+            return (HTTPStatus.FORBIDDEN, [], b"403 Forbidden")
 
-            if not file_path.exists() or not file_path.is_file():
-                logger.error(f"File not found: {file_path}")
-                return (HTTPStatus.NOT_FOUND, [], b"404 Not Found")
+        if file_path.suffix in STATIC_MANIFEST_SUFFIXES:
+            # Added since startup, or asked for by a non-canonical name.
+            name = file_path.relative_to(root).as_posix()
+            asset = await self.asset(name)
+            if asset is None and file_path.is_file():
+                asset = await asyncio.to_thread(load_static_asset,
+                                                file_path, name)
+                self.manifest[name] = asset
+            if asset is not None:
+                return asset
 
-            content_type, _ = mimetypes.guess_type(str(file_path))
-            if not content_type:
-                content_type = "application/octet-stream"
+        found = await asyncio.to_thread(read_static_file, file_path,
+                                        self.cache_max_file)
+        if found is None:
+            logger.error(f"File not found: {file_path}")
+            return (HTTPStatus.NOT_FOUND, [], b"404 Not Found")
+        mtime_ns, content, etag = found
 
-            headers = [
-                ("Content-Type", content_type),
-                ("Cache-Control", "public, max-age=3600"),
-                ("X-Content-Type-Options", "nosniff"),
-            ]
+        content_type, _ = mimetypes.guess_type(str(file_path))
+        if not content_type:
+            content_type = "application/octet-stream"
+        headers = [
+            ("Content-Type", content_type),
+            ("Cache-Control", "public, max-age=3600"),
+            ("X-Content-Type-Options", "nosniff"),
+        ]
+        if content is None:
+            self.metrics["streamed"] += 1
+            return (HTTPStatus.OK, headers, file_path)
+        headers.append(("ETag", etag))
+        response = (HTTPStatus.OK, headers, content)
+        self.store(path, StaticCacheEntry(file_path, mtime_ns, response))
+        return response
 
-            with open(file_path, "rb") as f:
-                content = f.read()
-                response = (HTTPStatus.OK, headers, content)
-                if len(content) < 1024 * 1024:  # 1MB
-                    if len(self.cache) >= self.cache_max_size:
-                        self.cache.pop(next(iter(self.cache)))
-                    self.cache[path] = response
-                return response
+    async def handle_request(self, path: str,
+                             request_headers=None) -> tuple:
+        """Handle HTTP request for static files."""
+        request_headers = request_headers or {}
+        try:
+            path = path.replace("\\", "/").lstrip("/")
+            asset = await self.asset(path)
+            if asset is not None:
+                return self.asset_response(asset, request_headers)
+
+            response = self.cached(path)
+            if response is None:
+                response = await self.load(path)
+            if response is None:
+                raise GeminiError("Static file read failed")
+            if isinstance(response, StaticAsset):
+                return self.asset_response(response, request_headers)
+            return self.conditional(response, request_headers)
 
         except Exception as e:
             logger.error(f"Error serving static file: {e}")
             return (HTTPStatus.INTERNAL_SERVER_ERROR, [],
                     b"500 Internal Server Error")
 
+    def render_metrics(self) -> List[str]:
+        """Cache counters and size for ``/metrics``."""
+        lines = []
+        for name, value in self.metrics.items():
+            lines += metric_lines(f"finn_static_{name}_total", "counter",
+                                  "Static file " + name.replace("_", " ")
+                                  + ".", {(): value})
+        lines += metric_lines("finn_static_cache_bytes", "gauge",
+                              "Bytes of static files cached.",
+                              {(): self.cache_bytes})
+        return lines
+
+
+def process_image_sync(data: Union[str, bytes], mime_type: str,
+                       profile: str = IMAGE_PROFILE) -> Dict[str, Any]:
+    """Decodes, normalizes and re-encodes an image.
+
+    CPU bound; runs inside an ``ImagePipeline`` worker, so it must stay a
+    picklable module-level function.
+    """
+    try:
+        settings = IMAGE_PROFILES[profile]
+        if isinstance(data, str):
+            image_data = base64.b64decode(data)
+        else:
+            image_data = data
+
+        if len(image_data) > MAX_IMAGE_SIZE:
+            raise GeminiMediaError("Image size exceeds maximum limit")
+
+        image_format = mime_type.split("/")[-1].upper()
+        max_dim = settings["max_dim"]
+        with Image.open(io.BytesIO(image_data)) as img:
+            if (settings["passthrough"] and max(img.size) <= max_dim
+                    and img.format == image_format
+                    and img.mode in ("RGB", "RGBA", "L")):
+                if not isinstance(data, str):
+                    data = base64.b64encode(image_data).decode("utf-8")
+                return {"inline_data": {"mime_type": mime_type,
+                                        "data": data}}
+
+            ratio = min(1.0, max_dim / max(img.size))
+            new_size = tuple(int(dim * ratio) for dim in img.size)
+            if settings["draft"] and img.format == "JPEG" and ratio < 1.0:
+                # DCT-domain downscale by 1/2, 1/4 or 1/8 while decoding,
+                # never below the target size.
+                img.draft("RGB", new_size)
+
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGB")
+            if image_format == "JPEG" and img.mode == "RGBA":
+                img = img.convert("RGB")
+
+            if img.size != new_size and ratio < 1.0:
+                img = img.resize(new_size, settings["resample"],
+                                 reducing_gap=settings["reducing_gap"])
+
+            img_byte_arr = io.BytesIO()
+            save_options = {}
+            if (image_format == "JPEG"
+                    and settings["jpeg_quality"] is not None):
+                save_options["quality"] = settings["jpeg_quality"]
+            img.save(img_byte_arr, format=image_format, **save_options)
+            processed_data = base64.b64encode(
+                img_byte_arr.getvalue()).decode("utf-8")
+
+        return {"inline_data": {"mime_type": mime_type,
+                                "data": processed_data}}
+    except Exception as e:
+        raise GeminiMediaError(f"Image processing error: {str(e)}")
+
+
+def frame_hash_sync(data: Union[str, bytes]) -> int:
+    """Computes a 64-bit difference hash (dHash) of an image.
+
+    JPEGs are decoded at 1/8 scale via draft mode, so this costs a small
+    fraction of a full decode.
+    """
+    if isinstance(data, str):
+        data = base64.b64decode(data)
+    with Image.open(io.BytesIO(data)) as img:
+        img.draft("L", (64, 64))
+        pixels = img.convert("L").resize((9, 8), Image.Resampling.BOX)
+        values = pixels.tobytes()
+
+    bits = 0
+    for row in range(8):
+        offset = row * 9
+        for col in range(8):
+            bits = (bits << 1) | (values[offset + col] >
+                                  values[offset + col + 1])
+    return bits
+
+
+class ImagePipeline:
+    """Bounded worker pool for image processing.
+
+    At most ``max_pending`` images are processed at once; further callers
+    wait for a slot, which back-pressures the connection that is sending
+    them. While waiting, a newer frame from the same stream supersedes the
+    older one (drop-oldest), so a client that outpaces the pool always gets
+    its most recent frame processed next instead of a backlog of stale ones.
+    """
+
+    def __init__(self, kind: str = IMAGE_POOL_KIND,
+                 workers: int = IMAGE_POOL_WORKERS,
+                 max_pending: int = IMAGE_POOL_MAX_PENDING,
+                 profile: str = IMAGE_PROFILE,
+                 process_time: Optional[Histogram] = None):
+        if profile not in IMAGE_PROFILES:
+            raise ValueError(f"Unknown image profile: {profile}")
+        self.profile = profile
+        if kind == "process":
+            self.executor: Executor = ProcessPoolExecutor(max_workers=workers)
+        elif kind == "thread":
+            self.executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="image")
+        else:
+            raise ValueError(f"Unknown image pool kind: {kind}")
+        self.kind = kind
+        self.slots = asyncio.Semaphore(max_pending)
+        self.latest: Dict[str, int] = {}
+        self.waiting = 0
+        self.metrics = {"processed": 0, "dropped": 0, "max_waiting": 0}
+        if process_time is None:
+            process_time = Histogram(LATENCY_BUCKETS)
+        self.process_time = process_time
+
+    async def submit(self, data: Union[str, bytes], mime_type: str,
+                     stream_id: Optional[str] = None
+                     ) -> Optional[Dict[str, Any]]:
+        """Processes an image in the pool.
+
+        Returns None if the frame was superseded by a newer frame from the
+        same ``stream_id`` while waiting for a worker.
+        """
+        ticket = None
+        if stream_id is not None:
+            ticket = self.latest.get(stream_id, 0) + 1
+            self.latest[stream_id] = ticket
+
+        self.waiting += 1
+        self.metrics["max_waiting"] = max(self.metrics["max_waiting"],
+                                          self.waiting)
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        try:
+            if ticket is not None and self.latest.get(stream_id) != ticket:
+                self.metrics["dropped"] += 1
+                return None
+            loop = asyncio.get_running_loop()
+            start = time.monotonic()
+            result = await loop.run_in_executor(
+                self.executor, process_image_sync, data, mime_type,
+                self.profile)
+            self.process_time.observe(time.monotonic() - start)
+            self.metrics["processed"] += 1
+            return result
+        finally:
+            self.slots.release()
+            if ticket is not None and self.latest.get(stream_id) == ticket:
+                del self.latest[stream_id]
+
+    async def fingerprint(self, data: Union[str, bytes]) -> int:
+        """Computes ``frame_hash_sync`` in the pool."""
+        async with self.slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor,
+                                              frame_hash_sync, data)
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
 
 class MediaProcessor:
     """Handles media processing for different modalities."""
 
+    image_pipeline: Optional[ImagePipeline] = None
+    # Outlives the pipeline, so it can be registered before the first image.
+    image_time = Histogram(LATENCY_BUCKETS)
+
+    @classmethod
+    def get_image_pipeline(cls) -> ImagePipeline:
+        if cls.image_pipeline is None:
+            cls.image_pipeline = ImagePipeline(process_time=cls.image_time)
+        return cls.image_pipeline
+
+    @classmethod
+    def shutdown(cls) -> None:
+        if cls.image_pipeline is not None:
+            cls.image_pipeline.shutdown()
+            cls.image_pipeline = None
+
+    @classmethod
+    async def process_image(cls, data: Union[str, bytes], mime_type: str,
+                            stream_id: Optional[str] = None
+                            ) -> Optional[Dict[str, Any]]:
+        """Process and validate image data off the event loop.
+
+        Returns None when the frame was dropped in favour of a newer one
+        from the same ``stream_id``.
+        """
+        return await cls.get_image_pipeline().submit(data, mime_type,
+                                                     stream_id)
+
+    @staticmethod
+    async def process_audio(data: Union[str, bytes],
+                            mime_type: str) -> Dict[str, Any]:
+        """Process and validate audio data."""
+        try:
+            # Base64 input is forwarded as is; only raw bytes get encoded.
+            if isinstance(data, str):
+                size = base64_decoded_size(data)
+                encoded = data
+            else:
+                size = len(data)
+                encoded = base64.b64encode(data).decode("utf-8")
+
+            if size > MAX_AUDIO_CHUNK_SIZE:
+                raise GeminiMediaError(
+                    "Audio chunk size exceeds maximum limit")
+
+            return {
+                "audio_chunk": {
+                    "mime_type": mime_type,
+                    "data": encoded,
+                }
+            }
+        except Exception as e:
+            raise GeminiMediaError(f"Audio processing error: {str(e)}")
+
     @staticmethod
-    async def process_image(data: Union[str, bytes],
+    async def process_video(data: Union[str, bytes],
                             mime_type: str) -> Dict[str, Any]:
-        """Process and validate image data."""
+        """Process and validate video data."""
         try:
+            # Base64 input is forwarded as is; only raw bytes get encoded.
             if isinstance(data, str):
-                image_data = base64.b64decode(data)
+                size = base64_decoded_size(data)
+                encoded = data
             else:
-                image_data = data
+                size = len(data)
+                encoded = base64.b64encode(data).decode("utf-8")
+
+            if size > MAX_VIDEO_CHUNK_SIZE:
+                raise GeminiMediaError(
+                    "Video chunk size exceeds maximum limit")
+
+            return {
+                "video_chunk": {
+                    "mime_type": mime_type,
+                    "data": encoded,
+                }
+            }
+        except Exception as e:
+            raise GeminiMediaError(f"Video processing error: {str(e)}")
+
+    @classmethod
+    async def process_media_chunk(cls, chunk: Dict[str, Any],
+                                  stream_id: Optional[str] = None
+                                  ) -> Optional[Dict[str, Any]]:
+        """Process different types of media chunks."""
+        mime_type = chunk.get("mime_type", "")
+        data = chunk.get("data", "")
+
+        if not mime_type or not data:
+            raise GeminiValidationError("Invalid media chunk format")
+
+        if mime_type in SUPPORTED_IMAGE_FORMATS:
+            return await cls.process_image(data, mime_type, stream_id)
+        elif mime_type in SUPPORTED_AUDIO_FORMATS:
+            return await cls.process_audio(data, mime_type)
+        elif mime_type in SUPPORTED_VIDEO_FORMATS:
+            return await cls.process_video(data, mime_type)
+        else:
+            raise GeminiValidationError(f"Unsupported media type: {mime_type}")
+
+
+class AudioAggregator:
+    """Coalesces consecutive small PCM chunks into larger frames."""
+
+    def __init__(self, frame_ms: int = AUDIO_FRAME_MS,
+                 deadline_ms: int = AUDIO_FLUSH_DEADLINE_MS):
+        self.frame_ms = frame_ms
+        self.deadline = deadline_ms / 1000
+        self.buffer = bytearray()
+        self.mime_type: Optional[str] = None
+        self.frame_bytes = 0
+        self.flush_handle: Optional[asyncio.TimerHandle] = None
+        self.flush_task: Optional[asyncio.Task] = None
+
+    def add(self, mime_type: str, payload: bytes) -> List[Dict[str, Any]]:
+        """Buffers a chunk and returns any frames that are now complete."""
+        frames = []
+        if mime_type != self.mime_type:
+            frames.extend(self.take())
+            self.mime_type = mime_type
+            samples = pcm_rate(mime_type) * self.frame_ms // 1000
+            self.frame_bytes = max(2, samples * 2)
+
+        # Small chunks are merged up to the frame size; larger chunks are
+        # already well sized and go out whole rather than being split.
+        self.buffer += payload
+        if len(self.buffer) >= self.frame_bytes:
+            frames.extend(self.take())
+        return frames
+
+    def take(self) -> List[Dict[str, Any]]:
+        """Returns whatever is buffered as a (possibly short) frame."""
+        if not self.buffer:
+            return []
+        frame = {"mime_type": self.mime_type, "data": bytes(self.buffer)}
+        self.buffer.clear()
+        return [frame]
+
+    def cancel_flush(self) -> None:
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+
+    def close(self) -> None:
+        """Cancels a pending flush, timer or task, when its leg ends."""
+        self.cancel_flush()
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            self.flush_task = None
+
+
+class VoiceActivityDetector:
+    """Energy and zero-crossing based VAD for 16-bit mono PCM."""
+
+    def __init__(self, **settings: float):
+        config = {**VAD_SETTINGS, **settings}
+        self.frame_ms = max(5, int(config["frame_ms"]))
+        self.threshold_dbfs = float(config["threshold_dbfs"])
+        self.max_zero_crossing_rate = float(config["max_zero_crossing_rate"])
+        self.hangover_frames = math.ceil(config["hangover_ms"] / self.frame_ms)
+        self.preroll: deque = deque(
+            maxlen=max(0, int(config["preroll_ms"]) // self.frame_ms))
+        self.hangover = 0
+        self.received_ms = 0.0
+        self.forwarded_ms = 0.0
+
+    @classmethod
+    def for_client(cls, requested: Any) -> Optional["VoiceActivityDetector"]:
+        """Builds a detector from the client's optional "vad" settings."""
+        if np is None or not VAD_ENABLED:
+            return None
+        if not isinstance(requested, dict):
+            requested = {}
+        if requested.get("enabled") is False:
+            return None
+        settings = {
+            name: value for name, value in requested.items()
+            if name in VAD_SETTINGS and isinstance(value, (int, float))
+            and not isinstance(value, bool)
+        }
+        return cls(**settings)
+
+    @property
+    def suppressed_ms(self) -> float:
+        return max(0.0, self.received_ms - self.forwarded_ms)
+
+    def speech_frames(self, samples: "np.ndarray", frame_size: int
+                      ) -> List[bool]:
+        """Classifies each frame of ``samples`` as speech or silence."""
+        count = -(-len(samples) // frame_size)
+        frames = np.zeros(count * frame_size, dtype=np.float32)
+        frames[:len(samples)] = samples
+        frames = frames.reshape(count, frame_size)
+
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        dbfs = 20 * np.log10(rms / 32768.0 + 1e-9)
+        crossings = np.count_nonzero(
+            np.diff(np.signbit(frames), axis=1), axis=1) / frame_size
+        speech = ((dbfs > self.threshold_dbfs)
+                  & (crossings <= self.max_zero_crossing_rate))
+        return speech.tolist()
+
+    def process(self, pcm: bytes, rate: int) -> bytes:
+        """Returns the part of ``pcm`` (plus any released pre-roll) to send."""
+        pcm = pcm[:len(pcm) // 2 * 2]
+        if not pcm:
+            return b""
+        frame_size = max(1, rate * self.frame_ms // 1000)
+        frame_bytes = frame_size * 2
+        samples = np.frombuffer(pcm, dtype="<i2")
+
+        output = []
+        for index, is_speech in enumerate(
+                self.speech_frames(samples, frame_size)):
+            frame = pcm[index * frame_bytes:(index + 1) * frame_bytes]
+            if is_speech:
+                output.extend(self.preroll)
+                self.preroll.clear()
+                output.append(frame)
+                self.hangover = self.hangover_frames
+            elif self.hangover > 0:
+                self.hangover -= 1
+                output.append(frame)
+            else:
+                self.preroll.append(frame)
+
+        result = b"".join(output)
+        self.received_ms += len(pcm) * 500 / rate
+        self.forwarded_ms += len(result) * 500 / rate
+        return result
+
+
+class AudioPacer:
+    """Releases downstream audio at playback pace, ``lead`` ahead at most."""
+
+    def __init__(self, lead_ms: int = JITTER_BUFFER_LEAD_MS):
+        self.lead = lead_ms / 1000
+        self.clock = 0.0  # when the audio sent so far finishes playing
+
+    async def pace(self, message: Union[str, bytes]) -> None:
+        rate = pcm_rate(peek_mime_type(message) or "",
+                        MODEL_AUDIO_DEFAULT_RATE)
+        # The base64 payload dominates the frame, so this is close enough.
+        duration = (len(message) * 3 // 4) / (rate * 2)
+        now = time.monotonic()
+        if self.clock < now:
+            self.clock = now  # underrun: restart the playback clock
+        ahead = self.clock - now
+        if ahead > self.lead:
+            await sleep(ahead - self.lead)
+        self.clock += duration
+
+
+class ForwardQueue:
+    """Bounded queue between a proxy direction's reader and writer.
+
+    Messages are classified as control, audio or video from their top-level
+    key and declared mime type; what happens when the queue is full depends
+    on the class's entry in ``QUEUE_POLICIES``. Items carry the time their
+    source frame was read (``received_at``), so the writer can observe the
+    end-to-end forwarding latency in ``latency``.
+    """
+
+    def __init__(self, is_client_to_server: bool,
+                 maxsize: int = FORWARD_QUEUE_SIZE,
+                 jitter_buffer: bool = False,
+                 latency: Optional[Histogram] = None):
+        self.media_key = ("realtime_input" if is_client_to_server
+                          else "serverContent")
+        self.direction = "upstream" if is_client_to_server else "downstream"
+        self.maxsize = maxsize
+        self.policies = QUEUE_POLICIES
+        self.pacer: Optional[AudioPacer] = None
+        if jitter_buffer:
+            # Paced audio backs up behind the pacer; it must wait, not drop.
+            self.policies = {**QUEUE_POLICIES, "audio": "block"}
+            self.pacer = AudioPacer()
+        self.items: deque = deque()
+        self.received_at = 0.0
+        self.latency = latency
+        self.readable = asyncio.Event()
+        self.writable = asyncio.Event()
+        self.closed = False
+        self.metrics = {"enqueued": 0, "dropped": 0, "coalesced": 0,
+                        "blocked": 0, "max_depth": 0}
+
+    def classify(self, message: Union[str, bytes]) -> str:
+        if peek_top_level_key(message) != self.media_key:
+            return "control"
+        mime_type = peek_mime_type(message) or ""
+        if mime_type.startswith("audio/"):
+            return "audio"
+        if mime_type.startswith(("image/", "video/")):
+            return "video"
+        return "control"
+
+    def depth(self) -> int:
+        return len(self.items)
+
+    async def send(self, message: Union[str, bytes],
+                   received_at: Optional[float] = None) -> None:
+        """Enqueues a message according to its class's overflow policy.
+
+        ``received_at`` defaults to when the reader's current frame was read.
+        """
+        if received_at is None:
+            received_at = self.received_at or time.monotonic()
+        if self.closed:
+            raise GeminiConnectionError("Destination closed")
+        message_class = self.classify(message)
+        policy = self.policies[message_class]
+
+        if policy == "latest":
+            for index, (queued_class, _, received) in enumerate(self.items):
+                if queued_class == message_class:
+                    self.items[index] = (message_class, message, received)
+                    self.metrics["coalesced"] += 1
+                    return
+
+        if len(self.items) >= self.maxsize and not self._evict():
+            if policy != "block":
+                self.metrics["dropped"] += 1
+                return
+            self.metrics["blocked"] += 1
+            while len(self.items) >= self.maxsize and not self._evict():
+                self.writable.clear()
+                await self.writable.wait()
+                if self.closed:
+                    raise GeminiConnectionError("Destination closed")
+
+        self.items.append((message_class, message, received_at))
+        self.metrics["enqueued"] += 1
+        self.metrics["max_depth"] = max(self.metrics["max_depth"],
+                                        len(self.items))
+        self.readable.set()
+
+    def _evict(self) -> bool:
+        """Drops the oldest droppable message, if any."""
+        for index, (queued_class, _, _) in enumerate(self.items):
+            if self.policies[queued_class] != "block":
+                del self.items[index]
+                self.metrics["dropped"] += 1
+                return True
+        return False
+
+    async def get(self) -> tuple:
+        """Returns the next ``(message_class, message, received_at)``.
+
+        A message of None ends the writer.
+        """
+        while not self.items:
+            self.readable.clear()
+            await self.readable.wait()
+        item = self.items.popleft()
+        self.writable.set()
+        return item
+
+    async def finish(self, writer: asyncio.Task) -> None:
+        """Lets the writer flush what is queued, then stops it."""
+        if not self.closed:
+            self.items.append(("control", None, 0.0))
+            self.readable.set()
+        try:
+            await asyncio.wait_for(writer, FORWARD_QUEUE_CLOSE_TIMEOUT)
+        except asyncio.TimeoutError:
+            pass
+        self.closed = True
+        self.writable.set()
+
+
+class SlabPool:
+    """Fixed-size ``bytearray`` slabs shared by the media rings.
+
+    Slabs are allocated on demand up to ``max_bytes`` and reused rather
+    than freed, so ring churn does not fragment the heap.
+    """
+
+    def __init__(self, slab_size: int = MEDIA_SLAB_SIZE,
+                 max_bytes: int = MEDIA_POOL_BYTES):
+        self.slab_size = slab_size
+        self.max_slabs = max(1, max_bytes // slab_size)
+        self.allocated = 0
+        self.free: List[bytearray] = []
+
+    def acquire(self) -> Optional[bytearray]:
+        """Returns a slab, or None when the pool's budget is used up."""
+        if self.free:
+            return self.free.pop()
+        if self.allocated >= self.max_slabs:
+            return None
+        self.allocated += 1
+        return bytearray(self.slab_size)
+
+    def release(self, slab: bytearray) -> None:
+        self.free.append(slab)
+
+    def in_use(self) -> int:
+        return (self.allocated - len(self.free)) * self.slab_size
+
+
+class MediaRecord:
+    __slots__ = ("kind", "timestamp", "slab", "offset", "length")
+
+    def __init__(self, kind: str, timestamp: float, slab: bytearray,
+                 offset: int, length: int):
+        self.kind = kind
+        self.timestamp = timestamp
+        self.slab = slab
+        self.offset = offset
+        self.length = length
+
+
+class MediaRing:
+    """Bounded FIFO of frames stored back to back in pooled slabs.
+
+    Records are evicted oldest first: by age, when the connection's slab
+    budget is used up, and when the pool has no slab to spare. Evicting
+    the records of the oldest slab frees that slab for the newest frames.
+    """
+
+    def __init__(self, pool: SlabPool, max_bytes: int = MEDIA_RING_BYTES,
+                 max_age: float = MEDIA_RING_MAX_AGE):
+        self.pool = pool
+        self.max_slabs = max(1, max_bytes // pool.slab_size)
+        self.max_age = max_age
+        self.slabs: deque = deque()  # oldest first; frames go in the last
+        self.records: deque = deque()
+        self.write_offset = 0
+        self.size = 0
+        self.metrics = {"appended": 0, "evicted": 0, "rejected": 0}
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def append(self, kind: str, data: Union[bytes, bytearray, memoryview],
+               now: float) -> bool:
+        """Copies a frame in; False if it could not be kept."""
+        length = len(data)
+        if length > self.pool.slab_size:
+            self.metrics["rejected"] += 1
+            return False
+        self.expire(now)
+        if (not self.slabs
+                or self.write_offset + length > self.pool.slab_size):
+            if not self._next_slab():
+                self.metrics["rejected"] += 1
+                return False
+        slab = self.slabs[-1]
+        offset = self.write_offset
+        slab[offset:offset + length] = data
+        self.write_offset = offset + length
+        self.size += length
+        self.records.append(MediaRecord(kind, now, slab, offset, length))
+        self.metrics["appended"] += 1
+        return True
+
+    def _next_slab(self) -> bool:
+        slab = (self.pool.acquire() if len(self.slabs) < self.max_slabs
+                else None)
+        if slab is None:
+            if not self.slabs:
+                return False
+            # Out of budget: reuse the oldest slab.
+            slab = self.slabs.popleft()
+            self._evict_slab(slab)
+        self.slabs.append(slab)
+        self.write_offset = 0
+        return True
+
+    def _evict_slab(self, slab: bytearray) -> None:
+        records = self.records
+        while records and records[0].slab is slab:
+            self.size -= records.popleft().length
+            self.metrics["evicted"] += 1
+
+    def expire(self, now: float) -> None:
+        """Evicts frames older than ``max_age``; returns empty slabs."""
+        records = self.records
+        cutoff = now - self.max_age
+        while records and records[0].timestamp < cutoff:
+            self.size -= records.popleft().length
+            self.metrics["evicted"] += 1
+        if not records:
+            self.release()
+            return
+        while len(self.slabs) > 1 and records[0].slab is not self.slabs[0]:
+            self.pool.release(self.slabs.popleft())
+
+    def view(self, index: int) -> memoryview:
+        record = self.records[index]
+        return memoryview(record.slab)[record.offset:
+                                       record.offset + record.length]
+
+    def message(self, index: int) -> Union[str, bytes]:
+        """The frame at ``index`` as it was appended by ``ResumeBuffer``."""
+        view = self.view(index)
+        if self.records[index].kind == "text":
+            return str(view, "utf-8")
+        return view.tobytes()
+
+    def release(self) -> None:
+        """Drops every frame and gives the slabs back to the pool."""
+        self.metrics["evicted"] += len(self.records)
+        self.records.clear()
+        while self.slabs:
+            self.pool.release(self.slabs.pop())
+        self.write_offset = 0
+        self.size = 0
+
+
+class ResumeBuffer:
+    """Downstream destination that outlives the client's socket.
+
+    Numbers every frame sent to the client and keeps the latest ones in a
+    ``MediaRing``. While no client is attached frames are only kept, so
+    the upstream session keeps flowing; ``attach`` sends a reconnected
+    client what it missed before it gets live frames again.
+    """
+
+    def __init__(self, websocket: WebSocketCommonProtocol, ring: MediaRing):
+        self.websocket: Optional[WebSocketCommonProtocol] = websocket
+        self.ring = ring
+        self.sequence = 0
+        self.held: Optional[List[Union[str, bytes]]] = None
+        self.closed = False
+
+    def _keep(self, message: Union[str, bytes]) -> None:
+        if isinstance(message, str):
+            kept = self.ring.append("text", message.encode("utf-8"),
+                                    time.monotonic())
+        else:
+            kept = self.ring.append("binary", message, time.monotonic())
+        if not kept:
+            # The ring must stay contiguous up to the latest frame.
+            self.ring.release()
+
+    async def send(self, message: Union[str, bytes]) -> None:
+        self.sequence += 1
+        if self.held is not None:  # attach is replaying
+            self.held.append(message)
+            return
+        self._keep(message)
+        if self.websocket is None:
+            return
+        try:
+            await self.websocket.send(message)
+        except websockets.exceptions.ConnectionClosed:
+            self.websocket = None
+
+    async def attach(self, websocket: WebSocketCommonProtocol,
+                     received: int, hello: Dict[str, Any]) -> tuple:
+        """Sends ``hello`` and the frames after ``received``, then goes live.
+
+        ``hello`` gains the number of frames skipped because they had left
+        the ring (``missed``) and the sequence number the client should
+        continue counting from (``sequence``). Returns ``(replayed,
+        missed)``.
+        """
+        received = max(0, min(received, self.sequence))
+        oldest = self.sequence - len(self.ring) + 1
+        missed = max(0, oldest - received - 1)
+        hello.update(sequence=received + missed, missed=missed)
+        replayed = 0
+        # Frames arriving meanwhile are held back so the ring stays put.
+        self.held = []
+        try:
+            await websocket.send(codec.dumps(hello))
+            for index in range(received + missed + 1 - oldest,
+                               len(self.ring)):
+                await websocket.send(self.ring.message(index))
+                replayed += 1
+            while self.held:
+                message = self.held.pop(0)
+                self._keep(message)
+                await websocket.send(message)
+                replayed += 1
+        finally:
+            held, self.held = self.held, None
+            for message in held:
+                self._keep(message)
+        self.websocket = websocket
+        return replayed, missed
+
+    async def close(self) -> None:
+        self.closed = True
+        if self.websocket is not None:
+            await self.websocket.close()
+
+
+class AdmissionController:
+    """Caps concurrent upstream handshakes; queues, then sheds, the rest."""
+
+    def __init__(self, initial: int = ADMISSION_INITIAL_LIMIT,
+                 minimum: int = ADMISSION_MIN_LIMIT,
+                 maximum: int = ADMISSION_MAX_LIMIT,
+                 target: float = ADMISSION_TARGET_CONNECT,
+                 queue_size: int = ADMISSION_QUEUE_SIZE,
+                 wait_timeout: float = ADMISSION_WAIT_TIMEOUT):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target = target
+        self.queue_size = queue_size
+        self.wait_timeout = wait_timeout
+        self.in_flight = 0
+        self.waiters: deque = deque()
+        self.last_decrease = 0.0
+        self.metrics = {"admitted": 0, "queued": 0, "shed": 0,
+                        "timed_out": 0}
+
+    async def admit(self, notify: Callable[[int], Awaitable[Any]]) -> bool:
+        """Waits for a handshake slot; False means the client is shed.
+
+        ``notify`` is awaited with the client's queue position whenever it
+        changes. Every admitted client must call ``release``, and ``adapt``
+        with the outcome of its handshake.
+        """
+        if self.in_flight < int(self.limit) and not self.waiters:
+            self.in_flight += 1
+            self.metrics["admitted"] += 1
+            return True
+        if len(self.waiters) >= self.queue_size:
+            self.metrics["shed"] += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        self.metrics["queued"] += 1
+        deadline = time.monotonic() + self.wait_timeout
+        notified = None
+        admitted = False
+        try:
+            while not waiter.done():
+                position = self.waiters.index(waiter) + 1
+                if position != notified:
+                    await notify(position)
+                    notified = position
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(
+                        asyncio.shield(waiter),
+                        min(remaining, ADMISSION_POSITION_INTERVAL))
+                except asyncio.TimeoutError:
+                    pass
+            admitted = waiter.done()
+        finally:
+            if not waiter.done():
+                waiter.cancel()
+                self.waiters.remove(waiter)
+            elif not admitted:
+                # Handed a slot but leaving anyway (the client went away).
+                self.release()
+        if admitted:
+            self.metrics["admitted"] += 1
+        else:
+            self.metrics["timed_out"] += 1
+            self.metrics["shed"] += 1
+        return admitted
+
+    def release(self) -> None:
+        """Frees a slot, admitting waiters up to the current limit."""
+        self.in_flight -= 1
+        while self.waiters and self.in_flight < int(self.limit):
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(True)
+
+    def adapt(self, connect_time: Optional[float]) -> None:
+        """Additive increase, multiplicative decrease on connect latency.
+
+        ``connect_time`` is None if the handshake failed.
+        """
+        if connect_time is not None and connect_time <= self.target:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            return
+        now = time.monotonic()
+        if now - self.last_decrease >= 1.0:
+            self.limit = max(self.minimum, self.limit * 0.75)
+            self.last_decrease = now
+
+
+@dataclass
+class WarmConnection:
+    websocket: WebSocketCommonProtocol
+    created: float
+
+
+class UpstreamPool:
+    """Pool of pre-connected, already set up upstream sessions.
+
+    ``acquire`` hands out a warm session when one is available and healthy,
+    otherwise connects directly, and then tops the pool for that key back
+    up in the background. The number of warm sessions kept per key is
+    derived from the key's arrival rate and the average connect time, and
+    is zero for keys not expected to reconnect within the TTL.
+    """
+
+    def __init__(self, connect, ttl: float = UPSTREAM_POOL_TTL,
+                 max_per_key: int = UPSTREAM_POOL_MAX_PER_KEY,
+                 health_timeout: float = UPSTREAM_POOL_HEALTH_TIMEOUT):
+        self.connect = connect
+        self.ttl = ttl
+        self.max_per_key = max_per_key
+        self.health_timeout = health_timeout
+        self.idle: Dict[tuple, deque] = {}
+        self.keys: Dict[tuple, Dict[str, Any]] = {}
+        self.refilling: Dict[tuple, int] = {}
+        self.prewarming: set = set()  # running _prewarm tasks
+        self.connect_time_avg = 1.0
+        self.acquire_time = Histogram(CONNECT_TIME_BUCKETS)
+        self.maintenance: Optional[asyncio.Task] = None
+        self.metrics = {
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "unhealthy": 0,
+            "prewarmed": 0,
+            "prewarm_failures": 0,
+        }
+
+    @staticmethod
+    def pool_key(bearer_token: str, config: Dict[str, Any]) -> tuple:
+        return (hashlib.sha256(bearer_token.encode("utf-8")).hexdigest(),
+                json.dumps(config, sort_keys=True))
+
+    async def acquire(self, bearer_token: str,
+                      config: Dict[str, Any]) -> WebSocketCommonProtocol:
+        """Returns a ready upstream session for the token and config."""
+        start = time.monotonic()
+        key = self.pool_key(bearer_token, config)
+        self._record_arrival(key, bearer_token, config, start)
+
+        websocket = await self._take_idle(key)
+        if websocket is not None:
+            self.metrics["hits"] += 1
+        else:
+            self.metrics["misses"] += 1
+            websocket = await self._connect(bearer_token, config)
 
-            if len(image_data) > MAX_IMAGE_SIZE:
-                raise GeminiMediaError("Image size exceeds maximum limit")
+        self.acquire_time.observe(time.monotonic() - start)
+        self._refill(key)
+        if self.maintenance is None or self.maintenance.done():
+            self.maintenance = asyncio.create_task(self._maintain())
+        return websocket
 
-            with Image.open(io.BytesIO(image_data)) as img:
-                if img.mode not in ("RGB", "RGBA"):
-                    img = img.convert("RGB")
+    def target_size(self, key: tuple, now: float) -> int:
+        """Warm sessions to keep for ``key`` given its arrival rate."""
+        info = self.keys.get(key)
+        if info is None or info["interval"] is None:
+            return 0
+        interval = max(info["interval"], now - info["last_arrival"], 1e-3)
+        rate = 1.0 / interval
+        if rate * self.ttl < 0.5:
+            return 0
+        return min(self.max_per_key,
+                   max(1, math.ceil(rate * self.connect_time_avg)))
 
-                max_dim = 2048
-                if max(img.size) > max_dim:
-                    ratio = max_dim / max(img.size)
-                    new_size = tuple(int(dim * ratio) for dim in img.size)
-                    img = img.resize(new_size, Image.Resampling.LANCZOS)
+    def pool_metrics(self) -> Dict[str, Any]:
+        lookups = self.metrics["hits"] + self.metrics["misses"]
+        return {
+            **self.metrics,
+            "hit_rate": (round(self.metrics["hits"] / lookups, 3)
+                         if lookups else 0.0),
+            "idle": sum(len(idle_list) for idle_list in self.idle.values()),
+        }
 
-                img_byte_arr = io.BytesIO()
-                img.save(img_byte_arr,
-                         format=mime_type.split("/")[-1].upper())
-                processed_data = base64.b64encode(
-                    img_byte_arr.getvalue()).decode("utf-8")
+    async def close(self) -> None:
+        if self.maintenance is not None:
+            self.maintenance.cancel()
+        for task in list(self.prewarming):
+            task.cancel()
+        for idle_list in self.idle.values():
+            while idle_list:
+                await self._discard(idle_list.popleft().websocket)
+        self.idle.clear()
 
-            return {"inline_data": {"mime_type": mime_type,
-                                    "data": processed_data}}
-        except Exception as e:
-            raise GeminiMediaError(f"Image processing error: {str(e)}")
+    def _record_arrival(self, key: tuple, bearer_token: str,
+                        config: Dict[str, Any], now: float) -> None:
+        info = self.keys.get(key)
+        if info is None:
+            self.keys[key] = {"token": bearer_token, "config": config,
+                              "last_arrival": now, "interval": None}
+            return
+        gap = now - info["last_arrival"]
+        info["interval"] = (gap if info["interval"] is None
+                            else 0.7 * info["interval"] + 0.3 * gap)
+        info["last_arrival"] = now
+        info["token"] = bearer_token
 
-    @staticmethod
-    async def process_audio(data: Union[str, bytes],
-                            mime_type: str) -> Dict[str, Any]:
-        """Process and validate audio data."""
-        try:
-            if isinstance(data, str):
-                audio_data = base64.b64decode(data)
-            else:
-                audio_data = data
+    async def _connect(self, bearer_token: str,
+                       config: Dict[str, Any]) -> WebSocketCommonProtocol:
+        start = time.monotonic()
+        websocket = await self.connect(bearer_token, config)
+        elapsed = time.monotonic() - start
+        self.connect_time_avg = 0.8 * self.connect_time_avg + 0.2 * elapsed
+        return websocket
 
-            if len(audio_data) > MAX_AUDIO_CHUNK_SIZE:
-                raise GeminiMediaError("Audio chunk size exceeds maximum limit")
+    async def _take_idle(self, key: tuple
+                         ) -> Optional[WebSocketCommonProtocol]:
+        idle_list = self.idle.get(key)
+        while idle_list:
+            warm = idle_list.popleft()
+            if time.monotonic() - warm.created > self.ttl:
+                self.metrics["expired"] += 1
+                await self._discard(warm.websocket)
+            elif not await self._healthy(warm.websocket):
+                self.metrics["unhealthy"] += 1
+                await self._discard(warm.websocket)
+            else:
+                return warm.websocket
+        return None
 
-            return {
-                "audio_chunk": {
-                    "mime_type": mime_type,
-                    "data": base64.b64encode(audio_data).decode("utf-8"),
-                }
-            }
-        except Exception as e:
-            raise GeminiMediaError(f"Audio processing error: {str(e)}")
+    async def _healthy(self, websocket: WebSocketCommonProtocol) -> bool:
+        try:
+            pong_waiter = await websocket.ping()
+            await asyncio.wait_for(pong_waiter, self.health_timeout)
+            return True
+        except Exception:
+            return False
 
     @staticmethod
-    async def process_video(data: Union[str, bytes],
-                            mime_type: str) -> Dict[str, Any]:
-        """Process and validate video data."""
+    async def _discard(websocket: WebSocketCommonProtocol) -> None:
         try:
-            if isinstance(data, str):
-                video_data = base64.b64decode(data)
-            else:
-                video_data = data
-
-            if len(video_data) > MAX_VIDEO_CHUNK_SIZE:
-                raise GeminiMediaError("Video chunk size exceeds maximum limit")
-
-            return {
-                "video_chunk": {
-                    "mime_type": mime_type,
-                    "data": base64.b64encode(video_data).decode("utf-8"),
-                }
-            }
+            await websocket.close()
         except Exception as e:
-            raise GeminiMediaError(f"Video processing error: {str(e)}")
+            logger.debug(f"Error closing pooled connection: {e}")
 
-    @classmethod
-    async def process_media_chunk(cls, chunk: Dict[str, Any]) -> Dict[str, Any]:
-        """Process different types of media chunks."""
-        mime_type = chunk.get("mime_type", "")
-        data = chunk.get("data", "")
+    def _refill(self, key: tuple) -> None:
+        target = self.target_size(key, time.monotonic())
+        have = len(self.idle.get(key, ())) + self.refilling.get(key, 0)
+        for _ in range(target - have):
+            self.refilling[key] = self.refilling.get(key, 0) + 1
+            task = asyncio.create_task(self._prewarm(key))
+            self.prewarming.add(task)
+            task.add_done_callback(self.prewarming.discard)
 
-        if not mime_type or not data:
-            raise GeminiValidationError("Invalid media chunk format")
+    async def _prewarm(self, key: tuple) -> None:
+        info = self.keys[key]
+        try:
+            websocket = await self._connect(info["token"], info["config"])
+            self.idle.setdefault(key, deque()).append(
+                WarmConnection(websocket, time.monotonic()))
+            self.metrics["prewarmed"] += 1
+        except Exception as e:
+            self.metrics["prewarm_failures"] += 1
+            logger.debug(f"Upstream prewarm failed: {e}")
+        finally:
+            self.refilling[key] -= 1
 
-        if mime_type in SUPPORTED_IMAGE_FORMATS:
-            return await cls.process_image(data, mime_type)
-        elif mime_type in SUPPORTED_AUDIO_FORMATS:
-            return await cls.process_audio(data, mime_type)
-        elif mime_type in SUPPORTED_VIDEO_FORMATS:
-            return await cls.process_video(data, mime_type)
-        else:
-            raise GeminiValidationError(f"Unsupported media type: {mime_type}")
+    async def _maintain(self) -> None:
+        """Expires idle sessions and forgets keys that went quiet."""
+        while self.keys:
+            await sleep(self.ttl / 4)
+            now = time.monotonic()
+            for key, idle_list in list(self.idle.items()):
+                while idle_list and now - idle_list[0].created > self.ttl:
+                    self.metrics["expired"] += 1
+                    await self._discard(idle_list.popleft().websocket)
+                if not idle_list:
+                    del self.idle[key]
+            for key in list(self.keys):
+                if (key not in self.idle and not self.refilling.get(key)
+                        and now - self.keys[key]["last_arrival"] > self.ttl):
+                    del self.keys[key]
+                else:
+                    self._refill(key)
 
 
 class GeminiProxy:
+    # Entries of ``metrics`` that are levels rather than running totals.
+    gauges = {
+        "active_connections": "Connected clients.",
+        "pending_connections": "Clients authenticating or connecting "
+                               "upstream.",
+        "detached_connections": "Sessions waiting for their client to "
+                                "resume.",
+    }
+
     def __init__(self):
         self.ssl_context = ssl.create_default_context()
+        self.service_url = SERVICE_URL
         self.active_connections: Dict[str, ConnectionInfo] = {}
-        self.connection_limit = 100
-        self.rate_limit = 10
-        self.last_request_time = 0
+        self.connection_limit = CONNECTION_LIMIT
+        self.pending_connections = 0
+        self.idle_timeout = IDLE_TIMEOUT
+        self.idle_deadlines: List[tuple] = []
+        self.idle_wakeup = asyncio.Event()
+        self.reaper: Optional[asyncio.Task] = None
+        self.admission = AdmissionController()
+        self.resume_enabled = RESUME_ENABLED
+        self.resume_grace_period = RESUME_GRACE_PERIOD
+        self.media_pool = SlabPool()
+        self.scheduler = RateScheduler(RATE_LIMITS, GLOBAL_RATE_LIMIT)
         self.retry_count = 3
         self.retry_delay = 1
+        self.passthrough_enabled = True
+        self.video_dedup_enabled = VIDEO_DEDUP_ENABLED
+        self.image_processing_enabled = IMAGE_PROCESSING_ENABLED
+        self.jitter_buffer_enabled = JITTER_BUFFER_ENABLED
+        self.registry = MetricsRegistry()
+        self.connect_time = self.registry.histogram(
+            "finn_upstream_connect_seconds",
+            "Time to connect and set up an upstream session.",
+            CONNECT_TIME_BUCKETS)
+        self.forward_latency = {
+            direction: self.registry.histogram(
+                "finn_forward_latency_seconds",
+                "Time from reading a frame to sending it on.",
+                LATENCY_BUCKETS, direction=direction)
+            for direction in ("upstream", "downstream")
+        }
+        self.message_size = {
+            direction: self.registry.histogram(
+                "finn_message_size_bytes", "Size of frames read.",
+                MESSAGE_SIZE_BUCKETS, direction=direction)
+            for direction in ("upstream", "downstream")
+        }
+        self.media_time = {
+            modality: self.registry.histogram(
+                "finn_media_processing_seconds",
+                "Time spent processing client media.",
+                LATENCY_BUCKETS, modality=modality)
+            for modality in ("audio", "video")
+        }
+        self.media_time["image"] = self.registry.register(
+            "finn_media_processing_seconds",
+            "Time spent processing client media.",
+            MediaProcessor.image_time, modality="image")
+        self.validators = {
+            "upstream": MessageValidator(
+                CLIENT_MESSAGE_SCHEMAS, sample_every=1,
+                fast_path=media_chunks_fast_path),
+            "downstream": MessageValidator(
+                SERVER_MESSAGE_SCHEMAS, fast_path=model_turn_fast_path),
+        }
+        self.validation_time = {
+            direction: self.registry.histogram(
+                "finn_validation_seconds",
+                "Time spent checking a parsed frame's shape.",
+                VALIDATION_TIME_BUCKETS, direction=direction)
+            for direction in ("upstream", "downstream")
+        }
+        self.first_audio_time = self.registry.histogram(
+            "finn_time_to_first_audio_seconds",
+            "Time from the last client frame of a turn to the first model "
+            "audio.", FIRST_AUDIO_BUCKETS)
+        self.trace_sample_rate = TRACE_SAMPLE_RATE
+        self.record_dir = RECORD_DIR
+        self.traces: "OrderedDict[str, SessionTrace]" = OrderedDict()
+        self.upstream_pool = (UpstreamPool(self.create_server_connection)
+                              if UPSTREAM_POOL_ENABLED else None)
+        if self.upstream_pool is not None:
+            self.registry.register(
+                "finn_upstream_pool_acquire_seconds",
+                "Time to hand out an upstream session, warm or not.",
+                self.upstream_pool.acquire_time)
         self.metrics = {
             "total_requests": 0,
             "failed_requests": 0,
             "active_connections": 0,
             "total_messages_processed": 0,
+            "passthrough_messages": 0,
+            "throttled_messages": 0,
+            "throttle_delay_seconds": 0.0,
+            "video_frames_forwarded": 0,
+            "video_frames_dropped": 0,
+            "image_frames_processed": 0,
+            "image_frames_superseded": 0,
+            "image_frames_failed": 0,
+            "binary_frames": 0,
+            "binary_sequence_gaps": 0,
+            "audio_chunks_in": 0,
+            "audio_frames_out": 0,
+            "vad_suppressed_ms": 0.0,
+            "traced_sessions": 0,
+            "log_suppressed": 0,
+            "pending_connections": 0,
+            "sessions_rejected": 0,
+            "sessions_reaped": 0,
+            "detached_connections": 0,
+            "sessions_parked": 0,
+            "sessions_resumed": 0,
+            "sessions_expired": 0,
+            "resume_frames_replayed": 0,
+            "resume_frames_missed": 0,
+            "media_frames_evicted": 0,
+            "media_frames_rejected": 0,
+            "messages_validated": 0,
+            "validation_skipped": 0,
+            "invalid_messages": 0,
+            "unknown_server_messages": 0,
         }
-
-    def validate_message_format(
-        self, message: Dict[str, Any], is_client_to_server: bool
-    ) -> bool:
-        """Validates message format according to Gemini API specifications."""
-        try:
-            if is_client_to_server:
-                if "client_content" in message:
-                    content = message["client_content"]
-                    if not isinstance(content.get("turns"), list):
-                        return False
-                    for turn in content["turns"]:
-                        if not isinstance(turn.get("parts"), list):
-                            return False
-                elif "realtime_input" in message:
-                    input_data = message["realtime_input"]
-                    if not isinstance(input_data.get("media_chunks"), list):
-                        return False
-                elif "tool_response" in message:
-                    if not isinstance(message.get("tool_response"), dict):
-                        return False
-                else:
-                    return False
-            else:
-                if ("serverContent" not in message and "toolCall" not in message
-                        and "toolCallCancellation" not in message):
-                    return False
-                if ("serverContent" in message and
-                        "modelTurn" not in message["serverContent"]):
-                    return False
-            return True
-        except Exception as e:
-            logger.error(f"Message validation error: {e}")
-            return False
+        self.log_limiter = LogRateLimiter()
 
     async def create_server_connection(
         self, bearer_token: str, config: Optional[Dict[str, Any]] = None
     ) -> WebSocketCommonProtocol:
         """Creates a connection to the Gemini server."""
+        start = time.monotonic()
         try:
             headers = {
                 "Content-Type": "application/json",
@@ -330,12 +2922,14 @@ class GeminiProxy:
 
             async with asyncio.timeout(15):  # Increase timeout
                 connection = await websockets.connect(
-                    SERVICE_URL,
+                    self.service_url,
                     additional_headers=headers,
-                    ssl=self.ssl_context,
+                    ssl=(self.ssl_context
+                         if self.service_url.startswith("wss://") else None),
                     ping_interval=30,
                     ping_timeout=10,
                     close_timeout=5,
+                    **compression_options("upstream", server=False),
                 )
 
                 # Send initial setup message
@@ -351,17 +2945,18 @@ class GeminiProxy:
                     "setup": setup_message
                 }
                 
-                await connection.send(json.dumps(setup_message_wrapper))
+                await connection.send(codec.dumps(setup_message_wrapper))
 
                 # Wait for setup acknowledgment
                 response = await asyncio.wait_for(connection.recv(),
                                                   timeout=10.0)
-                response_data = json.loads(response)
+                response_data = codec.loads(response)
                 
                 if not response_data.get("success"):
                     raise GeminiConnectionError(
                         f"Setup failed: {response_data.get('error')}")
 
+                self.connect_time.observe(time.monotonic() - start)
                 return connection
 
         except asyncio.TimeoutError as e:
@@ -370,25 +2965,123 @@ class GeminiProxy:
             raise GeminiConnectionError(
                 f"Failed to connect to Gemini server: {e}") from e
 
+    async def throttle(self, connection: Optional[ConnectionInfo],
+                       message_type: str) -> None:
+        """Applies the connection's rate budget for a client message type."""
+        if connection is None:
+            return
+        budget = RATE_BUDGETS.get(message_type, "turn")
+        waited = await self.scheduler.acquire(connection, budget)
+        if waited > 0:
+            self.metrics["throttled_messages"] += 1
+            self.metrics["throttle_delay_seconds"] += waited
+
+    @staticmethod
+    def audio_rates(connection: ConnectionInfo) -> Dict[str, float]:
+        """Per-connection audio frame rates and VAD suppression."""
+        elapsed = max(time.monotonic() - connection.connected_at, 1e-3)
+        rates = {
+            "audio_in_fps": round(connection.audio_chunks_in / elapsed, 2),
+            "audio_out_fps": round(connection.audio_frames_out / elapsed, 2),
+        }
+        if connection.vad is not None:
+            rates["vad_suppressed_ms"] = round(connection.vad.suppressed_ms)
+        return rates
+
+    def client_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Per-connection state, exported by ``client_metric_lines``."""
+        return {
+            client_id: {
+                "queue_depth": conn.queue_depth,
+                "throttled_messages": conn.throttled_messages,
+                "throttle_delay_seconds": round(conn.throttle_delay, 3),
+                "idle_seconds": round(time.monotonic() - conn.last_active, 1),
+                "detached": conn.parked is not None,
+                **{f"{direction}_queue_depth": outbox.depth()
+                   for direction, outbox in conn.queues.items()},
+                **{f"{direction}_queue_dropped": outbox.metrics["dropped"]
+                   for direction, outbox in conn.queues.items()},
+                **self.audio_rates(conn),
+            }
+            for client_id, conn in self.active_connections.items()
+        }
+
+    # name, type, help, client_metrics() entry ("{direction}" for per-queue)
+    client_families = (
+        ("finn_client_rate_queue_depth", "gauge",
+         "Messages waiting for the client's rate budget.", "queue_depth"),
+        ("finn_client_throttled_messages_total", "counter",
+         "Client messages delayed by its rate budget.",
+         "throttled_messages"),
+        ("finn_client_throttle_delay_seconds_total", "counter",
+         "Time client messages waited for its rate budget.",
+         "throttle_delay_seconds"),
+        ("finn_client_idle_seconds", "gauge",
+         "Time since the client's last frame.", "idle_seconds"),
+        ("finn_client_detached", "gauge",
+         "Whether the session waits for its client to resume.", "detached"),
+        ("finn_client_queue_depth", "gauge",
+         "Messages in the client's forward queue.",
+         "{direction}_queue_depth"),
+        ("finn_client_queue_dropped_total", "counter",
+         "Messages the client's forward queue dropped.",
+         "{direction}_queue_dropped"),
+        ("finn_client_audio_in_fps", "gauge",
+         "Client audio chunks received per second.", "audio_in_fps"),
+        ("finn_client_audio_out_fps", "gauge",
+         "Audio frames sent upstream per second, after coalescing.",
+         "audio_out_fps"),
+        ("finn_client_vad_suppressed_ms_total", "counter",
+         "Client audio suppressed as silence.", "vad_suppressed_ms"),
+    )
+
+    def client_metric_lines(self) -> List[str]:
+        """Per-client series for the sessions with the deepest queues."""
+        def backlog(item) -> int:
+            stats = item[1]
+            return (stats["queue_depth"]
+                    + stats.get("upstream_queue_depth", 0)
+                    + stats.get("downstream_queue_depth", 0))
+
+        clients = heapq.nlargest(CLIENT_METRICS_LIMIT,
+                                 self.client_metrics().items(), key=backlog)
+        lines = []
+        for name, kind, help_text, entry in self.client_families:
+            samples = {}
+            for client_id, stats in clients:
+                label = ("client", client_id)
+                if "{direction}" not in entry:
+                    value = stats.get(entry)
+                    if value is not None:
+                        samples[(label,)] = (int(value)
+                                             if isinstance(value, bool)
+                                             else value)
+                    continue
+                for direction in ("upstream", "downstream"):
+                    key = entry.format(direction=direction)
+                    if key in stats:
+                        samples[(label, ("direction", direction))] = (
+                            stats[key])
+            if samples:
+                lines += metric_lines(name, kind, help_text, samples)
+        return lines
+
     async def send_with_retry(
         self,
         websocket: WebSocketCommonProtocol,
         message: str,
         retry_count: Optional[int] = None,
+        connection: Optional[ConnectionInfo] = None,
+        message_type: str = "client_content",
     ) -> None:
         """Send message with retry logic."""
         retries = retry_count if retry_count is not None else self.retry_count
         last_error = None
 
+        await self.throttle(connection, message_type)
         for attempt in range(retries):
             try:
-                current_time = time.time()
-                time_diff = current_time - self.last_request_time
-                if time_diff < 1.0 / self.rate_limit:
-                    await sleep((1.0 / self.rate_limit) - time_diff)
-
                 await websocket.send(message)
-                self.last_request_time = time.time()
                 self.metrics["total_messages_processed"] += 1
                 return
             except Exception as e:
@@ -406,63 +3099,130 @@ class GeminiProxy:
         source: WebSocketCommonProtocol,
         destination: WebSocketCommonProtocol,
         is_client_to_server: bool = True,
+        connection: Optional[ConnectionInfo] = None,
     ) -> None:
-        """Proxies messages between websocket connections."""
+        """Proxies messages between websocket connections.
+
+        Messages are read and processed here and handed to a bounded
+        ``ForwardQueue`` drained by a separate writer task, so a slow
+        destination never stalls reading from the source.
+        """
+        passthrough_keys = (PASSTHROUGH_CLIENT_KEYS if is_client_to_server
+                            else PASSTHROUGH_SERVER_KEYS)
+        direction = "upstream" if is_client_to_server else "downstream"
+        message_size = self.message_size[direction]
+        validator = self.validators[direction]
+        validation_time = self.validation_time[direction]
+        parsed = 0  # frames of this leg that reached the full parse path
+        outbox = ForwardQueue(
+            is_client_to_server,
+            jitter_buffer=(not is_client_to_server
+                           and self.jitter_buffer_enabled),
+            latency=self.forward_latency[direction])
+        if connection is not None:
+            connection.queues[direction] = outbox
+        writer = asyncio.create_task(
+            self.drain_queue(outbox, destination, connection))
+        recorder = connection.recorder if connection is not None else None
         try:
             async for message in source:
+                outbox.received_at = time.monotonic()
+                message_size.observe(len(message))
+                if connection is not None:
+                    connection.last_active = outbox.received_at
+                if recorder is not None:
+                    recorder.frame(is_client_to_server, message,
+                                   outbox.received_at)
                 try:
-                    data = json.loads(message)
+                    if (is_client_to_server and isinstance(message, bytes)
+                            and connection is not None
+                            and connection.binary_media):
+                        data = self.translate_binary_frame(message, connection)
+                        await self.forward_media(data, connection, outbox)
+                        self.metrics["total_messages_processed"] += 1
+                        continue
+
+                    key = (peek_top_level_key(message)
+                           if self.passthrough_enabled else None)
+                    if key in passthrough_keys and not (
+                            is_client_to_server and
+                            self.needs_inspection(key, message, connection)):
+                        if is_client_to_server:
+                            if key != "realtime_input":
+                                await self.flush_audio(connection, outbox)
+                            await self.throttle(connection, key)
+                        await self.forward_raw(message, outbox,
+                                               is_client_to_server)
+                        continue
+
+                    data = codec.loads(message)
                     if DEBUG:
-                        direction = ("client → server" if is_client_to_server
-                                     else "server → client")
-                        logger.debug(f"{direction}: {data}")
+                        logger.debug("%s: %s", direction,
+                                     PayloadSummary(data))
 
                     # Handle ping/pong
                     if data.get("type") == "ping":
-                        await destination.send(json.dumps({"type": "pong"}))
+                        await outbox.send(codec.dumps({"type": "pong"}))
                         continue
 
-                    # Validate message format
-                    if not self.validate_message_format(
-                            data, is_client_to_server):
-                        logger.error(f"Invalid message format: {data}")
+                    if validator.sampled(parsed):
+                        started = time.perf_counter()
+                        valid = validator.validate(data)
+                        validation_time.observe(time.perf_counter() - started)
+                        self.metrics["messages_validated"] += 1
+                    else:
+                        valid = True
+                        self.metrics["validation_skipped"] += 1
+                    parsed += 1
+                    if not valid:
+                        self.metrics["invalid_messages"] += 1
+                        self.log_error(connection,
+                                       "Invalid message format: %s",
+                                       PayloadSummary(data))
                         if is_client_to_server:
                             await self.send_error(source,
                                                   "Invalid message format")
                         continue
-                    
+
                     if is_client_to_server:
                         if "client_content" in data:
-                            await destination.send(json.dumps(data))
+                            await self.flush_audio(connection, outbox)
+                            await self.throttle(connection, "client_content")
+                            await outbox.send(codec.dumps(data))
                         elif "realtime_input" in data:
-                            await destination.send(json.dumps(data))
+                            await self.forward_media(data, connection, outbox)
                         elif "tool_response" in data:
-                            await destination.send(json.dumps(data))
+                            await self.flush_audio(connection, outbox)
+                            await self.throttle(connection, "tool_response")
+                            await outbox.send(codec.dumps(data))
                         else:
-                            logger.error(f"Unknown client message type: {data}")
-                            await self.send_error(source,
-                                                  "Unknown client message type")
+                            self.log_error(connection,
+                                           "Unknown client message type: %s",
+                                           PayloadSummary(data))
+                            await self.send_error(
+                                source, "Unknown client message type")
                     else:
-                        if "serverContent" in data:
-                            await destination.send(json.dumps(data))
-                        elif "toolCall" in data:
-                            await destination.send(json.dumps(data))
-                        elif "toolCallCancellation" in data:
-                            await destination.send(json.dumps(data))
-                        else:
-                            logger.error(f"Unknown server message type: {data}")
-                            await self.send_error(source,
-                                                  "Unknown server message type")
+                        if validator.keys.isdisjoint(data):
+                            # Newer or informational messages: harmless to
+                            # the client, so passed on rather than refused.
+                            self.metrics["unknown_server_messages"] += 1
+                            logger.debug("Forwarding unknown server "
+                                         "message: %s", PayloadSummary(data))
+                        await outbox.send(codec.dumps(data))
 
                     # Update metrics
                     self.metrics["total_messages_processed"] += 1
 
-                except json.JSONDecodeError as e:
-                    logger.error(f"Error decoding JSON message: {e}")
+                except GeminiConnectionError:
+                    raise
+                except codec.DecodeError as e:
+                    self.log_error(connection,
+                                   "Error decoding JSON message: %s", e)
                     if is_client_to_server:
                         await self.send_error(source, "Invalid JSON message")
                 except Exception as e:
-                    logger.error(f"Error processing message: {e}")
+                    self.log_error(connection,
+                                   "Error processing message: %s", e)
                     if is_client_to_server:
                         await self.send_error(source,
                                               "Failed to process message")
@@ -472,15 +3232,404 @@ class GeminiProxy:
         except Exception as e:
             logger.error(f"Error in proxy_messages: {e}")
         finally:
+            # A client that dropped may resume; its upstream stays open.
+            parked = is_client_to_server and self.resumable(connection)
+            if connection is not None and connection.audio is not None:
+                if parked:
+                    # Buffered audio goes on now instead of at the deadline,
+                    # while this leg's queue still drains upstream.
+                    pending = connection.audio.flush_task
+                    await self.flush_audio(connection, outbox)
+                    if pending is not None:
+                        await asyncio.wait((pending,))
+                else:
+                    connection.audio.close()
+            await outbox.finish(writer)
+            if not parked:
+                try:
+                    await destination.close()
+                except Exception as e:
+                    logger.error(f"Error closing websocket: {e}")
+
+    def log_error(self, connection: Optional[ConnectionInfo], message: str,
+                  *args: Any) -> None:
+        """Logs an error, rate-limited per connection and message."""
+        limiter = (connection.log_limiter if connection is not None
+                   else self.log_limiter)
+        allowed, suppressed = limiter.allow(message, time.monotonic())
+        if not allowed:
+            self.metrics["log_suppressed"] += 1
+            return
+        if connection is not None:
+            message = "[%s] " + message
+            args = (connection.client_id, *args)
+        if suppressed:
+            message += " (%d repeats suppressed)"
+            args = (*args, suppressed)
+        logger.error(message, *args)
+
+    def needs_inspection(self, key: str, message: Union[str, bytes],
+                         connection: Optional[ConnectionInfo]) -> bool:
+        """Whether a pass-through candidate must be parsed and filtered."""
+        if key != "realtime_input" or connection is None:
+            return False
+        mime_type = peek_mime_type(message) or ""
+        if mime_type.startswith("image/"):
+            return self.video_dedup_enabled or self.image_processing_enabled
+        if mime_type.startswith("audio/pcm"):
+            return connection.audio is not None or connection.vad is not None
+        return False
+
+    async def forward_media(self, data: Dict[str, Any],
+                            connection: Optional[ConnectionInfo],
+                            outbox: "ForwardQueue") -> None:
+        """Filters, coalesces and forwards a parsed realtime_input message."""
+        if not await self.filter_media_chunks(data, connection):
+            return
+        if (connection is not None and self.image_processing_enabled
+                and not await self.process_image_chunks(data, connection)):
+            return
+        if connection is not None and (connection.audio is not None
+                                       or connection.vad is not None):
+            await self.process_audio_chunks(data, connection, outbox)
+            if not data["realtime_input"]["media_chunks"]:
+                return
+        await self.throttle(connection, "realtime_input")
+        await outbox.send(build_realtime_input(
+            data["realtime_input"]["media_chunks"]))
+
+    async def process_image_chunks(self, data: Dict[str, Any],
+                                   connection: ConnectionInfo) -> bool:
+        """Normalizes image chunks in the image pipeline.
+
+        Frames superseded by a newer one from the same client, or that fail
+        to decode, are dropped. Returns False when nothing is left.
+        """
+        kept = []
+        for chunk in data["realtime_input"]["media_chunks"]:
+            if chunk.get("mime_type") not in SUPPORTED_IMAGE_FORMATS:
+                kept.append(chunk)
+                continue
             try:
-                await destination.close()
-            except Exception as e:
-                logger.error(f"Error closing websocket: {e}")
+                processed = await MediaProcessor.process_media_chunk(
+                    chunk, stream_id=connection.client_id)
+            except GeminiError as e:
+                self.metrics["image_frames_failed"] += 1
+                self.log_error(connection, "Dropped image frame: %s", e)
+                continue
+            if processed is None:
+                self.metrics["image_frames_superseded"] += 1
+                continue
+            self.metrics["image_frames_processed"] += 1
+            kept.append(processed["inline_data"])
+        data["realtime_input"]["media_chunks"] = kept
+        return bool(kept)
+
+    async def process_audio_chunks(self, data: Dict[str, Any],
+                                   connection: ConnectionInfo,
+                                   outbox: "ForwardQueue") -> None:
+        """Runs PCM chunks through VAD and the connection's aggregator.
+
+        Completed frames are forwarded immediately; a partial frame is
+        flushed by a timer after ``AUDIO_FLUSH_DEADLINE_MS``.
+        """
+        start = time.monotonic()
+        aggregator, vad = connection.audio, connection.vad
+        kept, frames = [], []
+        for chunk in data["realtime_input"]["media_chunks"]:
+            mime_type = str(chunk.get("mime_type", ""))
+            if not mime_type.startswith("audio/pcm"):
+                kept.append(chunk)
+                continue
+            payload = chunk.get("data", b"")
+            if isinstance(payload, str):
+                payload = base64.b64decode(payload)
+            connection.audio_chunks_in += 1
+            self.metrics["audio_chunks_in"] += 1
+
+            if vad is not None:
+                suppressed = vad.suppressed_ms
+                payload = vad.process(payload, pcm_rate(mime_type))
+                self.metrics["vad_suppressed_ms"] += (vad.suppressed_ms
+                                                      - suppressed)
+                if not payload:
+                    continue
+            if aggregator is None:
+                frames.append({"mime_type": mime_type, "data": payload})
+            else:
+                frames.extend(aggregator.add(mime_type, payload))
+        self.media_time["audio"].observe(time.monotonic() - start)
+        if aggregator is None:
+            data["realtime_input"]["media_chunks"] = kept
+            for frame in frames:
+                await self.emit_audio(connection, outbox, frame)
+            return
+        if kept:
+            # Keep buffered audio ahead of the other media in this message.
+            frames.extend(aggregator.take())
+        data["realtime_input"]["media_chunks"] = kept
+
+        if frames:
+            aggregator.cancel_flush()
+            for frame in frames:
+                await self.emit_audio(connection, outbox, frame)
+        if aggregator.buffer and aggregator.flush_handle is None:
+            aggregator.flush_handle = asyncio.get_running_loop().call_later(
+                aggregator.deadline, self.schedule_audio_flush, connection,
+                outbox)
+
+    def schedule_audio_flush(self, connection: ConnectionInfo,
+                             outbox: "ForwardQueue") -> None:
+        connection.audio.flush_handle = None
+        connection.audio.flush_task = asyncio.create_task(
+            self.flush_audio(connection, outbox, timed_out=True))
+
+    async def flush_audio(self, connection: Optional[ConnectionInfo],
+                          outbox: "ForwardQueue",
+                          timed_out: bool = False) -> None:
+        """Forwards any partially filled audio frame.
+
+        A frame flushed by the deadline timer is stamped with the flush
+        time, not with whatever frame the reader last read.
+        """
+        if connection is None or connection.audio is None:
+            return
+        connection.audio.cancel_flush()
+        received_at = time.monotonic() if timed_out else None
+        try:
+            for frame in connection.audio.take():
+                await self.emit_audio(connection, outbox, frame, received_at)
+        except GeminiConnectionError as e:
+            logger.debug("Dropped buffered audio: %s", e)
+        finally:
+            if connection.audio.flush_task is asyncio.current_task():
+                connection.audio.flush_task = None
+
+    async def emit_audio(self, connection: ConnectionInfo,
+                         outbox: "ForwardQueue",
+                         frame: Dict[str, Any],
+                         received_at: Optional[float] = None) -> None:
+        await self.throttle(connection, "realtime_input")
+        await outbox.send(build_realtime_input([frame]), received_at)
+        connection.audio_frames_out += 1
+        self.metrics["audio_frames_out"] += 1
+
+    async def filter_media_chunks(
+        self, data: Dict[str, Any], connection: Optional[ConnectionInfo]
+    ) -> bool:
+        """Drops redundant media chunks from a realtime_input message.
+
+        Returns False when nothing is left to forward.
+        """
+        if connection is None:
+            return True
+        chunks = data["realtime_input"]["media_chunks"]
+        kept = []
+        for chunk in chunks:
+            mime_type = str(chunk.get("mime_type", ""))
+            if (self.video_dedup_enabled and mime_type.startswith("image/")
+                    and not await self.is_new_frame(connection,
+                                                    chunk.get("data", ""))):
+                continue
+            kept.append(chunk)
+
+        if len(kept) != len(chunks):
+            data["realtime_input"]["media_chunks"] = kept
+        return bool(kept)
+
+    async def is_new_frame(self, connection: ConnectionInfo,
+                           frame: Union[str, bytes]) -> bool:
+        """Compares a video frame with the last one forwarded upstream."""
+        now = time.monotonic()
+        try:
+            frame_hash = await MediaProcessor.get_image_pipeline().fingerprint(
+                frame)
+        except Exception as e:
+            logger.debug("Could not fingerprint frame: %s", e)
+            return True
+        self.media_time["video"].observe(time.monotonic() - now)
+
+        previous = connection.frame_hash
+        since_forwarded = now - connection.frame_forwarded_at
+        if (previous is not None
+                and (frame_hash ^ previous).bit_count()
+                <= VIDEO_DEDUP_THRESHOLD
+                and since_forwarded < VIDEO_KEYFRAME_INTERVAL):
+            self.metrics["video_frames_dropped"] += 1
+            return False
+
+        connection.frame_hash = frame_hash
+        connection.frame_forwarded_at = now
+        self.metrics["video_frames_forwarded"] += 1
+        return True
+
+    def translate_binary_frame(
+        self, message: bytes, connection: ConnectionInfo
+    ) -> Dict[str, Any]:
+        """Turns a client binary media frame into a realtime_input message.
+
+        The chunk keeps its raw bytes; they are only base64 encoded when the
+        upstream message is built.
+        """
+        frame = decode_binary_frame(message)
+        self.metrics["binary_frames"] += 1
+        if (connection.binary_sequence >= 0
+                and frame.sequence != connection.binary_sequence + 1):
+            self.metrics["binary_sequence_gaps"] += 1
+        connection.binary_sequence = frame.sequence
+
+        return {"realtime_input": {"media_chunks": [
+            {"mime_type": frame.mime_type, "data": frame.payload}]}}
+
+    async def forward_raw(
+        self,
+        message: Union[str, bytes],
+        destination: "ForwardQueue",
+        is_client_to_server: bool,
+    ) -> None:
+        """Forwards a frame without decoding it.
+
+        Upstream may deliver JSON in binary frames; the browser clients only
+        handle text frames, so those are UTF-8 decoded (no JSON parse) on the
+        way down.
+        """
+        if not is_client_to_server and isinstance(message, bytes):
+            message = message.decode("utf-8")
+        await destination.send(message)
+        self.metrics["total_messages_processed"] += 1
+        self.metrics["passthrough_messages"] += 1
+
+    async def drain_queue(self, outbox: "ForwardQueue",
+                          destination: WebSocketCommonProtocol,
+                          connection: Optional[ConnectionInfo] = None
+                          ) -> None:
+        """Writer task: sends queued messages until the queue is finished."""
+        try:
+            while True:
+                message_class, message, received_at = await outbox.get()
+                if message is None:
+                    return
+                if outbox.pacer is not None and message_class == "audio":
+                    await outbox.pacer.pace(message)
+                await destination.send(message)
+                now = time.monotonic()
+                if outbox.latency is not None:
+                    outbox.latency.observe(now - received_at)
+                if connection is not None:
+                    if connection.trace is not None:
+                        connection.trace.span(message_class, outbox.direction,
+                                              received_at, now,
+                                              size=len(message))
+                    self.track_turn(connection, outbox, message_class,
+                                    message, received_at, now)
+        except Exception as e:
+            logger.info(f"Forwarding stopped: {e}")
+        finally:
+            outbox.closed = True
+            outbox.writable.set()
+
+    def track_turn(self, connection: ConnectionInfo, outbox: "ForwardQueue",
+                   message_class: str, message: Union[str, bytes],
+                   received_at: float, now: float) -> None:
+        """Correlates client turns with the model's reply.
+
+        A turn starts with the first client frame forwarded while the model
+        is idle, is answered by the first modelTurn chunk and ends on
+        turnComplete or interrupted. Observes the time to first model audio
+        and, for sampled sessions, adds the turn's phases to the trace.
+        """
+        if outbox.direction == "upstream":
+            connection.last_client_input = now
+            if not (connection.model_responding
+                    or connection.awaiting_response):
+                connection.turn_started_at = now
+                connection.awaiting_response = True
+                connection.awaiting_audio = True
+            return
+
+        trace = connection.trace
+        if message_class == "audio" and connection.awaiting_audio:
+            connection.awaiting_audio = False
+            self.first_audio_time.observe(now - connection.last_client_input)
+        if connection.awaiting_response:
+            head = message[:PEEK_WINDOW]
+            if isinstance(head, bytes):
+                head = head.decode("utf-8", "replace")
+            if message_class == "audio" or MODEL_TURN_MARKER in head:
+                connection.awaiting_response = False
+                connection.model_responding = True
+                connection.first_chunk_at = received_at
+                if trace is not None:
+                    trace.span("client input", "turn",
+                               connection.turn_started_at,
+                               connection.last_client_input)
+                    trace.span("model think", "turn",
+                               connection.last_client_input, received_at)
+                    trace.span("first chunk delivery", "turn",
+                               received_at, now)
+                return
+
+        if len(message) <= TURN_END_MAX_SIZE:
+            text = (message if isinstance(message, str)
+                    else message.decode("utf-8", "replace"))
+            if any(marker in text for marker in TURN_END_MARKERS):
+                if trace is not None and connection.model_responding:
+                    trace.span("model response", "turn",
+                               connection.first_chunk_at, now)
+                    trace.span("turn", "turn", connection.turn_started_at,
+                               now)
+                connection.model_responding = False
+                connection.awaiting_response = False
+                connection.awaiting_audio = False
+
+    def start_trace(self, client_id: str,
+                    started: float) -> Optional[SessionTrace]:
+        """Samples a session for tracing; keeps the latest timelines."""
+        if random.random() >= self.trace_sample_rate:
+            return None
+        trace = SessionTrace(client_id, started)
+        self.traces[client_id] = trace
+        while len(self.traces) > TRACE_KEEP_SESSIONS:
+            self.traces.popitem(last=False)
+        self.metrics["traced_sessions"] += 1
+        return trace
+
+    def start_recording(self, client_id: str, started: float,
+                        auth_data: Dict[str, Any]
+                        ) -> Optional[SessionRecorder]:
+        """Opens a recording for the session when recording is enabled."""
+        if self.record_dir is None:
+            return None
+        try:
+            directory = pathlib.Path(self.record_dir)
+            directory.mkdir(parents=True, exist_ok=True)
+            recorder = SessionRecorder(directory / f"{client_id}.finnrec",
+                                       started)
+        except OSError as e:
+            logger.error(f"Cannot record session {client_id}: {e}")
+            return None
+        # Everything the client sent at auth except its credentials.
+        auth = {key: value for key, value in auth_data.items()
+                if key != "bearer_token"}
+        recorder.meta({"client_id": client_id, "started_at": time.time(),
+                       "auth": auth}, time.monotonic())
+        return recorder
 
     async def handle_client(self, websocket: WebSocketCommonProtocol) -> None:
         """Handles a client connection."""
         client_id = str(uuid4())
         server_websocket = None
+        started = time.monotonic()
+        trace = None
+
+        if (len(self.active_connections) + self.pending_connections
+                >= self.connection_limit):
+            await self.reject(websocket, "Too many connections",
+                              "CONNECTION_LIMIT")
+            return
+        pending = True
+        self.pending_connections += 1
+        self.metrics["pending_connections"] += 1
 
         try:
             logger.info(f"New client connection: {client_id}")
@@ -488,12 +3637,14 @@ class GeminiProxy:
             # Handle authentication with longer timeout
             auth_message = await asyncio.wait_for(websocket.recv(),
                                                   timeout=15.0)
-            auth_data = json.loads(auth_message)
-            logger.debug(f"Received auth message: {auth_data}")
+            authenticated = time.monotonic()
+            auth_data = codec.loads(auth_message)
+            logger.debug("Received auth message: %s",
+                         PayloadSummary(auth_data))
 
             bearer_token = auth_data.get("bearer_token")
             if not bearer_token:
-                await websocket.send(json.dumps({
+                await websocket.send(codec.dumps({
                     "error": "Bearer token missing",
                     "code": "AUTHENTICATION_ERROR"
                 }))
@@ -507,27 +3658,107 @@ class GeminiProxy:
             #     }))
             #     return
 
+            resume = auth_data.get("resume")
+            parked = (self.claim_parked(bearer_token, resume)
+                      if isinstance(resume, dict) else None)
+            if parked is not None:
+                # The session's own handler serves this socket from now on.
+                pending = False
+                self.pending_connections -= 1
+                self.metrics["pending_connections"] -= 1
+                released = asyncio.get_running_loop().create_future()
+                received = resume.get("sequence")
+                parked.parked.set_result((
+                    websocket,
+                    received if isinstance(received, int) else 0,
+                    released))
+                await released
+                return
+
+            if not await self.admission.admit(
+                    lambda position: websocket.send(codec.dumps(
+                        {"type": "queued", "position": position}))):
+                await self.reject(websocket, "Server busy, retry later",
+                                  "SERVER_BUSY", retryable=True,
+                                  retry_after=ADMISSION_RETRY_AFTER)
+                return
+            admitted = time.monotonic()
+
             # Create server connection
             logger.info("Creating server connection...")
-            server_websocket = await self.create_server_connection(
-                bearer_token,
-                {} # config
-            )
+            connect_time = None
+            try:
+                if self.upstream_pool is not None:
+                    server_websocket = await self.upstream_pool.acquire(
+                        bearer_token,
+                        {} # config
+                    )
+                else:
+                    server_websocket = await self.create_server_connection(
+                        bearer_token,
+                        {} # config
+                    )
+                connect_time = time.monotonic() - admitted
+            except Exception:
+                self.admission.adapt(None)  # the handshake failed
+                raise
+            else:
+                self.admission.adapt(connect_time)
+            finally:
+                self.admission.release()
             logger.info("Server connection established")
+            trace = self.start_trace(client_id, started)
+            if trace is not None:
+                trace.span("auth wait", "session", started, authenticated)
+                trace.span("admission wait", "session", authenticated,
+                           admitted)
+                trace.span("upstream connect", "session", admitted,
+                           admitted + connect_time,
+                           pooled=self.upstream_pool is not None)
+
+            connection = ConnectionInfo(
+                websocket=websocket,
+                last_active=time.monotonic(),
+                client_id=client_id,
+                config=DEFAULT_CONFIG,
+                binary_media=(BINARY_MEDIA_ENABLED
+                              and bool(auth_data.get("binary_media"))),
+                audio=AudioAggregator() if AUDIO_COALESCE_ENABLED else None,
+                vad=VoiceActivityDetector.for_client(auth_data.get("vad")),
+                trace=trace,
+                recorder=self.start_recording(client_id, started, auth_data),
+                upstream=server_websocket,
+                token_digest=hashlib.sha256(
+                    bearer_token.encode("utf-8")).hexdigest(),
+            )
+            if self.resume_enabled:
+                connection.media_buffer = MediaRing(self.media_pool)
+                connection.resume = ResumeBuffer(websocket,
+                                                 connection.media_buffer)
+            pending = False
+            self.pending_connections -= 1
+            self.metrics["pending_connections"] -= 1
+            self.register(connection)
 
             # Send success response with DEFAULT_CONFIG
             success_response = {
                 "type": "connection_success",
                 "client_id": client_id,
-                "config": DEFAULT_CONFIG
+                "config": DEFAULT_CONFIG,
+                "binary_media": connection.binary_media,
             }
-            await websocket.send(json.dumps(success_response))
+            await websocket.send(codec.dumps(success_response))
 
             # Start message proxying
-            await asyncio.gather(
-                self.proxy_messages(websocket, server_websocket, True),
-                self.proxy_messages(server_websocket, websocket, False),
-            )
+            downstream = asyncio.create_task(self.proxy_messages(
+                server_websocket, connection.resume or websocket, False,
+                connection))
+            try:
+                await self.serve_client(connection, server_websocket,
+                                        downstream)
+                await downstream
+            finally:
+                downstream.cancel()
 
         except asyncio.TimeoutError as e:
             logger.error(f"Timeout error: {e}")
@@ -541,124 +3772,346 @@ class GeminiProxy:
             await self.send_error(websocket, f"Error: {e}", 1011)
         finally:
             logger.info(f"Cleaning up connection: {client_id}")
+            if pending:
+                self.pending_connections -= 1
+                self.metrics["pending_connections"] -= 1
+            if trace is not None:
+                trace.instant("closed", "session", time.monotonic())
+            connection = self.active_connections.pop(client_id, None)
+            if connection is not None:
+                self.metrics["active_connections"] -= 1
+                if connection.recorder is not None:
+                    connection.recorder.close()
+                if connection.audio is not None:
+                    connection.audio.close()
+                ring = connection.media_buffer
+                if ring is not None:
+                    ring.release()
+                    self.metrics["media_frames_evicted"] += (
+                        ring.metrics["evicted"])
+                    self.metrics["media_frames_rejected"] += (
+                        ring.metrics["rejected"])
             if server_websocket:
                 try:
                     await server_websocket.close()
                 except Exception as e:
                     logger.error(f"Error closing server websocket: {e}")
 
+    async def serve_client(self, connection: ConnectionInfo,
+                           server_websocket: WebSocketCommonProtocol,
+                           downstream: asyncio.Task) -> None:
+        """Runs the client-to-server leg, again after each resume."""
+        released = None
+        try:
+            while True:
+                await self.proxy_messages(connection.websocket,
+                                          server_websocket, True, connection)
+                if released is not None:
+                    released.set_result(None)
+                    released = None
+                if not self.resumable(connection):
+                    return
+                handoff = await self.park(connection, downstream)
+                if handoff is None:
+                    await server_websocket.close()
+                    return
+                websocket, received, released = handoff
+                await self.attach(connection, websocket, received)
+        finally:
+            if released is not None and not released.done():
+                released.set_result(None)
+
+    def resumable(self, connection: Optional[ConnectionInfo]) -> bool:
+        """Whether a session whose client left can wait for a resume."""
+        if connection is None or connection.resume is None:
+            return False
+        websocket = connection.websocket
+        # The closing handshake state: on .protocol for the asyncio API,
+        # on the connection itself for the legacy one.
+        state = getattr(websocket, "protocol", websocket)
+        return (not connection.resume.closed
+                and websocket.close_code == ABNORMAL_CLOSURE
+                and state.close_rcvd is None and state.close_sent is None)
+
+    async def park(self, connection: ConnectionInfo,
+                   downstream: asyncio.Task) -> Optional[tuple]:
+        """Waits up to the grace period for the client to resume.
+
+        Returns what ``handle_client`` hands over for the resumed client:
+        ``(websocket, frames_received, released)``, or None if the grace
+        period ran out or the upstream session ended first.
+        """
+        logger.info(f"Client dropped, holding session: {connection.client_id}")
+        waiter = asyncio.get_running_loop().create_future()
+        connection.parked = waiter
+        self.metrics["sessions_parked"] += 1
+        self.metrics["detached_connections"] += 1
+        if connection.trace is not None:
+            connection.trace.instant("detached", "session", time.monotonic())
+        try:
+            await asyncio.wait((waiter, downstream),
+                               timeout=self.resume_grace_period,
+                               return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            connection.parked = None
+            self.metrics["detached_connections"] -= 1
+        if waiter.done():
+            return waiter.result()
+        waiter.cancel()
+        if not downstream.done():
+            logger.info(f"Resume grace period over: {connection.client_id}")
+            self.metrics["sessions_expired"] += 1
+        return None
+
+    def claim_parked(self, bearer_token: str,
+                     resume: Dict[str, Any]) -> Optional[ConnectionInfo]:
+        """Finds the held session a client asks to resume, if it may."""
+        connection = self.active_connections.get(
+            str(resume.get("client_id")))
+        if (connection is None or connection.parked is None
+                or connection.parked.done()):
+            return None
+        digest = hashlib.sha256(bearer_token.encode("utf-8")).hexdigest()
+        if not hmac.compare_digest(digest, connection.token_digest):
+            return None
+        return connection
+
+    async def attach(self, connection: ConnectionInfo,
+                     websocket: WebSocketCommonProtocol,
+                     received: int) -> None:
+        """Switches a held session to the resumed client's socket."""
+        connection.websocket = websocket
+        connection.last_active = time.monotonic()
+        hello = {
+            "type": "connection_success",
+            "client_id": connection.client_id,
+            "config": DEFAULT_CONFIG,
+            "binary_media": connection.binary_media,
+            "resumed": True,
+        }
+        try:
+            replayed, missed = await connection.resume.attach(
+                websocket, received, hello)
+        except websockets.exceptions.ConnectionClosed:
+            # Gone again; the client leg ends at once and parks anew.
+            logger.info(f"Resumed client dropped: {connection.client_id}")
+            return
+        self.metrics["sessions_resumed"] += 1
+        self.metrics["resume_frames_replayed"] += replayed
+        self.metrics["resume_frames_missed"] += missed
+        if connection.trace is not None:
+            connection.trace.instant("resumed", "session", time.monotonic(),
+                                     replayed=replayed, missed=missed)
+        logger.info(f"Session resumed: {connection.client_id} "
+                    f"({replayed} frames replayed, {missed} missed)")
+
     async def send_error(
-        self, websocket: WebSocketCommonProtocol, message: str, code: int = 1008
+        self, websocket: WebSocketCommonProtocol, message: str,
+        code: int = 1008
     ) -> None:
         """Sends an error message to the client and closes the connection."""
-        error_response = {"error": {"code": "SERVER_ERROR", "message": message}}
+        error_response = {"error": {"code": "SERVER_ERROR",
+                                    "message": message}}
         try:
-            await websocket.send(json.dumps(error_response))
+            await websocket.send(codec.dumps(error_response))
             await websocket.close(code, message)
         except Exception as e:
             logger.error(f"Error sending error message: {e}")
 
-    async def cleanup_connections(self):
-        """Cleanup stale connections periodically."""
-        while True:
-            try:
-                current_time = time.time()
-                stale_connections = [
-                    conn_id
-                    for conn_id, conn_info in self.active_connections.items()
-                    if current_time - conn_info.last_active > 300
-                ]
-
-                for conn_id in stale_connections:
-                    conn_info = self.active_connections[conn_id]
-                    await conn_info.websocket.close()
-                    del self.active_connections[conn_id]
-                    self.metrics["active_connections"] -= 1
-                    logger.info(f"Cleaned up stale connection: {conn_id}")
+    async def reject(self, websocket: WebSocketCommonProtocol, message: str,
+                     code: str, **details: Any) -> None:
+        """Turns a client away before any upstream work is done."""
+        self.metrics["sessions_rejected"] += 1
+        try:
+            await websocket.send(codec.dumps({"error": message, "code": code,
+                                              **details}))
+            await websocket.close(1013, message)  # try again later
+        except Exception as e:
+            logger.debug("Error rejecting client: %s", e)
 
-            except Exception as e:
-                logger.error(f"Error in cleanup: {e}")
-            await sleep(60)
+    def register(self, connection: ConnectionInfo) -> None:
+        """Adds a live session and arms its idle deadline."""
+        self.active_connections[connection.client_id] = connection
+        self.metrics["active_connections"] += 1
+        heapq.heappush(self.idle_deadlines,
+                       (connection.last_active + self.idle_timeout,
+                        connection.client_id))
+        self.idle_wakeup.set()
+        if self.reaper is None or self.reaper.done():
+            self.reaper = asyncio.create_task(self.reap_idle_sessions())
+
+    async def reap_idle_sessions(self) -> None:
+        """Closes sessions idle for ``idle_timeout``, soonest first.
 
-    async def start_metrics_reporter(self):
-        """Reports metrics periodically."""
+        A heap entry is only a lower bound on when its session can expire:
+        when it comes due the session's ``last_active`` is checked and the
+        entry re-armed if there was activity since. New entries are never
+        due earlier than the heap's head, so sleeping until the head is due
+        cannot miss one.
+        """
         while True:
-            logger.info(f"Metrics: {self.metrics}")
-            await sleep(300)
+            if not self.idle_deadlines:
+                self.idle_wakeup.clear()
+                await self.idle_wakeup.wait()
+                continue
+            deadline, client_id = self.idle_deadlines[0]
+            now = time.monotonic()
+            if deadline > now:
+                await sleep(deadline - now)
+                continue
+            heapq.heappop(self.idle_deadlines)
+            connection = self.active_connections.get(client_id)
+            if connection is None:
+                continue
+            idle_until = connection.last_active + self.idle_timeout
+            if idle_until > now:
+                heapq.heappush(self.idle_deadlines, (idle_until, client_id))
+                continue
+            logger.info(f"Closing idle session: {client_id}")
+            self.metrics["sessions_reaped"] += 1
+            for websocket in (connection.websocket, connection.upstream):
+                if websocket is None:
+                    continue
+                try:
+                    await websocket.close(1000, "Idle timeout")
+                except Exception as e:
+                    logger.debug("Error closing idle session: %s", e)
+
+    def render_metrics(self) -> str:
+        """Renders counters, gauges and histograms for ``/metrics``."""
+        lines = []
+        for name, value in self.metrics.items():
+            if name in self.gauges:
+                lines += metric_lines(f"finn_{name}", "gauge",
+                                      self.gauges[name], {(): value})
+                continue
+            name = name.removeprefix("total_")
+            lines += metric_lines(f"finn_{name}_total", "counter",
+                                  name.replace("_", " ").capitalize() + ".",
+                                  {(): value})
+        depths = {}
+        for direction in ("upstream", "downstream"):
+            depths[(("direction", direction),)] = sum(
+                conn.queues[direction].depth()
+                for conn in self.active_connections.values()
+                if direction in conn.queues)
+        lines += metric_lines("finn_queue_depth", "gauge",
+                              "Messages queued across all connections.",
+                              depths)
+        if self.upstream_pool is not None:
+            pool_metrics = self.upstream_pool.pool_metrics()
+            for name, value in self.upstream_pool.metrics.items():
+                lines += metric_lines(f"finn_upstream_pool_{name}_total",
+                                      "counter",
+                                      "Upstream pool "
+                                      + name.replace("_", " ") + ".",
+                                      {(): value})
+            lines += metric_lines("finn_upstream_pool_hit_rate", "gauge",
+                                  "Share of acquires served warm.",
+                                  {(): pool_metrics["hit_rate"]})
+            lines += metric_lines("finn_upstream_pool_idle", "gauge",
+                                  "Warm upstream sessions.",
+                                  {(): pool_metrics["idle"]})
+        lines += self.client_metric_lines()
+        admission = self.admission
+        for name, value in admission.metrics.items():
+            lines += metric_lines(f"finn_admission_{name}_total", "counter",
+                                  "Clients " + name.replace("_", " ")
+                                  + " by admission control.", {(): value})
+        lines += metric_lines("finn_admission_limit", "gauge",
+                              "Concurrent upstream handshakes allowed.",
+                              {(): int(admission.limit)})
+        lines += metric_lines("finn_admission_in_flight", "gauge",
+                              "Upstream handshakes in progress.",
+                              {(): admission.in_flight})
+        lines += metric_lines("finn_admission_waiting", "gauge",
+                              "Clients queued for a handshake slot.",
+                              {(): len(admission.waiters)})
+        pool = self.media_pool
+        lines += metric_lines("finn_media_pool_allocated_bytes", "gauge",
+                              "Bytes of media ring slabs allocated.",
+                              {(): pool.allocated * pool.slab_size})
+        lines += metric_lines("finn_media_pool_in_use_bytes", "gauge",
+                              "Bytes of media ring slabs held by sessions.",
+                              {(): pool.in_use()})
+        lines += self.registry.render()
+        return "\n".join(lines) + "\n"
 
 
 class WebServer:
-    def __init__(self, static_dir: str = "static"):
+    def __init__(self, static_dir: str = "static",
+                 proxy: Optional[GeminiProxy] = None):
         self.static_dir = pathlib.Path(static_dir)
+        self.static = StaticFileHandler(static_dir)
+        self.proxy = proxy
+        # Set in supervised workers: /metrics redirects to the supervisor.
+        self.metrics_port: Optional[int] = None
         self.app = web.Application()
         self.setup_routes()
 
     def setup_routes(self):
         # Serve static files from /static directory
-        self.app.router.add_static("/static", self.static_dir)
+        self.app.router.add_get("/static/{filename:.+}", self.handle_static)
         # Serve favicon.ico
         self.app.router.add_get("/favicon.ico", self.handle_favicon)
         # Serve index.html at root
         self.app.router.add_get("/", self.handle_index)
+        # Prometheus metrics and sampled session traces of the proxy
+        self.app.router.add_get("/metrics", self.handle_metrics)
+        self.app.router.add_get("/traces", self.handle_traces)
+        self.app.router.add_get("/traces/{client_id}", self.handle_trace)
         # Handle other static files
         self.app.router.add_get("/{filename}", self.handle_static)
 
     async def handle_favicon(self, request):
-        try:
-            favicon_path = self.static_dir / "favicon.ico"
-            if not favicon_path.exists():
-                raise web.HTTPNotFound()
-            
-            return web.FileResponse(
-                favicon_path,
-                headers={"Content-Type": "image/x-icon"}
-            )
-        except Exception as e:
-            logger.error(f"Error serving favicon: {e}")
-            raise web.HTTPInternalServerError()
+        return await self.handle_static(request, "favicon.ico")
 
-    async def handle_index(self, request):
-        try:
-            index_path = self.static_dir / "index.html"
-            if not index_path.exists():
-                raise web.HTTPNotFound()
-            
-            return web.FileResponse(
-                index_path, 
-                headers={"Content-Type": "text/html"}
-            )
-        except Exception as e:
-            logger.error(f"Error serving index file: {e}")
-            raise web.HTTPInternalServerError()
+    def render_metrics(self) -> str:
+        return (self.proxy.render_metrics()
+                + "\n".join(self.static.render_metrics()) + "\n")
 
-    async def handle_static(self, request, filename=None):
-        if filename is None:
-            filename = request.match_info["filename"]
+    async def handle_metrics(self, request):
+        if self.proxy is None:
+            raise web.HTTPNotFound()
+        if self.metrics_port is not None:
+            raise web.HTTPTemporaryRedirect(
+                request.url.with_port(self.metrics_port))
+        return web.Response(
+            text=self.render_metrics(),
+            headers={"Content-Type": "text/plain; version=0.0.4"})
 
-        try:
-            file_path = self.static_dir / filename
-            
-            # Security check for path traversal
-            if not str(file_path.resolve()).startswith(
-                    str(self.static_dir.resolve())):
-                raise web.HTTPForbidden()
+    async def handle_traces(self, request):
+        if self.proxy is None:
+            raise web.HTTPNotFound()
+        return web.json_response([
+            {"client_id": client_id,
+             "events": len(trace.events),
+             "active": client_id in self.proxy.active_connections}
+            for client_id, trace in self.proxy.traces.items()
+        ])
 
-            if not file_path.exists():
-                raise web.HTTPNotFound()
+    async def handle_trace(self, request):
+        trace = (self.proxy.traces.get(request.match_info["client_id"])
+                 if self.proxy is not None else None)
+        if trace is None:
+            raise web.HTTPNotFound()
+        if request.query.get("format") == "jsonl":
+            return web.Response(text=trace.json_lines(),
+                                content_type="application/x-ndjson")
+        return web.json_response(trace.chrome_trace())
 
-            content_type, _ = mimetypes.guess_type(str(file_path))
-            if not content_type:
-                content_type = "application/octet-stream"
+    async def handle_index(self, request):
+        return await self.handle_static(request, "index.html")
 
-            return web.FileResponse(
-                file_path, 
-                headers={"Content-Type": content_type}
-            )
-        except web.HTTPError:
-            raise
-        except Exception as e:
-            logger.error(f"Error serving static file: {e}")
-            raise web.HTTPInternalServerError()
+    async def handle_static(self, request, filename=None):
+        if filename is None:
+            filename = request.match_info["filename"]
+        status, headers, body = await self.static.handle_request(
+            filename, request.headers)
+        if isinstance(body, pathlib.Path):
+            # Too large to cache: sendfile straight from disk.
+            return web.FileResponse(body, headers=headers)
+        return web.Response(status=status, headers=headers, body=body)
 
 
 class WebSocketServer:
@@ -678,33 +4131,158 @@ class WebSocketServer:
                 logger.error(f"Error closing websocket: {e}")
 
 
-async def main():
+async def push_worker_metrics(render: Callable[[], str], worker_id: int,
+                              metrics_queue) -> None:
+    """Periodically sends this worker's /metrics text to the supervisor."""
+    while True:
+        try:
+            # Never blocks the loop; a missed push is replaced by the next.
+            metrics_queue.put_nowait(("metrics", worker_id, os.getpid(),
+                                      render()))
+        except queue.Full:
+            logger.debug("Supervisor metrics queue full")
+        await sleep(WORKER_METRICS_INTERVAL)
+
+
+def parse_exposition(text: str):
+    """Families and samples of Prometheus text from ``render_metrics``.
+
+    Returns ``{family: (help, type)}`` and ``{family: {series: value}}``,
+    where a series is the sample line without its value.
+    """
+    families: Dict[str, tuple] = {}
+    samples: Dict[str, Dict[str, float]] = {}
+    family, help_text = "", ""
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            family, _, help_text = line[7:].partition(" ")
+        elif line.startswith("# TYPE "):
+            family, _, kind = line[7:].partition(" ")
+            families[family] = (help_text, kind)
+            samples.setdefault(family, {})
+        elif line and family:
+            series, _, value = line.rpartition(" ")
+            samples[family][series] = float(value)
+    return families, samples
+
+
+class MetricsAggregator:
+    """Sums the /metrics expositions of supervised workers."""
+
+    def __init__(self):
+        self.families: Dict[str, tuple] = {}
+        self.live: Dict[int, Dict[str, Dict[str, float]]] = {}  # by pid
+        self.retired_pids: set = set()
+        self.retired: Dict[str, Dict[str, float]] = {}
+
+    def update(self, pid: int, text: str) -> None:
+        if pid in self.retired_pids:
+            return
+        families, samples = parse_exposition(text)
+        self.families.update(families)
+        self.live[pid] = samples
+
+    def retire(self, pid: int) -> None:
+        """Keeps an exited worker's counter totals; drops its gauges."""
+        self.retired_pids.add(pid)
+        for family, series in self.live.pop(pid, {}).items():
+            if self.families[family][1] == "gauge":
+                continue
+            totals = self.retired.setdefault(family, {})
+            for name, value in series.items():
+                totals[name] = totals.get(name, 0.0) + value
+
+    def render(self) -> str:
+        lines = []
+        for family, (help_text, kind) in self.families.items():
+            totals: Dict[str, float] = {}
+            counts: Dict[str, int] = {}
+            if kind != "gauge":
+                totals.update(self.retired.get(family, {}))
+            for samples in self.live.values():
+                for name, value in samples.get(family, {}).items():
+                    totals[name] = totals.get(name, 0.0) + value
+                    counts[name] = counts.get(name, 0) + 1
+            if family in AVERAGED_GAUGES:
+                totals = {name: value / counts[name]
+                          for name, value in totals.items()}
+            lines.append(f"# HELP {family} {help_text}")
+            lines.append(f"# TYPE {family} {kind}")
+            for name, value in totals.items():
+                text = int(value) if value.is_integer() else repr(value)
+                lines.append(f"{name} {text}")
+        lines += metric_lines("finn_workers", "gauge",
+                              "Workers reporting metrics.",
+                              {(): len(self.live)})
+        return "\n".join(lines) + "\n"
+
+
+async def drain(server, proxy: GeminiProxy, timeout: float) -> None:
+    """Stops accepting clients and waits for active sessions to finish."""
+    try:
+        server.close(close_connections=False)
+    except TypeError:  # legacy server API always closes connections
+        server.close()
+    deadline = time.monotonic() + timeout
+    while proxy.active_connections and time.monotonic() < deadline:
+        await sleep(0.5)
+
+
+async def main(worker_id: Optional[int] = None, metrics_queue=None):
     # Initialize servers
-    http_server = WebServer()
     ws_server = WebSocketServer()
+    http_server = WebServer(proxy=ws_server.proxy)
+    reuse_port = worker_id is not None
+    if reuse_port:
+        http_server.metrics_port = METRICS_PORT
+    reporter: Optional[asyncio.Task] = None
+    stop = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
 
     try:
         # Start HTTP server
         runner = web.AppRunner(http_server.app)
         await runner.setup()
-        http_site = web.TCPSite(runner, "localhost", 8082)
+        http_site = web.TCPSite(runner, "localhost", HTTP_PORT,
+                                reuse_port=reuse_port)
         await http_site.start()
-        logger.info("HTTP server running on http://localhost:8082")
+        logger.info(f"HTTP server running on http://localhost:{HTTP_PORT}")
 
         # Start WebSocket server
         server = await websockets.serve(
             ws_server.handle_client,
             "localhost",
-            8080,
+            WS_PORT,
+            reuse_port=reuse_port,
+            **compression_options("client", server=True),
         )
-        logger.info("WebSocket server running on ws://localhost:8080")
+        logger.info(f"WebSocket server running on ws://localhost:{WS_PORT}"
+                    f" (JSON backend: {codec.BACKEND})")
 
-        # Keep the server running
-        await asyncio.Future()
+        if metrics_queue is not None:
+            metrics_queue.put_nowait(("ready", worker_id, os.getpid(), None))
+            reporter = asyncio.create_task(push_worker_metrics(
+                http_server.render_metrics, worker_id, metrics_queue))
+
+        # Keep the server running until asked to stop
+        await stop.wait()
+        logger.info("Shutting down, draining active sessions...")
+        await drain(server, ws_server.proxy, WORKER_DRAIN_TIMEOUT)
 
     except Exception as e:
         logger.error(f"Server error: {e}")
     finally:
+        if reporter is not None:
+            reporter.cancel()
+            try:
+                metrics_queue.put_nowait(("metrics", worker_id, os.getpid(),
+                                          http_server.render_metrics()))
+            except queue.Full:
+                pass
+        MediaProcessor.shutdown()
+        SessionRecorder.shutdown()
+        if ws_server.proxy.upstream_pool is not None:
+            await ws_server.proxy.upstream_pool.close()
         try:
             await runner.cleanup()
             if 'server' in locals():
@@ -714,10 +4292,186 @@ async def main():
             logger.error(f"Cleanup error: {e}")
 
 
+def run_worker(worker_id: int, metrics_queue) -> None:
+    """Entry point of a supervised worker process."""
+    # Ctrl-C reaches the whole process group; let the supervisor decide.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    listener = setup_logging()
+    try:
+        asyncio.run(main(worker_id, metrics_queue))
+    except Exception as e:
+        logger.error(f"Worker {worker_id} error: {e}")
+    finally:
+        listener.stop()
+
+
+class Supervisor:
+    """Runs and restarts SO_REUSEPORT worker processes.
+
+    Workers report readiness and periodic metrics over a shared queue; the
+    supervisor sums the latest exposition of each worker.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.context = multiprocessing.get_context("fork")
+        self.metrics_queue = self.context.Queue()
+        self.processes: Dict[int, multiprocessing.Process] = {}
+        self.metrics = MetricsAggregator()
+        self.metrics_lock = threading.Lock()
+        self.ready: set = set()
+        self.running = True
+        self.restart_requested = False
+
+    def start_worker(self, worker_id: int) -> multiprocessing.Process:
+        process = self.context.Process(
+            target=run_worker, args=(worker_id, self.metrics_queue),
+            name=f"finn-worker-{worker_id}", daemon=False)
+        process.start()
+        logger.info(f"Started worker {worker_id} (pid {process.pid})")
+        return process
+
+    def stop_worker(self, process: multiprocessing.Process) -> None:
+        if process.is_alive():
+            process.terminate()  # SIGTERM: drain then exit
+        process.join(WORKER_DRAIN_TIMEOUT + 5)
+        if process.is_alive():
+            logger.warning(f"Killing unresponsive worker pid {process.pid}")
+            process.kill()
+            process.join()
+
+    def collect(self, timeout: float) -> None:
+        """Handles queued worker messages for up to ``timeout`` seconds."""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                kind, worker_id, pid, payload = self.metrics_queue.get(
+                    timeout=remaining)
+            except Exception:
+                return
+            if kind == "ready":
+                self.ready.add(pid)
+            elif kind == "metrics":
+                with self.metrics_lock:
+                    self.metrics.update(pid, payload)
+
+    def serve_metrics(self) -> ThreadingHTTPServer:
+        """Serves the summed worker metrics on METRICS_PORT."""
+        supervisor = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(HTTPStatus.NOT_FOUND)
+                    return
+                with supervisor.metrics_lock:
+                    body = supervisor.metrics.render().encode("utf-8")
+                self.send_response(HTTPStatus.OK)
+                self.send_header("Content-Type",
+                                 "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug("Metrics scrape: " + format % args)
+
+        server = ThreadingHTTPServer(("localhost", METRICS_PORT),
+                                     MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True,
+                         name="finn-metrics").start()
+        logger.info(f"Worker metrics on http://localhost:{METRICS_PORT}"
+                    f"/metrics")
+        return server
+
+    def rolling_restart(self) -> None:
+        """Replaces workers one at a time so a port is always served."""
+        logger.info("Rolling restart of workers")
+        for worker_id, old in list(self.processes.items()):
+            new = self.start_worker(worker_id)
+            deadline = time.monotonic() + WORKER_READY_TIMEOUT
+            while new.pid not in self.ready and time.monotonic() < deadline:
+                self.collect(0.5)
+            self.processes[worker_id] = new
+            self.stop_worker(old)
+            self.collect(0.5)  # its last push, sent after draining
+            with self.metrics_lock:
+                self.metrics.retire(old.pid)
+
+    def run(self) -> None:
+        def request_stop(signum, frame):
+            self.running = False
+
+        def request_restart(signum, frame):
+            self.restart_requested = True
+
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+        signal.signal(signal.SIGHUP, request_restart)
+
+        metrics_server = self.serve_metrics()
+        for worker_id in range(self.workers):
+            self.processes[worker_id] = self.start_worker(worker_id)
+
+        while self.running:
+            self.collect(1.0)
+            for worker_id, process in list(self.processes.items()):
+                if self.running and not process.is_alive():
+                    logger.warning(f"Worker {worker_id} exited with code "
+                                   f"{process.exitcode}; restarting")
+                    with self.metrics_lock:
+                        self.metrics.retire(process.pid)
+                    time.sleep(1.0)
+                    self.processes[worker_id] = self.start_worker(worker_id)
+            if self.restart_requested:
+                self.restart_requested = False
+                self.rolling_restart()
+
+        logger.info("Stopping workers...")
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in self.processes.values():
+            self.stop_worker(process)
+        metrics_server.shutdown()
+        metrics_server.server_close()
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gemini Live proxy server")
+    parser.add_argument("--workers", type=int, default=WORKER_COUNT,
+                        help="number of SO_REUSEPORT worker processes")
+    parser.add_argument("--service-url", default=SERVICE_URL,
+                        help="upstream endpoint, e.g. a local mock_gemini.py")
+    parser.add_argument("--ws-port", type=int, default=WS_PORT)
+    parser.add_argument("--http-port", type=int, default=HTTP_PORT)
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help="supervisor's summed /metrics, with --workers")
+    parser.add_argument("--record-dir", default=RECORD_DIR,
+                        help="record every session's frames here")
+    parser.add_argument("--json-backend", choices=codec.BACKENDS,
+                        default=codec.BACKEND,
+                        help="JSON library (default: fastest installed)")
+    args = parser.parse_args()
+    codec.use_backend(args.json_backend)
+    RECORD_DIR = args.record_dir
+    SERVICE_URL = args.service_url
+    WS_PORT = args.ws_port
+    HTTP_PORT = args.http_port
+    METRICS_PORT = args.metrics_port
+    listener = setup_logging()
     try:
-        asyncio.run(main())
+        if args.workers > 1:
+            Supervisor(args.workers).run()
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Server stopped by user")
     except Exception as e:
         logger.error(f"Server error: {e}")
+    finally:
+        listener.stop()
@@ -0,0 +1,234 @@
+"""Local stand-in for the Gemini Live BidiGenerateContent endpoint.
+
+Usage:
+    python mock_gemini.py --port 9000
+    python main.py --service-url ws://localhost:9000
+
+Accepts the setup message, replies with the ack ``create_server_connection``
+expects, then answers every user turn with ``serverContent`` audio chunks
+streamed at playback pace (or ``--pace`` times faster) and a final
+``turnComplete``. A turn ends with a ``client_content`` message marked
+``turn_complete``, or once ``--end-of-turn-ms`` has passed without client
+audio other than digital silence. The reply is a synthetic tone, or a
+recorded raw PCM file (16-bit mono, 24 kHz) given with ``--audio``.
+
+PCM chunks that start with a timestamp stamp (see ``stamp_pcm``) carry the
+sender's ``time.perf_counter()``; the mock records how long stamped client
+chunks took to arrive and stamps its own chunks, which is how loadtest.py
+measures latency through the proxy in both directions.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import math
+import struct
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import websockets
+from websockets.exceptions import ConnectionClosed
+
+logger = logging.getLogger("mock_gemini")
+
+MODEL_RATE = 24000
+MODEL_MIME_TYPE = f"audio/pcm;rate={MODEL_RATE}"
+TIMESTAMP = struct.Struct("!4sd")  # magic, sender's time.perf_counter()
+TIMESTAMP_MAGIC = b"FINN"
+
+
+def stamp_pcm(pcm: bytes, sent_at: float) -> bytes:
+    """Overwrites the start of a PCM chunk with its send time."""
+    return TIMESTAMP.pack(TIMESTAMP_MAGIC, sent_at) + pcm[TIMESTAMP.size:]
+
+
+def read_stamps(pcm: bytes) -> List[float]:
+    """Send times of the stamped chunks in a (possibly coalesced) frame."""
+    stamps = []
+    offset = pcm.find(TIMESTAMP_MAGIC)
+    while 0 <= offset <= len(pcm) - TIMESTAMP.size:
+        stamps.append(TIMESTAMP.unpack_from(pcm, offset)[1])
+        offset = pcm.find(TIMESTAMP_MAGIC, offset + TIMESTAMP.size)
+    return stamps
+
+
+def tone(rate: int, seconds: float = 1.0, frequency: float = 220.0,
+         amplitude: float = 0.3) -> bytes:
+    """16-bit mono sine; a whole number of cycles per second loops cleanly."""
+    samples = int(rate * seconds)
+    peak = amplitude * 32767
+    return struct.pack(f"<{samples}h", *(
+        int(peak * math.sin(2 * math.pi * frequency * n / rate))
+        for n in range(samples)))
+
+
+def model_audio_message(pcm: bytes) -> str:
+    return json.dumps({"serverContent": {"modelTurn": {"parts": [{
+        "inlineData": {
+            "mimeType": MODEL_MIME_TYPE,
+            "data": base64.b64encode(pcm).decode("ascii"),
+        }
+    }]}}})
+
+
+@dataclass
+class MockConfig:
+    think_ms: float = 300.0
+    reply_ms: float = 1500.0
+    chunk_ms: float = 40.0
+    pace: float = 1.0  # multiple of real time reply audio is sent at
+    end_of_turn_ms: float = 300.0
+    audio: bytes = b""
+
+
+class MockGemini:
+    """Serves mock Live API sessions and records what it saw."""
+
+    def __init__(self, config: Optional[MockConfig] = None):
+        self.config = config or MockConfig()
+        self.chunk_bytes = int(MODEL_RATE * self.config.chunk_ms / 1000) * 2
+        audio = self.config.audio or tone(MODEL_RATE)
+        # Pad so any chunk-sized slice starting inside the audio is whole.
+        self.reply_audio = audio
+        self.looped_audio = audio * (self.chunk_bytes // len(audio) + 2)
+        self.upstream_latencies: List[float] = []
+        self.metrics = {
+            "sessions": 0,
+            "turns": 0,
+            "frames_in": 0,
+            "frames_out": 0,
+        }
+
+    async def handle(self, websocket) -> None:
+        try:
+            setup = json.loads(await websocket.recv())
+        except (ConnectionClosed, json.JSONDecodeError):
+            return
+        if "setup" not in setup:
+            await websocket.close(1008, "Expected setup message")
+            return
+        await websocket.send(json.dumps({"setupComplete": {},
+                                         "success": True}))
+        self.metrics["sessions"] += 1
+
+        state: Dict[str, Any] = {"speech_at": None, "reply": None}
+        watcher = asyncio.create_task(self.watch_turns(websocket, state))
+        try:
+            async for message in websocket:
+                self.receive(websocket, state, message)
+        except ConnectionClosed:
+            pass
+        finally:
+            watcher.cancel()
+            if state["reply"] is not None:
+                state["reply"].cancel()
+
+    def receive(self, websocket, state: Dict[str, Any], message) -> None:
+        now = time.perf_counter()
+        self.metrics["frames_in"] += 1
+        data = json.loads(message)
+        if "client_content" in data:
+            if data["client_content"].get("turn_complete"):
+                state["speech_at"] = None
+                self.start_reply(websocket, state)
+            return
+        for chunk in data.get("realtime_input", {}).get("media_chunks", []):
+            if not str(chunk.get("mime_type", "")).startswith("audio/"):
+                continue
+            pcm = base64.b64decode(chunk.get("data", ""))
+            for sent_at in read_stamps(pcm):
+                self.upstream_latencies.append(now - sent_at)
+            if pcm.strip(b"\0"):
+                state["speech_at"] = now
+
+    async def watch_turns(self, websocket, state: Dict[str, Any]) -> None:
+        """Ends the user's turn once their audio has gone quiet."""
+        end_of_turn = self.config.end_of_turn_ms / 1000
+        while True:
+            await asyncio.sleep(min(0.05, end_of_turn / 2))
+            speech_at = state["speech_at"]
+            if (speech_at is not None
+                    and time.perf_counter() - speech_at >= end_of_turn):
+                state["speech_at"] = None
+                self.start_reply(websocket, state)
+
+    def start_reply(self, websocket, state: Dict[str, Any]) -> None:
+        if state["reply"] is None or state["reply"].done():
+            state["reply"] = asyncio.create_task(self.reply(websocket))
+
+    async def reply(self, websocket) -> None:
+        config = self.config
+        self.metrics["turns"] += 1
+        await asyncio.sleep(config.think_ms / 1000)
+
+        total = int(MODEL_RATE * config.reply_ms / 1000) * 2
+        interval = config.chunk_ms / 1000 / config.pace
+        start = time.perf_counter()
+        try:
+            for index, offset in enumerate(range(0, total, self.chunk_bytes)):
+                position = offset % len(self.reply_audio)
+                pcm = self.looped_audio[position:position + self.chunk_bytes]
+                await websocket.send(model_audio_message(
+                    stamp_pcm(pcm, time.perf_counter())))
+                self.metrics["frames_out"] += 1
+                delay = start + (index + 1) * interval - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await websocket.send(json.dumps(
+                {"serverContent": {"turnComplete": True}}))
+        except ConnectionClosed:
+            pass
+
+
+async def serve(host: str, port: int, mock: MockGemini):
+    return await websockets.serve(mock.handle, host, port, max_size=None)
+
+
+def add_mock_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--think-ms", type=float, default=300.0,
+                        help="delay before the model starts replying")
+    parser.add_argument("--reply-ms", type=float, default=1500.0,
+                        help="length of each spoken reply")
+    parser.add_argument("--chunk-ms", type=float, default=40.0,
+                        help="audio per serverContent message")
+    parser.add_argument("--pace", type=float, default=1.0,
+                        help="send reply audio this many times real time")
+    parser.add_argument("--end-of-turn-ms", type=float, default=300.0,
+                        help="client quiet time that ends a user turn")
+    parser.add_argument("--audio", help="raw 16-bit 24 kHz PCM to reply with")
+
+
+def mock_config(args: argparse.Namespace) -> MockConfig:
+    audio = b""
+    if args.audio:
+        with open(args.audio, "rb") as f:
+            audio = f.read()
+    return MockConfig(think_ms=args.think_ms, reply_ms=args.reply_ms,
+                      chunk_ms=args.chunk_ms, pace=args.pace,
+                      end_of_turn_ms=args.end_of_turn_ms, audio=audio)
+
+
+async def main(args: argparse.Namespace) -> None:
+    mock = MockGemini(mock_config(args))
+    server = await serve(args.host, args.port, mock)
+    logger.info(f"Mock Gemini Live server on ws://{args.host}:{args.port}")
+    try:
+        await asyncio.Future()
+    finally:
+        server.close()
+        logger.info(f"Mock metrics: {mock.metrics}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=9000)
+    add_mock_arguments(parser)
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,239 @@
+"""Replays recorded sessions (see RECORD_DIR in main.py) through the proxy.
+
+Usage:
+    python replay.py recordings/<client_id>.finnrec --info
+    python replay.py recordings/<client_id>.finnrec              # real time
+    python replay.py recordings/<client_id>.finnrec --speed 4 --copies 50
+    python replay.py recordings/<client_id>.finnrec --speed 0    # unpaced
+
+The tool plays both ends of the session: it connects to the proxy as the
+browser client and serves as the upstream the proxy connects to, sending
+each recorded frame at its original offset divided by ``--speed``. Copies
+are told apart by the bearer token the proxy forwards upstream, so any
+number of them can run at once. By default a proxy is started in a
+subprocess, as in loadtest.py; with ``--proxy`` a running one is used,
+which must have been started with ``--service-url`` pointing at
+``--upstream-port``.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple, Union
+
+import websockets
+from websockets.exceptions import ConnectionClosed
+
+from benchmark import report
+from loadtest import start_proxy
+from main import read_recording
+
+Frame = Tuple[float, Union[str, bytes]]
+
+
+@dataclass
+class Recording:
+    meta: Dict[str, Any]
+    client: List[Frame] = field(default_factory=list)
+    server: List[Frame] = field(default_factory=list)
+
+    @property
+    def duration(self) -> float:
+        return max((offset for offset, _ in self.client + self.server),
+                   default=0.0)
+
+
+@dataclass
+class Copy:
+    started: asyncio.Event = field(default_factory=asyncio.Event)
+    start: float = 0.0
+    client_sent: int = 0
+    client_received: int = 0
+    upstream_received: int = 0
+    server_sent: int = 0
+    error: str = ""
+
+
+def load(path: str) -> Recording:
+    """Reads a recording; offsets become relative to the session connect."""
+    recording, base = None, 0.0
+    for kind, offset, message in read_recording(path):
+        if kind == "meta":
+            if recording is None:
+                recording, base = Recording(meta=message), offset
+            continue
+        if recording is None:
+            recording = Recording(meta={})
+        frames = recording.client if kind == "client" else recording.server
+        frames.append((max(0.0, offset - base), message))
+    return recording or Recording(meta={})
+
+
+async def pace(copy: Copy, offset: float, speed: float) -> None:
+    delay = (copy.start + offset / speed - time.perf_counter()
+             if speed > 0 else 0.0)
+    await asyncio.sleep(max(0.0, delay))
+
+
+class Replayer:
+    def __init__(self, recording: Recording, speed: float):
+        self.recording = recording
+        self.speed = speed
+        self.copies: Dict[str, Copy] = {}
+
+    async def handle_upstream(self, websocket) -> None:
+        """Upstream end: acks setup, then plays the recorded server frames."""
+        authorization = websocket.request.headers.get("Authorization", "")
+        copy = self.copies.get(authorization.removeprefix("Bearer "))
+        try:
+            await websocket.recv()
+            await websocket.send(json.dumps({"setupComplete": {},
+                                             "success": True}))
+        except ConnectionClosed:
+            return
+        if copy is None:
+            await websocket.close(1008, "Unknown replay session")
+            return
+
+        async def count_received():
+            async for _ in websocket:
+                copy.upstream_received += 1
+
+        reader = asyncio.create_task(count_received())
+        try:
+            await copy.started.wait()
+            for offset, message in self.recording.server:
+                await pace(copy, offset, self.speed)
+                await websocket.send(message)
+                copy.server_sent += 1
+            await reader
+        except ConnectionClosed:
+            pass
+        finally:
+            reader.cancel()
+
+    async def run_client(self, url: str, token: str, drain: float) -> None:
+        """Client end: authenticates, then plays the recorded client frames."""
+        copy = self.copies[token]
+        auth = dict(self.recording.meta.get("auth", {}), bearer_token=token)
+        try:
+            async with websockets.connect(url, max_size=None) as websocket:
+                await websocket.send(json.dumps(auth))
+                reply = json.loads(await websocket.recv())
+                while reply.get("type") == "queued":  # admission control
+                    reply = json.loads(await websocket.recv())
+                if reply.get("type") != "connection_success":
+                    copy.error = str(reply.get("error", reply))
+                    return
+                copy.start = time.perf_counter()
+                copy.started.set()
+
+                async def count_received():
+                    async for _ in websocket:
+                        copy.client_received += 1
+
+                receiver = asyncio.create_task(count_received())
+                for offset, message in self.recording.client:
+                    await pace(copy, offset, self.speed)
+                    await websocket.send(message)
+                    copy.client_sent += 1
+                # Let the rest of the server's frames come through.
+                await pace(copy, self.recording.duration, self.speed)
+                deadline = time.perf_counter() + drain
+                while (copy.client_received < len(self.recording.server)
+                       and time.perf_counter() < deadline
+                       and not receiver.done()):
+                    await asyncio.sleep(0.05)
+                receiver.cancel()
+        except Exception as e:
+            copy.error = str(e) or type(e).__name__
+
+
+def info(path: str, recording: Recording) -> None:
+    sizes = Counter()
+    for kind, frames in (("client", recording.client),
+                         ("server", recording.server)):
+        sizes[kind] = sum(len(message) for _, message in frames)
+    print(json.dumps(recording.meta, indent=2))
+    report(path, [
+        {"direction": kind, "frames": len(frames),
+         "bytes": sizes[kind],
+         "binary_frames": sum(isinstance(m, bytes) for _, m in frames)}
+        for kind, frames in (("client", recording.client),
+                             ("server", recording.server))
+    ])
+    print(f"duration_s  {recording.duration:.2f}")
+
+
+async def run(args: argparse.Namespace, recording: Recording) -> None:
+    replayer = Replayer(recording, args.speed)
+    upstream = await websockets.serve(replayer.handle_upstream, "localhost",
+                                      args.upstream_port, max_size=None)
+    process = None
+    url = args.proxy
+    if url is None:
+        process = await start_proxy(f"ws://localhost:{args.upstream_port}",
+                                    args.ws_port, args.http_port,
+                                    args.proxy_log)
+        url = f"ws://localhost:{args.ws_port}"
+    try:
+        tokens = [f"replay-{index}" for index in range(args.copies)]
+        for token in tokens:
+            replayer.copies[token] = Copy()
+        started = time.perf_counter()
+        await asyncio.gather(*(replayer.run_client(url, token, args.drain)
+                               for token in tokens))
+        elapsed = time.perf_counter() - started
+    finally:
+        upstream.close()
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=60)
+
+    copies = list(replayer.copies.values())
+    errors = Counter(copy.error for copy in copies if copy.error)
+    report("replay", [
+        {"metric": "copies", "value": len(copies)},
+        {"metric": "failed", "value": sum(errors.values())},
+        {"metric": "recorded_s", "value": f"{recording.duration:.2f}"},
+        {"metric": "elapsed_s", "value": f"{elapsed:.2f}"},
+        {"metric": "client_frames_sent",
+         "value": sum(c.client_sent for c in copies)},
+        {"metric": "upstream_frames_received",
+         "value": sum(c.upstream_received for c in copies)},
+        {"metric": "server_frames_sent",
+         "value": sum(c.server_sent for c in copies)},
+        {"metric": "client_frames_received",
+         "value": sum(c.client_received for c in copies)},
+    ])
+    for error, count in errors.items():
+        print(f"{count} x {error}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recording")
+    parser.add_argument("--info", action="store_true",
+                        help="describe the recording instead of replaying")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="playback speed; 0 sends frames unpaced")
+    parser.add_argument("--copies", type=int, default=1,
+                        help="concurrent replays of the session")
+    parser.add_argument("--drain", type=float, default=5.0,
+                        help="seconds to wait for trailing server frames")
+    parser.add_argument("--proxy", help="existing proxy URL to replay into")
+    parser.add_argument("--proxy-log", help="file for the proxy's log")
+    parser.add_argument("--upstream-port", type=int, default=9100)
+    parser.add_argument("--ws-port", type=int, default=8090)
+    parser.add_argument("--http-port", type=int, default=8092)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel("WARNING")
+    recording = load(args.recording)
+    if args.info:
+        info(args.recording, recording)
+    else:
+        asyncio.run(run(args, recording))
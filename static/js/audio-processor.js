@@ -39,13 +39,7 @@ async function startAudioInput() {
                     for (let i = 0; i < e.data.length; i++) {
                         view.setInt16(i * 2, e.data[i] * 0x7fff, true);
                     }
-                    const base64 = btoa(String.fromCharCode.apply(null, new Uint8Array(buffer)));
-                    geminiClient.sendMediaMessage([{
-                        mime_type: "audio/pcm",
-                        data: base64,
-                        sample_rate: 16000,
-                        channels: 1,
-                    }]);
+                    geminiClient.sendMediaBytes(new Uint8Array(buffer), "audio/pcm");
                 }
             };
         } else {
@@ -33,6 +33,11 @@ class GeminiClient {
         this.videoCanvas = document.getElementById('video-canvas');
         this.videoContext = this.videoCanvas.getContext('2d');
         this.isCameraActive = false;
+        this.binaryMedia = false;        // Negotiated in the auth handshake
+        this.mediaSequence = 0;
+        this.clientId = null;            // Session id, for resuming
+        this.serverSequence = 0;         // Server frames received this session
+        this.resumeSession = false;      // Resume rather than start over
         
         // Initialize UI elements
         this.initializeUI();
@@ -107,9 +112,17 @@ class GeminiClient {
                     this.log('WebSocket connected');
                     clearTimeout(connectionTimeout);
                     
-                    // Send auth message
-                    this.ws.send(JSON.stringify({ bearer_token: apiKey }));
-                    this.log('Sent auth message', { bearer_token: apiKey });
+                    // Send auth message, offering binary media frames
+                    const authMessage = { bearer_token: apiKey, binary_media: true };
+                    if (this.resumeSession && this.clientId) {
+                        // Pick up the session the dropped socket was using
+                        authMessage.resume = {
+                            client_id: this.clientId,
+                            sequence: this.serverSequence
+                        };
+                    }
+                    this.ws.send(JSON.stringify(authMessage));
+                    this.log('Sent auth message', authMessage);
 
                     // Send setup message
                     const setupMessage = {
@@ -141,11 +154,29 @@ class GeminiClient {
                             this.updateStatus("Connected");
                             this.startPingInterval();
                             this.defaultConfig = data.config;
+                            this.binaryMedia = !!data.binary_media;
+                            if (!data.resumed) {
+                                this.mediaSequence = 0;
+                            }
+                            this.clientId = data.client_id;
+                            this.serverSequence = data.resumed ? data.sequence : 0;
+                            this.resumeSession = false;
+                            this.lastConfig = { apiKey, modelId, temperature };
                             this.log('Received config', this.defaultConfig);
                             resolve();
+                        } else if (data.type === "queued") {
+                            // Admission control: wait for an upstream slot
+                            this.updateStatus(`Queued (position ${data.position})...`);
                         } else if (data.error) {
+                            if (data.retryable) {
+                                this.retryLater(data.retry_after, apiKey, modelId, temperature);
+                            }
                             reject(new Error(data.error));
                             this.disconnect();
+                        } else if (this.isConnected) {
+                            // Model output; the count lets a reconnect resume
+                            this.serverSequence++;
+                            this.handleServerMessage(data);
                         }
                     } catch (error) {
                         reject(error);
@@ -306,6 +337,7 @@ class GeminiClient {
             this.reconnectAttempts++;
             const delay = this.reconnectDelay * Math.pow(2, this.reconnectAttempts - 1); // Exponential backoff
             this.updateStatus(`Reconnecting (attempt ${this.reconnectAttempts})...`);
+            this.resumeSession = true;
             
             setTimeout(() => {
                 if (this.lastConfig) {
@@ -321,6 +353,24 @@ class GeminiClient {
         }
     }
 
+    retryLater(retryAfter, apiKey, modelId, temperature) {
+        // The server shed this connection; back off before trying again
+        if (this.reconnectAttempts >= this.maxReconnectAttempts) {
+            return;
+        }
+        this.reconnectAttempts++;
+        const base = retryAfter ? retryAfter * 1000 : this.reconnectDelay;
+        const delay = base * (1 + Math.random() / 2);  // Spread out retries
+        this.log(`Server busy, retrying in ${Math.round(delay)}ms`);
+
+        setTimeout(() => {
+            this.updateStatus(`Retrying (attempt ${this.reconnectAttempts})...`);
+            this.connect(apiKey, modelId, temperature).catch(error => {
+                this.handleError("Reconnection failed", error);
+            });
+        }, delay);
+    }
+
     setupWebSocketHandlers(apiKey, modelId, temperature) {
         this.ws.onopen = () => {
             this.isConnected = true;
@@ -427,6 +477,53 @@ class GeminiClient {
         this.sendMessage(message);
     }
 
+    // Sends raw media bytes. With binary media negotiated this is a single
+    // binary frame: version u8, kind u8, sequence u32, timestamp_ms f64,
+    // mime_len u8, MIME type, payload (big-endian). Otherwise it falls back
+    // to a base64 realtime_input message.
+    sendMediaBytes(bytes, mimeType) {
+        if (!this.binaryMedia) {
+            const base64 = btoa(String.fromCharCode.apply(null, bytes));
+            return this.sendMessage({
+                realtime_input: {
+                    media_chunks: [{ mime_type: mimeType, data: base64 }]
+                }
+            });
+        }
+
+        if (!this.isConnected || !this.ws) {
+            this.log('Attempted to send media while disconnected');
+            return false;
+        }
+
+        const kinds = { audio: 1, image: 2, video: 3 };
+        const kind = kinds[mimeType.split('/')[0]];
+        if (!kind) {
+            this.handleError("Unsupported media type", new Error(mimeType));
+            return false;
+        }
+
+        const mime = new TextEncoder().encode(mimeType);
+        const headerSize = 15 + mime.length;
+        const frame = new Uint8Array(headerSize + bytes.length);
+        const view = new DataView(frame.buffer);
+        view.setUint8(0, 1);
+        view.setUint8(1, kind);
+        view.setUint32(2, this.mediaSequence++ >>> 0);
+        view.setFloat64(6, performance.now());
+        view.setUint8(14, mime.length);
+        frame.set(mime, 15);
+        frame.set(bytes, headerSize);
+
+        try {
+            this.ws.send(frame.buffer);
+            return true;
+        } catch (error) {
+            this.handleError("Failed to send media", error);
+            return false;
+        }
+    }
+
     updateStatus(status) {
         this.handlers.onStatusChange(status);
     }